@@ -1,3 +1,4 @@
 from .parser import Parser, ParseError, UnifyError
-from .grammar import Grammar, GrammarError, format_feat, Trie, Rule
+from .grammar import Grammar, GrammarError, format_feat, Trie, Rule, FrozenDict, FrozenRule, MacroRule, SymbolTable, Lexicon, RuleStore, FormDict, SuffixDict
 from .tree import Tree
+from .cache import IncludeCache
@@ -0,0 +1,148 @@
+""" On-disk cache of loaded grammars and compiled parse tables
+
+This file define classes:
+    GrammarCache: stores/loads grammar data and parse tables in a versioned binary file,
+        keyed by a hash of the grammar text, reverse, lexical and optimize flags, defines and parser tunables
+    IncludeCache: keeps grammars parsed from %include'd files in memory and optionally on disk, to be spliced into including grammars,
+        keyed by a hash of the file path, reverse and lexical flags and defines
+
+Each artifact also records content hashes of all %include'd files, a stale artifact (i.e. an included file is changed) is treated as a miss
+"""
+import os, hashlib, pickle, logging
+
+class GrammarCache:
+    """ Cache of compiled grammars in directory "cache_dir"
+
+    artifact format: MAGIC + VERSION(4 bytes) + pickle of dict(includes,grammar,tables)
+        includes : list of (fname,sha1) for all included files
+        grammar : loaded Grammar object (e.g. rules, lexicon, macros)
+        tables : dict of compiled tables (e.g. dfa, reduce), None if not compiled yet
+        options : dict of compile options the tables are compiled with
+    """
+    MAGIC = b"GLRC"
+    VERSION = 11
+    suffix = ".glrc"
+
+    def __init__(self,cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir,exist_ok=True)
+
+    def file_hash(fname):
+        """ returns sha1 hex digest of a file's content """
+        with open(fname,"rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def make_key(self,fname=None,reverse=False,text=None,defines=None,lexical=True,optimize=False,tunables=None):
+        """ returns cache key of a grammar, which is a hash of version, grammar text, reverse, lexical and optimize flags, defines
+        and tunables, a dict of parser attributes which change compiled tables (see Parser.cache_tunables) """
+        digest = hashlib.sha1()
+        digest.update(b"%s%d\n" % (self.MAGIC,self.VERSION))
+        if text is None:
+            with open(fname,"rb") as f:
+                digest.update(f.read())
+        else:
+            digest.update(text.encode("utf-8"))
+        digest.update(("\n%r\n%r\n%r\n%r\n%r" % (bool(reverse),sorted(defines or ()),bool(lexical),bool(optimize),sorted((tunables or {}).items()))).encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self,key):
+        return os.path.join(self.cache_dir,key+self.suffix)
+
+    def load(self,key):
+        """ returns cached entry for "key" or None if there is no valid entry """
+        try:
+            with open(self.path(key),"rb") as f:
+                if f.read(len(self.MAGIC)) != self.MAGIC or int.from_bytes(f.read(4),"little") != self.VERSION:
+                    logging.info("cache: version mismatch for %s", key)
+                    return None
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e: # corrupt or truncated artifact
+            logging.warning("cache: cannot read %s: %s", key, e)
+            return None
+        try:
+            for fname,fhash in entry["includes"]:
+                if GrammarCache.file_hash(fname) != fhash:
+                    logging.info("cache: included file changed: %s", fname)
+                    return None
+        except OSError:
+            return None
+        return entry
+
+    def new_entry(includes,grammar):
+        """ returns a new entry, includes is a list of included file names, grammar is a loaded Grammar object """
+        return dict(
+            includes = [(fname,GrammarCache.file_hash(fname)) for fname in includes],
+            grammar = grammar,
+            tables = None,
+            options = None
+        )
+
+    def store(self,key,entry):
+        """ writes an entry for "key" """
+        path = self.path(key)
+        tmp_path = "%s.%d.tmp" % (path,os.getpid())
+        with open(tmp_path,"wb") as f:
+            f.write(self.MAGIC)
+            f.write(self.VERSION.to_bytes(4,"little"))
+            pickle.dump(entry,f,pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path,path) # atomic, concurrent workers never see a partial file
+
+class IncludeCache(GrammarCache):
+    """ Cache of files parsed by %include (see Grammar.include), shared by grammars loaded in the process via Grammar.include_cache
+    entries are also stored in directory "cache_dir" if it is given
+
+    entry : dict(includes,mtimes,fragment)
+        includes : list of (fname,sha1) for the file and files it includes, checked when an entry is read from disk
+        mtimes : list of (fname,mtime) for the same files, checked when an entry is taken from memory
+        fragment : Grammar parsed from the file (see Grammar.load_fragment), None if the file is to be parsed in place
+    """
+    MAGIC = b"GLRI"
+    suffix = ".glri"
+
+    def __init__(self,cache_dir=None):
+        self.cache_dir = cache_dir
+        self.entries = dict() # maps key -> entry
+        if cache_dir:
+            os.makedirs(cache_dir,exist_ok=True)
+
+    def include_key(self,fname,grammar):
+        """ returns key of an included file, which is a hash of version, absolute path of the file, reverse and lexical flags and defines of the including grammar """
+        digest = hashlib.sha1()
+        digest.update(b"%s%d\n" % (self.MAGIC,self.VERSION))
+        digest.update(("%s\n%r\n%r\n%r" % (os.path.abspath(fname),bool(grammar.reverse),sorted(grammar.defines),bool(grammar.lexical))).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_mtimes(fnames):
+        return [(fname,os.stat(fname).st_mtime_ns) for fname in fnames]
+
+    def get(self,fname,grammar):
+        """ returns the grammar parsed from file "fname" for including grammar "grammar", the file is parsed if there is no valid entry """
+        key = self.include_key(fname,grammar)
+        entry = self.entries.get(key)
+        if entry is not None:
+            try:
+                if IncludeCache.get_mtimes(name for name,mtime in entry["mtimes"]) == entry["mtimes"]:
+                    return entry["fragment"]
+            except OSError:
+                pass
+            logging.info("include cache: included file changed: %s", fname)
+            entry = None
+        if self.cache_dir:
+            entry = self.load(key)
+        if entry is None:
+            mtimes = IncludeCache.get_mtimes([os.path.abspath(fname)]) # taken before parsing, so that a change while parsing makes the entry stale
+            fragment = grammar.load_fragment(fname)
+            fnames = [os.path.abspath(name) for name in (fragment.includes if fragment is not None else [])]
+            entry = dict(
+                includes = [(name,GrammarCache.file_hash(name)) for name in [mtimes[0][0]]+fnames],
+                mtimes = mtimes + IncludeCache.get_mtimes(fnames),
+                fragment = fragment
+            )
+            if self.cache_dir:
+                self.store(key,entry)
+        else:
+            entry["mtimes"] = IncludeCache.get_mtimes(name for name,fhash in entry["includes"])
+        self.entries[key] = entry
+        return entry["fragment"]
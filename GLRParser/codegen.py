@@ -0,0 +1,188 @@
+""" Generation of a Python module holding a compiled grammar, see Parser.generate_module
+
+This file define classes:
+    ParserModule: writes compiled tables of a parser into a Python module, which creates a ready-to-use parser when imported
+    ParseSpecializer: specializes source code of Parser.parse for the compile options of a parser
+
+Automaton tables (dfa, reduce, ereduce, lookahead, unit chains, ...) are written as literals, so that they are loaded from the .pyc file
+of the module by unmarshalling, without load_grammar and compile. Rules, lexicon and post-processor suffix data are pickled into a bytes literal.
+Parse of the generated module is Parser.parse where compile options are replaced with constants, so that branches of
+other options and debug logging are removed (this needs ast.unparse of Python 3.9+, otherwise Parser.parse is used as is)
+"""
+import ast, inspect, textwrap, pickle
+try:
+    from .tables import PackedLookahead
+except ImportError: # imported as a top level module, i.e. parser.py is run as a script
+    from tables import PackedLookahead
+
+class ParseSpecializer(ast.NodeTransformer):
+    """ replaces names in "consts" with constants, removes assignments to them and logging.debug calls, and folds constant conditions """
+    def __init__(self,consts):
+        self.consts = consts
+
+    def visit_Name(self,node):
+        if isinstance(node.ctx,ast.Load) and node.id in self.consts:
+            return ast.copy_location(ast.Constant(self.consts[node.id]),node)
+        return node
+
+    def visit_Assign(self,node):
+        if all(isinstance(target,ast.Name) and target.id in self.consts for target in node.targets):
+            return None
+        self.generic_visit(node)
+        return node
+
+    def visit_Expr(self,node):
+        func = node.value.func if isinstance(node.value,ast.Call) else None
+        if isinstance(func,ast.Attribute) and func.attr == "debug" and isinstance(func.value,ast.Name) and func.value.id == "logging":
+            return None
+        self.generic_visit(node)
+        return node
+
+    def visit_If(self,node):
+        self.generic_visit(node)
+        if isinstance(node.test,ast.Constant):
+            return (node.body if node.test.value else node.orelse) or None
+        return node
+
+    def visit_IfExp(self,node):
+        self.generic_visit(node)
+        if isinstance(node.test,ast.Constant):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_BoolOp(self,node):
+        """ folds constant operands, only used in conditions in parse so the value of a constant operand is kept as is """
+        self.generic_visit(node)
+        values = []
+        for value in node.values:
+            if isinstance(value,ast.Constant):
+                if bool(value.value) == isinstance(node.op,ast.Or): # True in "or", False in "and" decides the result
+                    return value
+                continue
+            values.append(value)
+        if not values:
+            return ast.copy_location(ast.Constant(isinstance(node.op,ast.And)),node)
+        if len(values) == 1:
+            return values[0]
+        node.values = values
+        return node
+
+    def visit_UnaryOp(self,node):
+        self.generic_visit(node)
+        if isinstance(node.op,ast.Not) and isinstance(node.operand,ast.Constant):
+            return ast.copy_location(ast.Constant(not node.operand.value),node)
+        return node
+
+    def visit_Compare(self,node):
+        self.generic_visit(node)
+        if len(node.ops) == 1 and isinstance(node.left,ast.Constant) and isinstance(node.comparators[0],ast.Constant):
+            left,right = node.left.value,node.comparators[0].value
+            ops = {ast.Is: lambda: left is right, ast.IsNot: lambda: left is not right, ast.Eq: lambda: left == right, ast.NotEq: lambda: left != right}
+            if type(node.ops[0]) in ops:
+                return ast.copy_location(ast.Constant(ops[type(node.ops[0])]()),node)
+        return node
+
+    def specialize(func,consts):
+        """ returns source of function "func" specialized for "consts", or None if ast.unparse is not available """
+        if not hasattr(ast,"unparse"):
+            return None
+        tree = ast.parse(textwrap.dedent(inspect.getsource(func)))
+        tree = ParseSpecializer(consts).visit(tree)
+        for node in ast.walk(tree): # removed statements may leave empty blocks
+            if isinstance(getattr(node,"body",None),list) and not node.body:
+                node.body.append(ast.Pass())
+        return ast.unparse(ast.fix_missing_locations(tree))
+
+class ParserModule:
+    """ Writer of a Python module holding a compiled grammar
+
+    the module defines GeneratedParser, a subclass of Parser initialized with the tables and having a specialized parse,
+    and "parser" an instance of it with the pre/post processors and reverse flag of the generating parser
+    """
+    header = '''""" GLR parser generated by GLRParser.Parser.generate_module, do not edit
+
+{rules} rules, {states} states, compile options: {options}
+usage: from <module> import parser, then parser.parse(sent), parser.make_tree() or parser.trans_sent(sent)
+"""
+import logging, pickle
+from collections import defaultdict
+from GLRParser.parser import Parser, ParseError, SymbolTable, VectorDfa, iter_bits, empty_list
+from GLRParser.tables import PackedLookahead, any_symbol
+
+'''
+    footer = '''
+class GeneratedParser(Parser):
+    """ Parser having the tables of the generated grammar """
+    def __init__(self,pre_process={pre!r},post_process={post!r},reverse={reverse!r}):
+        Parser.__init__(self,pre_process,post_process,reverse)
+        self.symtab = SymbolTable()
+        self.symtab.names = list(symbols)
+        self.symtab.ids = {{name:symbol for symbol,name in enumerate(symbols)}}
+        self.heads,self.lefts,self.ruledict = heads,lefts,ruledict
+        self.dfa,self.reduce,self.ereduce,self.lookahead = dfa,reduce,ereduce,lookahead
+        self.emap,self.nullrules,self.units,self.fmap,self.smask,self.emask = emap,nullrules,units,fmap,smask,emask
+        self.rules,self.lexicon,self.suff_idxs,self.suff_dict_list = pickle.loads(data)
+        self.post_processor.suff_idxs,self.post_processor.suff_dict_list = self.suff_idxs,self.suff_dict_list
+        self.options = options
+
+{parse}
+parser = GeneratedParser()
+'''
+
+    def write(fname,parser):
+        """ writes compiled tables of "parser" into module file "fname" """
+        Parser = type(parser)
+        nstates = len(parser.kernels)
+        out = [ParserModule.header.format(rules=len(parser.rules), states=nstates, options=parser.options)]
+        def table(name,value):
+            out.append("{} = {}\n".format(name,value))
+        def rows(name,items):
+            out.append("%s = {\n" % name)
+            for key,value in items:
+                out.append("    {!r}: {},\n".format(key,value))
+            out.append("}\n")
+
+        table("symbols", repr(tuple(parser.symtab.names)))
+        table("heads", repr(tuple(parser.heads)))
+        table("lefts", repr(tuple(tuple(left) for left in parser.lefts)))
+        table("ruledict", repr(dict(parser.ruledict)))
+        table("options", repr(parser.options))
+        rows("dfa", sorted(parser.dfa.items()))
+        for name in ('reduce','ereduce'):
+            rows(name, sorted((state,repr(tuple(items))) for state,items in getattr(parser,name).items() if items)) # order of items is kept, so are the alternatives of trees
+        if parser.lookahead is None:
+            table("lookahead", None)
+        else:
+            lsets = dict() # identical lookahead sets are shared
+            for key,lset in parser.lookahead.items():
+                lsets.setdefault(lset,len(lsets))
+            table("lsets", "(\n%s)" % "".join("    frozenset(%r),\n" % (tuple(sorted(lset)),) for lset in lsets))
+            rows("lookahead", sorted((key,"lsets[%d]" % lsets[lset]) for key,lset in parser.lookahead.items()))
+            if isinstance(parser.lookahead,PackedLookahead):
+                table("lookahead", "PackedLookahead(lookahead)")
+        table("emap", repr(parser.emap))
+        table("nullrules", repr(parser.nullrules))
+        table("units", repr(parser.units))
+        table("fmap", repr(parser.fmap))
+        if parser.smask is None:
+            table("smask", None)
+            table("emask", None)
+        else: # in hex, as long ints are not converted to decimal
+            table("smask", "{%s}" % ", ".join("%d: %s" % (symbol,hex(mask)) for symbol,mask in sorted(parser.smask.items())))
+            table("emask", hex(parser.emask))
+        table("data", repr(pickle.dumps((list(parser.rules),parser.lexicon,parser.suff_idxs,parser.suff_dict_list),pickle.HIGHEST_PROTOCOL)))
+
+        consts = dict(debug=False, vectorized=False, epsilon_free=parser.emap is not None, bitsets=parser.smask is not None)
+        for name in ('lookahead','units'):
+            if getattr(parser,name) is None:
+                consts[name] = None
+        source = ParseSpecializer.specialize(Parser.parse,consts)
+        if source is None:
+            parse = "    parse = Parser.parse\n"
+        else:
+            parse = textwrap.indent(source,"    ")+"\n"
+        processor = lambda processors,obj: next(key for key,cls in processors.items() if type(obj) is cls)
+        out.append(ParserModule.footer.format(pre=processor(Parser.pre_processors,parser.pre_processor),
+            post=processor(Parser.post_processors,parser.post_processor), reverse=parser.reverse, parse=parse))
+        with open(fname,"w",encoding="utf-8") as f:
+            f.write("".join(out))
@@ -2,10 +2,11 @@
 
 (c) 2018 by Mehmet Dolgun, m.dolgun@yahoo.com
 
-Source for parsing input grammar, defines classes GrammarError,Rule,Trie and Grammar
+Source for parsing input grammar, defines classes GrammarError,Rule,FrozenDict,FrozenRule,MacroRule,Trie,SymbolTable,Lexicon,RuleStore,FormDict,SuffixDict and Grammar
 
 """
-import re, pickle
+import re, pickle, logging
+from array import array
 from collections import namedtuple
 
 new_unify = False
@@ -53,15 +54,107 @@ class Rule:
         return ((self.head, self.left, self.right, self.feat, self.checklist, self.lparam, self.rparam, self.cost, self.cut) == 
             (other.head, other.left, other.right, other.feat, other.checklist, other.lparam, other.rparam, other.cost, other.cut)) 
 
+class MacroRule:
+    """ Compact rule expanded from a macro rule e.g. "$V -> $go : git" for a form of the word e.g. "went"
+
+    template : (rule,idx,word) shared by all rules expanded from a macro rule, where rule is the macro rule whose left[idx] has "$word"
+    head : NT of the macro for the form
+    form : the form substituted for "$word" in left
+    left is built on access, other fields are those of the template rule
+    a MacroRule is only passed to RuleStore.add, which stores fields of the template rule once for all its expansions
+    """
+    __slots__ = ('template', 'head', 'form')
+
+    def __init__(self, template, head, form):
+        self.template = template
+        self.head = head
+        self.form = form
+
+    def get_left(self):
+        rule,idx,word = self.template
+        left = rule.left.copy()
+        left[idx] = left[idx].replace('$'+word, self.form)
+        return left
+
+    left = property(get_left)
+    right = property(lambda self: self.template[0].right)
+    feat = property(lambda self: self.template[0].feat)
+    checklist = property(lambda self: self.template[0].checklist)
+    lparam = property(lambda self: self.template[0].lparam)
+    rparam = property(lambda self: self.template[0].rparam)
+    cost = property(lambda self: self.template[0].cost)
+    cut = property(lambda self: self.template[0].cut)
+
+    format = Rule.format
+    __str__ = Rule.__str__
+    __repr__ = Rule.__repr__
+    __eq__ = Rule.__eq__
+
 #Rule1 = namedtuple('Rule', 'head, left, right, feat, lparam, rparam, cost, cut')
 #print(Rule1._source)
 def format_feat(fdict,par='[]'):
     if not fdict:
-        if type(fdict)==dict: # empty dict
+        if isinstance(fdict,dict): # empty dict or FrozenDict
             return par
         return ""
     return par[0] + ",".join("{}={}".format(item[0],item[1]) if item[1] is not None else item[0] for item in sorted(fdict.items())) + par[1]
 
+def freeze_feat(fdict):
+    """ returns a feature dict as a sorted tuple of items """
+    return tuple(sorted(fdict.items())) if fdict else ()
+
+def freeze_params(params):
+    """ returns a parameter list (items are None, False or a feature dict) as a tuple """
+    key = tuple(params)
+    for param in key:
+        if param is not None and param is not False: # has a dict
+            return tuple(param if param is None or param is False else freeze_feat(param) for param in key)
+    return key
+
+def rule_key(rule):
+    """ returns fields of a rule as a hashable tuple, lists are compared as tuples and dicts as sorted items """
+    return (rule.head, tuple(rule.left), tuple(rule.right), freeze_feat(rule.feat), rule.checklist, freeze_params(rule.lparam),
+        freeze_params(rule.rparam), rule.cost, rule.cut)
+
+class FrozenDict(dict):
+    """ Read-only dict hashable by its items, feature dicts and parameters of a FrozenRule """
+    def readonly(self,*args,**kwargs):
+        raise TypeError("FrozenDict is read-only")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = readonly
+
+    def __hash__(self):
+        return hash(freeze_feat(self))
+
+    def __reduce__(self):
+        return (FrozenDict,(dict(self),))
+
+class FrozenRule(Rule):
+    """ Immutable and hashable rule read from RuleStore, left and right are tuples, feature dicts and parameters are FrozenDict
+    a FrozenRule is equal to a Rule having the same fields (see rule_key), so it can be used as a dict key in place of a Rule
+    """
+    __slots__ = ()
+
+    def __init__(self, head, left, right, feat, lparam, rparam, cost, cut):
+        for name,value in (('head',head), ('left',left), ('right',right), ('feat',feat), ('checklist',None), ('lparam',lparam),
+                ('rparam',rparam), ('cost',cost), ('cut',cut)):
+            object.__setattr__(self,name,value)
+
+    def __setattr__(self,name,value):
+        raise AttributeError("FrozenRule is immutable")
+
+    def __delattr__(self,name):
+        raise AttributeError("FrozenRule is immutable")
+
+    def __eq__(self,other):
+        return rule_key(self) == rule_key(other)
+
+    def __hash__(self):
+        return hash(rule_key(self))
+
+    def __reduce__(self):
+        return (FrozenRule,(self.head,self.left,self.right,self.feat,self.lparam,self.rparam,self.cost,self.cut))
+
 
 
 #else:
@@ -124,6 +217,16 @@ class Trie:
         lst = []
         yield from Trie.list_int(self.root,lst)
 
+    def values(self):
+        """ generates all values stored in the trie """
+        todo = [self.root]
+        for dic in todo:
+            for key,val in dic.items():
+                if key == Trie.leaf:
+                    yield from val
+                else:
+                    todo.append(val)
+
     def list_int(dic,lst):
         for key,val in dic.items():
             if key == Trie.leaf:
@@ -132,8 +235,321 @@ class Trie:
             else:
                 yield from Trie.list_int(val,lst+[key])
 
+class SymbolTable:
+    """ Maps grammar symbols (terminals and non-terminals) to dense integer ids and back
+
+    id 0 is reserved for end of input marker "$"
+    """
+    end = '$'
+
+    def __init__(self):
+        self.names = [] # maps id -> symbol name
+        self.ids = dict() # maps symbol name -> id
+        self.intern(self.end)
+
+    def intern(self,name):
+        """ returns id of a symbol, allocating a new id if necessary """
+        symid = self.ids.get(name)
+        if symid is None:
+            symid = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return symid
+
+    def get(self,name,default=-1):
+        """ returns id of a symbol, or default if symbol is unknown """
+        return self.ids.get(name,default)
+
+    def __len__(self):
+        return len(self.names)
+
+class Lexicon:
+    """ Compact word trie of terminal-only (lexical) rules, which is consulted at shift time instead of compiling the rules into LR automaton
+
+    keys are symbol ids of words, nodes are dense integers where 0 is "no node"
+        first : array indexed by symbol id of the first word of a phrase, giving its node
+        nexts : maps (node,symbol id) -> node for the following words of a phrase
+        values : list indexed by node, giving a tuple of (head symbol id,ruleno) of rules whose phrase ends at the node, values of a head are adjacent
+        rulenos : set of rulenos of lexical rules
+    """
+    def __init__(self):
+        self.first = array('i')
+        self.nexts = dict()
+        self.values = [(),()] # node 0 is unused, node 1 is root
+        self.rulenos = set()
+
+    def add(self,keyseq,head,ruleno):
+        """ adds a rule with body "keyseq" (symbol ids) and "head" symbol id """
+        first = self.first
+        word = keyseq[0]
+        if word >= len(first):
+            first.extend([0]*max(word+1-len(first),len(first)))
+        node = first[word]
+        if not node:
+            node = first[word] = self.new_node()
+        for word in keyseq[1:]:
+            nnode = self.nexts.get((node,word))
+            if nnode is None:
+                nnode = self.nexts[node,word] = self.new_node()
+            node = nnode
+        values = self.values[node]
+        idx = len(values)
+        for pos,value in enumerate(values):
+            if value[0] == head:
+                idx = pos+1
+        self.values[node] = values[:idx] + ((head,ruleno),) + values[idx:] # values of same head are kept together
+        self.rulenos.add(ruleno)
+
+    def new_node(self):
+        self.values.append(())
+        return len(self.values)-1
+
+    def search(self,tokens,pos):
+        """ returns list of (length,head,ruleno) of all phrases in the lexicon starting at "pos" of "tokens" (list of symbol ids) """
+        result = []
+        word = tokens[pos]
+        if word < 0 or word >= len(self.first):
+            return result
+        node = self.first[word]
+        values = self.values
+        nexts = self.nexts
+        end = len(tokens)
+        length = 1
+        while node:
+            for head,ruleno in values[node]:
+                result.append((length,head,ruleno))
+            if pos+length == end:
+                break
+            node = nexts.get((node,tokens[pos+length]),0)
+            length += 1
+        return result
+
+    def __len__(self):
+        return len(self.rulenos)
+
+class RuleStore:
+    """ Rule list as struct-of-arrays indexed by ruleno, an added rule identical to an earlier one is not stored again
+
+        heads : array of head symbol ids
+        left_offs, left_syms : symbol ids of left of a rule are left_syms[left_offs[ruleno]:left_offs[ruleno+1]]
+        rights, feats, lparams, rparams : arrays of indexes into "values", the list of distinct right lists, feature dicts and parameter lists
+        costs : array of costs
+        cuts : bytearray of cut flags
+    rules are built from the arrays on first access and kept, as in FlatRules
+    rules are read as FrozenRule objects, which are hashable and can't be changed, they are deduplicated on rows of ids computed by add (see row)
+    and values are built read-only from their keys, so changing a Rule after it is added doesn't change the store
+    """
+    def __init__(self,symtab):
+        self.symtab = symtab
+        self.heads = array('i')
+        self.left_offs = array('i',[0])
+        self.left_syms = array('i')
+        self.rights = array('i')
+        self.feats = array('i')
+        self.lparams = array('i')
+        self.rparams = array('i')
+        self.costs = array('i')
+        self.cuts = bytearray()
+        self.values = []
+        self.value_ids = dict() # maps (kind,key) -> index in values
+        self.index = dict() # maps hash of a row -> ruleno, or list of rulenos if hashes collide, None if it is to be rebuilt
+        self.rules = dict() # maps ruleno -> Rule built on access
+        self.template = None # (template,value ids) of the last MacroRule added
+
+    def body_ids(self,rule):
+        """ returns value ids of right, feat, lparam and rparam of a rule, values are keyed by (kind,key) """
+        value_ids = self.value_ids
+        ids = []
+        for key in (('r',tuple(rule.right)), ('f',freeze_feat(rule.feat)), ('p',freeze_params(rule.lparam)), ('p',freeze_params(rule.rparam))):
+            vid = value_ids.get(key)
+            if vid is None:
+                vid = value_ids[key] = len(self.values)
+                self.values.append(RuleStore.freeze(key))
+            ids.append(vid)
+        return tuple(ids)
+
+    def freeze(key):
+        """ returns a read-only value (right tuple, feature FrozenDict or parameter tuple) built from its (kind,key) """
+        kind,value = key
+        if kind == 'r':
+            return value
+        if kind == 'f':
+            return FrozenDict(value)
+        return tuple(FrozenDict(param) if type(param) is tuple else param for param in value)
+
+    def row(self,ruleno):
+        """ returns stored fields of a rule as a tuple (head,left,right,feat,lparam,rparam,cost,cut) of symbol ids, value ids, cost and cut flag """
+        return (self.heads[ruleno], tuple(self.get_left(ruleno)), self.rights[ruleno], self.feats[ruleno], self.lparams[ruleno],
+            self.rparams[ruleno], self.costs[ruleno], self.cuts[ruleno])
+
+    def get_index(self):
+        if self.index is None:
+            self.index = dict()
+            for ruleno in range(len(self)):
+                self.insert(hash(self.row(ruleno)),ruleno)
+        return self.index
+
+    def insert(self,key,ruleno):
+        found = self.index.get(key)
+        if found is None:
+            self.index[key] = ruleno
+        elif type(found) is list:
+            found.append(ruleno)
+        else:
+            self.index[key] = [found,ruleno]
+
+    def add(self,rule):
+        """ adds a rule (Rule or MacroRule) interning its symbols, returns its ruleno,
+        which is ruleno of the earlier rule if an identical rule is already stored """
+        intern = self.symtab.intern
+        head = intern(rule.head)
+        left = tuple(map(intern,rule.left))
+        if type(rule) is MacroRule: # expansions of a macro rule have the same body
+            if self.template is None or self.template[0] is not rule.template:
+                self.template = (rule.template,self.body_ids(rule))
+            body = self.template[1]
+        else:
+            body = self.body_ids(rule)
+        return self.add_row((head,left) + body + (rule.cost,1 if rule.cut else 0))
+
+    def add_row(self,row):
+        """ adds a rule given as a row (see row), returns its ruleno or ruleno of an identical rule """
+        key = hash(row)
+        found = (self.index if self.index is not None else self.get_index()).get(key)
+        if found is not None:
+            for ruleno in (found if type(found) is list else (found,)):
+                if self.row(ruleno) == row:
+                    return ruleno
+        ruleno = len(self.heads)
+        self.insert(key,ruleno)
+        head,left,right,feat,lparam,rparam,cost,cut = row
+        self.heads.append(head)
+        self.left_syms.extend(left)
+        self.left_offs.append(len(self.left_syms))
+        self.rights.append(right)
+        self.feats.append(feat)
+        self.lparams.append(lparam)
+        self.rparams.append(rparam)
+        self.costs.append(cost)
+        self.cuts.append(cut)
+        return ruleno
+
+    def extend(self,other,start=0):
+        """ adds rules of another store from ruleno "start" on, mapping their symbol and value ids, returns their rulenos in this store
+        values (right lists, feature dicts, parameter lists) are shared with the other store """
+        symbols = [self.symtab.intern(name) for name in other.symtab.names] # maps symbol id of other -> symbol id
+        values = other.values
+        vids = [0]*len(values)
+        value_ids = self.value_ids
+        for key,vid in other.value_ids.items():
+            new = value_ids.get(key)
+            if new is None:
+                new = value_ids[key] = len(self.values)
+                self.values.append(values[vid])
+            vids[vid] = new
+        return [self.add_row((symbols[other.heads[ruleno]], tuple([symbols[symbol] for symbol in other.get_left(ruleno)]),
+            vids[other.rights[ruleno]], vids[other.feats[ruleno]], vids[other.lparams[ruleno]], vids[other.rparams[ruleno]],
+            other.costs[ruleno], other.cuts[ruleno])) for ruleno in range(start,len(other))]
+
+    def get_left(self,ruleno):
+        """ returns symbol ids of left of a rule """
+        return self.left_syms[self.left_offs[ruleno]:self.left_offs[ruleno+1]]
+
+    def __getitem__(self,ruleno):
+        if type(ruleno) is slice:
+            return [self[idx] for idx in range(*ruleno.indices(len(self)))]
+        if ruleno < 0:
+            ruleno += len(self)
+        rule = self.rules.get(ruleno)
+        if rule is None:
+            names = self.symtab.names
+            values = self.values
+            rule = self.rules[ruleno] = FrozenRule(names[self.heads[ruleno]], tuple([names[symbol] for symbol in self.get_left(ruleno)]),
+                values[self.rights[ruleno]], values[self.feats[ruleno]], values[self.lparams[ruleno]], values[self.rparams[ruleno]],
+                self.costs[ruleno], True if self.cuts[ruleno] else None)
+        return rule
+
+    def __iter__(self):
+        return (self[ruleno] for ruleno in range(len(self)))
+
+    def __len__(self):
+        return len(self.heads)
+
+    def __eq__(self,other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __getstate__(self):
+        """ built rules and index are not pickled """
+        state = self.__dict__.copy()
+        state.update(rules=dict(), index=None, template=None)
+        return state
+
+class FormDict(dict):
+    """ Compact dict of word forms of a macro (%form, %include_form), keyed by the alternatives of the first item of a form line
+
+    a row is kept as a single string, the form line where spaces around "," and "/" are removed, shared by its alternative keys
+    and split into a tuple of items when looked up, an item is a tuple of alternatives e.g. "go,goes,went/gone" -> (('go',),('goes',),('went','gone'))
+    """
+    SPACE = re.compile(r"\s")
+
+    def add(self,line):
+        """ adds a stripped form line, returns its number of items """
+        if FormDict.SPACE.search(line):
+            line = ",".join("/".join(alt.strip() for alt in item.split("/")) for item in line.split(","))
+        end = line.find(",")
+        first = line if end == -1 else line[:end]
+        if "/" in first:
+            for alt in first.split("/"):
+                dict.__setitem__(self,alt,line)
+        else:
+            dict.__setitem__(self,first,line)
+        return line.count(",")+1
+
+    def decode(row):
+        return tuple(tuple(item.split("/")) for item in row.split(","))
+
+    def __getitem__(self,key):
+        return FormDict.decode(dict.__getitem__(self,key))
+
+    def get(self,key,default=None):
+        row = dict.get(self,key)
+        return default if row is None else FormDict.decode(row)
+
+    def copy(self):
+        """ returns a copy of the same type sharing the rows """
+        return type(self)(dict.items(self))
+
+class SuffixDict(FormDict):
+    """ Compact dict of suffix forms of a suffix macro (%suffix, %suffix_def, %include_suffix), keyed by the first item
+
+    a row is kept as a single string of items separated by ",", and split into a tuple of items when looked up
+    a row having an item with "," (i.e. a quoted term) is kept as a tuple
+    """
+    def add(self,line):
+        """ adds a stripped line of suffix forms, returns its number of items """
+        if FormDict.SPACE.search(line):
+            line = ",".join(item.strip() for item in line.split(","))
+        end = line.find(",")
+        dict.__setitem__(self,line if end == -1 else line[:end],line)
+        return line.count(",")+1
+
+    def add_items(self,key,items):
+        """ adds a row of items with key """
+        dict.__setitem__(self,key,tuple(items) if any("," in item for item in items) else ",".join(items))
+
+    def decode(row):
+        return row if type(row) is tuple else tuple(row.split(","))
+
+    def __getitem__(self,key):
+        return SuffixDict.decode(dict.__getitem__(self,key))
+
+    def get(self,key,default=None):
+        row = dict.get(self,key)
+        return default if row is None else SuffixDict.decode(row)
+
 class Grammar:
-    enable_trie = False
     #SYMBOL = re.compile('''(\*[a-z0-9_]+|[_A-Z][-_A-Za-z0-9]*'*)|("[^"]*"|[-+\'a-z0-9üöçğşðþýı$][-\'A-Z0-9a-züöçğşıðþý+@^!$]*)''')
     #FEAT_NAME = re.compile('@?[a-z0-9_]+|@?\*')
     #FEAT_VALUE = re.compile('\*?@?[-_A-Za-z0-9]+')
@@ -155,11 +571,30 @@ class Grammar:
     TERM = re.compile(re_TERM)
     NONTERM = re.compile(re_NONTERM)
 
-    def __init__(self,reverse=False,defines=None):
+    # used by scan_rule, (?=(x))\N matches x without backtracking into it, as get_symbol and get_re do
+    re_WS = r"[ \t\r\n]*"
+    # symbols of an alternative, unquoted and each followed by a space or a delimiter, so that they are split by str.split
+    # a symbol cannot be followed by one of its own characters, so it matches as get_symbol does
+    re_SEGMENT = r"((?:{ws}(?:{nonterm}|\*{name}|(?![_A-Z])[-+'$\w][-+'$\w@^!]*)(?=[ \t\r\n:\[#]|\Z))*)".format(ws=re_WS, nonterm=re_NONTERM, name=re_FEAT_NAME)
+    RULE_PROD = re.compile(r"{ws}(?=({nonterm}|\*{name}))\1{ws}->{segment}{ws}(?::{segment}{ws})?".format(ws=re_WS, nonterm=re_NONTERM,
+        name=re_FEAT_NAME, segment=re_SEGMENT)) # groups: head, left symbols, right symbols
+    NONTERM_START = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ_*")
+    RULE_FEAT = re.compile(r"{ws}(?:([-+?!]){ws}(?=({name}))\2|(?=({name}))\3{ws}={ws}(?=({value}))\4){ws}([,\]])".format(
+        ws=re_WS, name=re_FEAT_NAME, value=re_FEAT_VALUE)) # groups: prefix char, name, name, value, separator
+    RULE_WS = re.compile(re_WS)
+    RULE_EOF = re.compile(re_WS + r"(?:#|\Z)")
+    fast_scan = True # if False, all rules are parsed by recursive descent
+    compact_macros = True # if False, each rule expanded from a macro rule is a Rule of its own instead of a MacroRule
+    include_cache = None # IncludeCache object giving files parsed by %include, shared by all grammars, if None files are parsed in place
+
+    def __init__(self,reverse=False,defines=None,lexical=True):
+        """ if lexical is True, terminal-only rules are also put into "lexicon" and left out of LR automaton by the parser """
         self.reverse = reverse
+        self.lexical = lexical
         self.line_no = 0
-        self.rules = []
-        self.trie = Trie()
+        self.symtab = SymbolTable()
+        self.rules = RuleStore(self.symtab)
+        self.lexicon = Lexicon()
         self.macros = dict()
         self.forms = dict()
         self.defines = set() if defines is None else defines
@@ -169,6 +604,8 @@ class Grammar:
         self.suff_dict_names = dict()
         self.suff_idxs = dict()
         self.suff_dict_list = []
+        self.includes = [] # names of files read by %include, %include_form and %include_suffix
+        self.optimized = None # report of optimize, None if grammar is not optimized
         
    
     def get_rest(self,maxchars=20):
@@ -270,31 +707,36 @@ class Grammar:
         self.buf = buf
         self.pos = 0
 
-        if self.get_eof(False):
-            return
+        scanned = self.scan_rule(buf) if self.fast_scan else None
+        if scanned:
+            macro_name = None
+            head,llist,rlist,feat = scanned
+        else:
+            if self.get_eof(False):
+                return
 
-        macro_name,head = self.parse_head()
+            macro_name,head = self.parse_head()
 
-        self.get_token('->')
+            self.get_token('->')
 
-        llist = self.parse_prod()
-        if self.get_token(':',False):
-            rlist = self.parse_prod()
-        else:
-            rlist = [(empty_list,empty_list,0,None,None)]
-        if self.get_token('[',False):
-            feat = self.parse_feat_list()
-            #!checklist = [key for key,val in feat.items() if val=='?']
-            #!rule = {key:val for key,val in feat.items() if val!='?'}
-        else:
-            feat = empty_dict
-        self.get_eof()
+            llist = self.parse_prod()
+            if self.get_token(':',False):
+                rlist = self.parse_prod()
+            else:
+                rlist = [(empty_list,empty_list,0,None,None)]
+            if self.get_token('[',False):
+                feat = self.parse_feat_list()
+                #!checklist = [key for key,val in feat.items() if val=='?']
+                #!rule = {key:val for key,val in feat.items() if val!='?'}
+            else:
+                feat = empty_dict
+            self.get_eof()
 
         if self.reverse:
             llist,rlist = rlist,llist
 
         for left,lparam,lcost,lmacro,lcut in llist:
-            term_only = self.enable_trie and len(lparam)>0 and all(map(lambda x:x is False,lparam))
+            term_only = self.lexical and len(lparam)>0 and lparam.count(False) == len(lparam) # only terminals, params are None, a dict or False
 
             for right,rparam,rcost,rmacro,rcut in rlist:      
                 # following cross-references right with left, removing referencing suffixes
@@ -326,23 +768,80 @@ class Grammar:
                     idx,word = lmacro
                     if word not in self.forms[macro_name]:
                         raise GrammarError("Line:%d No form defined for word '%s': %s" % (self.line_no,word,self.buf))
+                    template = (Rule(macro_name,left,right,feat,lparam,rparam,rcost,rcut),idx,word)
+                    symtab = self.symtab
                     for _head,form in zip(head,self.forms[macro_name][word]):
                         for altform in form:
-                            _left = left.copy()
-                            _left[idx] = left[idx].replace('$'+word, altform)                         
-                            if term_only:
-                                self.trie.add(_left, Rule(_head,_left,right,feat,lparam,rparam,rcost,rcut) )
-                                #!self.trie.add(left, Rule(head,left,lparam,[(right,rparam,feat,checklist,rcost)]) )
+                            if not self.compact_macros:
+                                _left = left.copy()
+                                _left[idx] = left[idx].replace('$'+word, altform)                         
+                                self.add_rule( Rule(_head,_left,right,feat,lparam,rparam,rcost,rcut), term_only )
                             else:
-                                self.rules.append( Rule(_head,_left,right,feat,lparam,rparam,rcost,rcut) )
-                                #!self.rules.append( Rule(head,left,lparam,[(right,rparam,feat,checklist,rcost)]) )
+                                if left[idx] == '$'+word: # form is a symbol, its string is shared with symbol table
+                                    altform = symtab.names[symtab.intern(altform)]
+                                self.add_rule( MacroRule(template,_head,altform), term_only )
                 else:
-                    if term_only:
-                        self.trie.add(left, Rule(head,left,right,feat,lparam,rparam,rcost,rcut) )
-                        #!self.trie.add(left, Rule(head,left,lparam,[(right,rparam,feat,checklist,rcost)]) )
+                    self.add_rule( Rule(head,left,right,feat,lparam,rparam,rcost,rcut), term_only )
+
+    def scan_rule(self,buf):
+        """ fast path of parse_rule for rules of plain symbols and a feature list, e.g. "VP -> V NP : NP -yH V [tense=past]"
+
+        scans the line with a few compiled regular expressions, matching the same symbols as get_symbol, get_re etc. do
+        returns (head,llist,rlist,feat) as parse_rule builds them, or None for other rules (macros, alternatives, costs, cuts,
+        parameters) and for erroneous ones, which are then parsed by recursive descent (so that errors are reported the same)
+        """
+        if '"' in buf: # quoted terminals are left to recursive descent
+            return None
+        match = Grammar.RULE_PROD.match(buf)
+        if not match:
+            return None
+        head,left,right = match.groups()
+        pos = match.end()
+        char = buf[pos:pos+1]
+        alts = []
+        nonterm_start = Grammar.NONTERM_START
+        for symbols in ((left,) if right is None else (left,right)):
+            prod = symbols.split()
+            macro_var = None
+            if '$' in symbols:
+                for idx,symbol in enumerate(prod):
+                    if symbol[0] not in nonterm_start and '$' in symbol:
+                        macro_var = (idx,symbol[symbol.find('$')+1:])
+            alts.append([(prod,[None if symbol[0] in nonterm_start else False for symbol in prod],0,macro_var,None)])
+        if char == '[':
+            pos = Grammar.RULE_WS.match(buf,pos+1).end()
+            if buf.startswith(']',pos): # empty list
+                pos += 1
+                feat = empty_dict
+            else:
+                feat = dict()
+                sep = ','
+                while sep == ',':
+                    match = Grammar.RULE_FEAT.match(buf,pos)
+                    if not match:
+                        return None
+                    pos = match.end()
+                    char,name,_name,value,sep = match.groups()
+                    if char:
+                        feat[name] = char
                     else:
-                        self.rules.append( Rule(head,left,right,feat,lparam,rparam,rcost,rcut) )
-                        #!self.rules.append( Rule(head,left,lparam,[(right,rparam,feat,checklist,rcost)]) )
+                        feat[_name] = value
+            if not Grammar.RULE_EOF.match(buf,pos):
+                return None
+        elif char == '#' or char == '':
+            feat = empty_dict
+        else:
+            return None
+        rlist = alts[1] if len(alts) == 2 else [(empty_list,empty_list,0,None,None)]
+        return head,alts[0],rlist,feat
+
+    def add_rule(self,rule,term_only):
+        """ adds a rule to rule store interning its symbols, a terminal-only rule is also added to lexicon
+        a rule identical to an earlier one (e.g. "A -> x | x") is dropped """
+        rules = self.rules
+        ruleno = len(rules)
+        if rules.add(rule) == ruleno and term_only:
+            self.lexicon.add(rules.get_left(ruleno),rules.heads[ruleno],ruleno)
 
     def parse_head(self):
         if self.buf[self.pos] == '$':
@@ -451,18 +950,18 @@ class Grammar:
         self.get_token(')')
         return fdict
 
-    def load_grammar(fname=None,reverse=False,text=None,defines=None):
+    def load_grammar(fname=None,reverse=False,text=None,defines=None,lexical=True):
         """ loads a grammar file and parse it """
         if bool(fname) == bool(text):
             raise GrammarError("load_grammar: either fname or text should be provided")
-        grammar = Grammar(reverse,defines)
+        grammar = Grammar(reverse,defines,lexical)
         if text is None:
             with open(fname, "r") as f:
                 grammar.parse_grammar(f)
-                return grammar
         else:
             grammar.parse_grammar(text.split('\n'))
-            return grammar
+        grammar.rules.index = None # only needed while adding rules, rebuilt by RuleStore.add e.g. for Parser.add_rules
+        return grammar
 
     def parse_nonterm_list(self):
         items = []
@@ -486,7 +985,7 @@ class Grammar:
         if macro_name in self.macros:
             raise GrammarError("Line:%d Macro already defined: %s" % (self.line_no,macro_name))
         self.macros[macro_name] = items
-        self.forms[macro_name] = dict()
+        self.forms[macro_name] = FormDict()
 
     def parse_form(self):
         """ %form MacroName -> Term (, Term)* """
@@ -498,9 +997,7 @@ class Grammar:
         items = self.buf[self.pos:].split(",")
         if len(items) != cnt:
             raise GrammarError("Line:%d Form expecting %d items but found: %s" % (line_no,cnt,self.get_rest()))
-        items = [[alt.strip() for alt in item.split("/")] for item in items]
-        for alt in items[0]:
-            self.forms[macro_name][alt] = items
+        self.forms[macro_name].add(self.buf[self.pos:].strip())
 
     def parse_define(self):
         """ %define Token (, Token)* """
@@ -525,11 +1022,53 @@ class Grammar:
         self.process = all(self.if_stack)
 
     def include(self):
-        """ %include "file name" """
+        """ %include "file name", the parsed file is taken from include_cache if it is set """
         fname = self.get_term()
+        self.includes.append(fname)
+        if self.include_cache is not None:
+            fragment = self.include_cache.get(fname,self)
+            if fragment is not None and self.splice(fragment):
+                return
         with open(fname,"rt") as f:
             self.parse_grammar(f)
 
+    def load_fragment(self,fname):
+        """ parses an included file on its own, into a new grammar having the options and a copy of defines of this grammar
+        returns None if the file cannot be parsed without this grammar, e.g. it has rules of a macro defined here or an unclosed %ifdef """
+        fragment = Grammar(self.reverse,set(self.defines),self.lexical)
+        try:
+            with open(fname,"rt") as f:
+                fragment.parse_grammar(f)
+        except GrammarError as e:
+            logging.info("load_fragment: %s is parsed in place: %s", fname, e)
+            return None
+        if fragment.if_stack:
+            return None
+        fragment.rules.index = None
+        return fragment
+
+    def splice(self,fragment):
+        """ adds rules, lexicon entries, macros, forms, suffixes and defines of a grammar built by load_fragment, as if its file is parsed in place
+        returns False without adding anything if a macro or suffix macro of the fragment is already defined, then the file is to be parsed in place """
+        if any(name in self.macros for name in fragment.macros) or any(name in self.suff_dict_names for name in fragment.suff_dict_names):
+            return False
+        rules = self.rules
+        first = len(rules)
+        lexical = fragment.lexicon.rulenos
+        for ruleno,new in enumerate(rules.extend(fragment.rules,1),1): # rule 0 of fragment is "S' -> S()"
+            if new >= first and ruleno in lexical: # new >= first if not a duplicate of an earlier rule
+                self.lexicon.add(rules.get_left(new),rules.heads[new],new)
+        self.macros.update(fragment.macros)
+        self.forms.update((name,forms.copy()) for name,forms in fragment.forms.items())
+        offset = len(self.suff_dict_list)
+        self.suff_dict_list.extend(suff_dict.copy() for suff_dict in fragment.suff_dict_list)
+        self.suff_dict_names.update((name,(dict_idx+offset,cnt)) for name,(dict_idx,cnt) in fragment.suff_dict_names.items())
+        self.suff_idxs.update((item,(dict_idx+offset,idx)) for item,(dict_idx,idx) in fragment.suff_idxs.items())
+        self.defines.update(fragment.defines)
+        self.includes.extend(fragment.includes)
+        self.line_no += fragment.line_no
+        return True
+
     def include_form(self):
         """ %include_form MacroName "file name" """
         macro_name = self.get_nonterm()
@@ -537,16 +1076,15 @@ class Grammar:
         if macro_name not in self.macros:
             raise GrammarError("Line:%d Macro not defined: %s" % (self.line_no,macro_name))
         cnt = len(self.macros[macro_name])
-        with open(fname,"rt") as f:
+        self.includes.append(fname)
+        forms = self.forms[macro_name]
+        with open(fname,"rt") as f: # streamed, only compact rows are kept
             for line_no,line in enumerate(f):
                 line = line.strip()
                 if line and not line.startswith("#"):
-                    items = line.split(",")
-                    if len(items) != cnt:
+                    if line.count(",")+1 != cnt:
                         raise GrammarError("File:%s Line:%d Form expecting %d items but found: %s" % (fname,line_no,cnt,line))
-                    items = [[alt.strip() for alt in item.split("/")] for item in items]
-                    for alt in items[0]:
-                        self.forms[macro_name][alt] = items
+                    forms.add(line)
 
     def save_macros(self):
         """ %save_macros "file name" """
@@ -582,7 +1120,7 @@ class Grammar:
             raise GrammarError("Line:%d Macro already defined: %s" % (self.line_no,macro_name))
         dict_idx = len(self.suff_dict_list)
         self.suff_dict_names[macro_name] = (dict_idx,len(items))
-        self.suff_dict_list.append(dict())
+        self.suff_dict_list.append(SuffixDict())
         for idx,item in enumerate(items):
             self.suff_idxs[item] = (dict_idx,idx)
 
@@ -599,7 +1137,7 @@ class Grammar:
         if len(items) != cnt:
             raise GrammarError("Line:%d suffix_def expecting %d items but found: %s" % (self.line_no,cnt,self.buf))
         #items = [item.strip() for item in items]
-        self.suff_dict_list[dict_idx][""] = items
+        self.suff_dict_list[dict_idx].add_items("",items)
 
     def parse_suffix(self):
         """ %suffix MacroName -> Term (, Term)* """
@@ -614,7 +1152,7 @@ class Grammar:
         if len(items) != cnt:
             raise GrammarError("Line:%d Suffix expecting %d items but found: %s" % (self.line_no,cnt,self.get_rest()))
         #items = [item.strip() for item in items]
-        self.suff_dict_list[dict_idx][items[0]] = items
+        self.suff_dict_list[dict_idx].add_items(items[0],items)
 
     def include_suffix(self):
         """ %include_suffix MacroName "file name" """
@@ -623,17 +1161,18 @@ class Grammar:
         if macro_name not in self.suff_dict_names:
             raise GrammarError("Line:%d Suffix Macro not defined: %s" % (self.line_no,macro_name))
         dict_idx,cnt = self.suff_dict_names[macro_name]
-        with open(fname,"rt") as f:
+        self.includes.append(fname)
+        suff_dict = self.suff_dict_list[dict_idx]
+        with open(fname,"rt") as f: # streamed, only compact rows are kept
             for line_no,line in enumerate(f):
                 line = line.strip()
                 if line and not line.startswith("#"):
-                    items = line.split(",")
-                    if len(items) != cnt:
+                    if line.count(",")+1 != cnt:
                         raise GrammarError("File:%s Line:%d Suffix Form expecting %d items but found: %s" % (fname,line_no,cnt,line))
-                    items = [item.strip() for item in items]
-                    self.suff_dict_list[dict_idx][items[0]] = items
+                    suff_dict.add(line)
 
     funcs = { 
+        "include" : include,
         "macro" : parse_macro,
         "form" : parse_form,
         "include_form" : include_form,
@@ -676,3 +1215,81 @@ class Grammar:
             elif self.process:
                 self.parse_rule(line)
       
+
+    def optimize(self):
+        """ removes rules which cannot take part in a parse, renumbers remaining rules and rebuilds lexicon, returns a report (also kept in "optimized") of dropped rules
+
+        unproductive : rules having a non-terminal which derives no terminal string (e.g. a non-terminal without any rule)
+        unreachable : productive rules whose head cannot be derived from S'
+        rules of non-terminals used on right side of a kept rule (i.e. needed by translation) are always kept
+        renumber : list mapping old ruleno -> new ruleno, None for a dropped rule
+        """
+        rules = self.rules
+        nonterms = lambda rule: [symbol for symbol,param in zip(rule.left,rule.lparam) if param is not False]
+        # productive: worklist of rules counting their unproductive non-terminals, as in Parser.compute_nullable
+        count = []
+        occurs = dict()
+        productive = set()
+        todo = []
+        for ruleno,rule in enumerate(rules):
+            nts = nonterms(rule)
+            count.append(len(nts))
+            for symbol in nts:
+                occurs.setdefault(symbol,[]).append(ruleno)
+            if not nts:
+                todo.append(ruleno)
+        while todo:
+            head = rules[todo.pop()].head
+            if head in productive:
+                continue
+            productive.add(head)
+            for ruleno in occurs.get(head,()):
+                count[ruleno] -= 1 # occurs has an entry for each occurrence of a non-terminal in a rule
+                if count[ruleno] == 0:
+                    todo.append(ruleno)
+        is_productive = [cnt == 0 for cnt in count]
+
+        ruledict = dict()
+        for ruleno,rule in enumerate(rules):
+            ruledict.setdefault(rule.head,[]).append(ruleno)
+        # reachable: from S' through left sides of productive rules
+        keep = set()
+        reachable = {"S'"}
+        todo = ["S'"]
+        while todo:
+            for ruleno in ruledict.get(todo.pop(),()):
+                if is_productive[ruleno]:
+                    keep.add(ruleno)
+                    for symbol in nonterms(rules[ruleno]):
+                        if symbol not in reachable:
+                            reachable.add(symbol)
+                            todo.append(symbol)
+        # right-only non-terminals, used by make_trans_tree
+        needed = set()
+        todo = list(keep)
+        while todo:
+            rule = rules[todo.pop()]
+            for symbol,param in zip(rule.right,rule.rparam):
+                if param is not False and type(symbol) == str and symbol not in needed:
+                    needed.add(symbol)
+                    for ruleno in ruledict.get(symbol,()):
+                        if ruleno not in keep:
+                            keep.add(ruleno)
+                            todo.append(ruleno)
+        keep.add(0)
+
+        report = dict(unproductive=[], unreachable=[], renumber=[None]*len(rules))
+        lexical = self.lexicon.rulenos
+        self.rules = RuleStore(self.symtab)
+        self.lexicon = Lexicon()
+        for ruleno,rule in enumerate(rules):
+            if ruleno in keep:
+                report['renumber'][ruleno] = len(self.rules)
+                self.add_rule(rule, ruleno in lexical)
+                self.rules.rules[len(self.rules)-1] = rule # kept rules stay the same objects
+            elif is_productive[ruleno]:
+                report['unreachable'].append(rule)
+            else:
+                report['unproductive'].append(rule)
+        self.optimized = report
+        return report
@@ -7,22 +7,36 @@ This file define classes:
     ParserError,UnifyError: exceptions thrown when parsing or unification fails
       
 """
-import logging, re, copy
+import logging, re, copy, gc, multiprocessing, itertools
 from collections import defaultdict
+from array import array
 
 if __name__ == "__main__":
     from morpher import TurkishPostProcessor,PostProcessError
-    from grammar import Grammar,GrammarError,Rule,format_feat,Trie
+    from grammar import Grammar,GrammarError,Rule,FrozenRule,MacroRule,RuleStore,format_feat,SymbolTable
     from tree import Tree,uid
+    from cache import GrammarCache
+    from codegen import ParserModule
+    from tables import FlatTables,FlatReduce,PackedDfa,PackedLookahead,VectorDfa,any_symbol,numpy
 else:
     from .morpher import TurkishPostProcessor,PostProcessError
-    from .grammar import Grammar,GrammarError,Rule,format_feat,Trie
+    from .grammar import Grammar,GrammarError,Rule,FrozenRule,MacroRule,RuleStore,format_feat,SymbolTable
     from .tree import Tree,uid
+    from .cache import GrammarCache
+    from .codegen import ParserModule
+    from .tables import FlatTables,FlatReduce,PackedDfa,PackedLookahead,VectorDfa,any_symbol,numpy
 
 empty_dict = dict()
 empty_set = set()
 empty_list = list()
 
+def iter_bits(bits):
+    """ yields positions of set bits of an int in increasing order, e.g. states of an active state bitset """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length()-1
+        bits ^= low
+
 class ParseError(Exception):
     """ Raised when a sentence cannot be parsed with current grammar """
     pass
@@ -92,58 +106,140 @@ class DefPostProcessor:
     def __call__(self,sent):
         return sent.replace(" -","")
 
+class LazyDfa(dict):
+    """ dfa of lazy compile, where a state is expanded on the first lookup of its transitions """
+    def __init__(self,expand,expanded,table):
+        dict.__init__(self,table)
+        self.expand = expand
+        self.expanded = expanded
+
+    def get(self,key,default=None):
+        if key[0] not in self.expanded:
+            self.expand(key[0])
+        return dict.get(self,key,default)
+
+    def __getitem__(self,key):
+        if key[0] not in self.expanded:
+            self.expand(key[0])
+        return dict.__getitem__(self,key)
+
+class LazyReduce(dict):
+    """ reduce/ereduce of lazy compile, where a state is expanded on the first lookup of its reductions """
+    def __init__(self,expand,expanded,table):
+        dict.__init__(self,table)
+        self.expand = expand
+        self.expanded = expanded
+
+    def get(self,state,default=None):
+        if state not in self.expanded:
+            self.expand(state)
+        return dict.get(self,state,default)
+
 class Parser:
     """ A GLR Parser for Natural Language Processing and Translation
 
 		see main() for sample usage
 
         internal data:
+            grammar : Grammar object the rules are loaded into, kept for adding rules later by add_rules
             rules : list of rules as named tuple Rule(head,left,right,feat,lparam,rparam,lcost,rcost) 
-            ruledict : maps NT -> list of rulenos in "rules"
+            lexicon : Lexicon of terminal-only rules (e.g. NP -> the man), these rules are looked up in lexicon at shift time and are not compiled into dfa
+            symtab : SymbolTable mapping each terminal and NT name to a dense integer id, all compiled tables below use symbol ids
+            heads, lefts : integer views of rules, heads[ruleno] -> symbol, lefts[ruleno] -> (symbol*), if compiled with epsilon_free=True
+                or left_factor=True, variants and synthetic rules follow the rules, e.g. heads[len(rules)] is the head of first of them
+            ruledict : maps NT name -> list of rulenos in "rules"
             nullable : set of nullable NTs, an NT is nullable if it can produce directly or indirectly an empty string
             dfa : Deterministic Finite Automaton for state transitions, where dfa[state,symbol] -> nextstate
             reduce : maps a state to a list of reductions  reduce[state] -> [(ruleno,rulepos)*]
             ereduce : maps a state to a list of empty reductions  ereduce[state] -> [(ruleno,rulepos)*]
+            kernels : maps a state to its kernel items, kernels[state] -> ((ruleno,rulepos)*) sorted
+            expanded : if compiled with lazy=True, set of states whose transitions and reductions are computed so far, otherwise None
+            emap : if compiled with epsilon_free=True, maps ruleno of a variant -> (ruleno,positions of kept symbols), otherwise None
+            nullrules : if compiled with epsilon_free=True, maps a nullable NT name -> rulenos deriving empty string, used to rebuild omitted sub-trees
+            fmap : if compiled with left_factor=True, maps a synthetic rule -> ruleno it is the rest of, or None for a rule ending with a synthetic NT (see left_factor), otherwise None
+            smask : if compiled with bitsets=True, maps a symbol to bitset of states having a transition on it, otherwise None
+            emask : if compiled with bitsets=True, bitset of states having e-reductions, otherwise None
+            options : options of last compile
+            units : if compiled with unit_chains=True, maps a goto (state,symbol) to a unit-only state -> chains of unit reductions (see compute_units), otherwise None
+            lookahead : if compiled with lookahead=True, maps a (e)reduction to its LALR(1) lookahead set  lookahead[state,ruleno,rulepos] -> {terminal*}, otherwise None
+            cache : GrammarCache object if a cache directory is given, otherwise None
+            tables : FlatTables object if tables are loaded by load_tables, then above tables are read-only views on the mapped file
     """
     pre_processors  = { None: DummyPreProcessor, "": DefPreProcessor,  "EN": EnglishPreProcessor,  "TR": TurkishPreProcessor }
     post_processors = { None: DummyPreProcessor, "": DefPostProcessor, "EN": EnglishPostProcessor, "TR": TurkishPostProcessor }
 
-    def __init__(self,pre_process="",post_process="",reverse=False):
-        """ initializes parser with pre_processor and post_processor, which should be callable, reverse reverses(i.e. swaps) the input/output grammars """
+    table_names = ('heads', 'lefts', 'ruledict', 'nullable', 'dfa', 'reduce', 'ereduce', 'lookahead', 'kernels', 'emap', 'nullrules', 'units', 'fmap', 'smask', 'emask') # tables produced by compile, stored in cache
+    parallel_min_chunk = 64 # minimum number of states sent to a worker process at once in parallel compile
+    factor_min_prefix = 2 # minimum length of a prefix shared by rules to be left-factored
+    dense_max_cells = 1 << 24 # maximum size of the dense transition matrix of a vectorized compile, larger automata are kept in compressed columns
+    vector_min_active = 32 # minimum number of active states shifted at once in a vectorized compile, fewer states are looked up one by one
+    cache_tunables = ('factor_min_prefix','dense_max_cells') # attributes changing compiled tables, part of cache key (values at load_grammar)
+    worker = None # parser object holding rule data in a worker process of parallel compile
+
+    def __init__(self,pre_process="",post_process="",reverse=False,cache_dir=None):
+        """ initializes parser with pre_processor and post_processor, which should be callable, reverse reverses(i.e. swaps) the input/output grammars
+        if cache_dir is given, loaded grammars and compiled tables are cached in that directory """
         self.pre_processor  = self.pre_processors[pre_process]()
         self.post_processor = self.post_processors[post_process]()
         self.reverse = reverse
+        self.cache = GrammarCache(cache_dir) if cache_dir else None
+        self.cache_entry = None
+        self.grammar = None
+        self.kernels = None
+        self.expanded = None
+        self.emap = None
+        self.units = None
+        self.fmap = None
+        self.smask = self.emask = None
 
         
     def closure(self,stateset):
         """ modifies parameter to add e-closure to existing set of states
 
-        self.rules: [ rule(head,body[symbol*],trans) ]
-        self.ruledict: { nt:{ruleno*} }
+        self.lefts: [ (symbol*) ]
+        self.symrules: [ [ruleno*] ] indexed by symbol
         """
-
-        todo = list(stateset)
-        # we use both list for iteration and set for membership check
-        # for iteration we use set as FIFO, for membership check we use set for O(1) complexity
-        for ruleno,rulepos in todo:
-            try:
-                symbol = self.rules[ruleno].left[rulepos]
-                for nextno in self.ruledict.get(symbol,set()):
-                    nextstate = (nextno,0)
-                    if nextstate not in stateset: 
-                        stateset.add(nextstate)
-                        todo.append(nextstate)
-                """                            
-                while symbol in self.nullable:
-                    rulepos += 1
-                    nextstate = (ruleno,rulepos)
-                    if nextstate not in stateset: 
-                        stateset.add(nextstate)
-                        todo.append(nextstate)              
-                    symbol = self.rules[ruleno].left[rulepos]
-                """
-            except IndexError: # there is no more symbols in the rule (i.e. A->x.)
-                pass
+        lefts = self.lefts
+        symrules = self.symrules
+        for ruleno,rulepos in list(stateset):
+            left = lefts[ruleno]
+            if rulepos < len(left) and symrules[left[rulepos]]:
+                for symbol in self.get_reach(left[rulepos]):
+                    stateset.update((nextno,0) for nextno in symrules[symbol])
+
+    def get_reach(self,symbol):
+        """ returns tuple of non-terminals whose rules are in the closure of a non-terminal, i.e. the non-terminal itself and
+        all non-terminals reachable as first symbol of its rules, results are cached in "reach" """
+        reach = self.reach.get(symbol)
+        if reach is None:
+            reach = [symbol]
+            seen = {symbol}
+            for nt in reach:
+                for first in self.nt_firsts.get(nt,empty_list):
+                    if first not in seen:
+                        seen.add(first)
+                        reach.append(first)
+            reach = self.reach[symbol] = tuple(reach)
+        return reach
+
+    def get_state_items(self,kernel):
+        """ returns list of all items (kernel+closure) of a state given by its kernel """
+        items = list(kernel)
+        self.closure_items(kernel,items)
+        return items
+
+    def closure_items(self,kernel,items):
+        """ appends closure items (ruleno,0) of kernel to "items" list """
+        lefts = self.lefts
+        symrules = self.symrules
+        expect = dict()
+        for ruleno,rulepos in kernel:
+            left = lefts[ruleno]
+            if rulepos < len(left) and symrules[left[rulepos]]:
+                for symbol in self.get_reach(left[rulepos]):
+                    expect[symbol] = None
+        for symbol in expect:
+            items.extend((ruleno,0) for ruleno in symrules[symbol])
 
     def format_rules(self):
         """ return string repr of all rules """
@@ -153,93 +249,903 @@ class Parser:
         """ get string repr of  a "stateset" in state set in dotted fomat  e.g "{ S -> NP . VP ; VP -> . V  ; VP -> . V NP }" """
         slist = ["{"]
         for ruleno,rulepos in stateset:
-            slist.append("{} -> {} . {}".format(self.rules[ruleno].head, " ".join(self.rules[ruleno].left[0:rulepos]), " ".join(self.rules[ruleno].left[rulepos:])))
+            slist.append(self.get_item(ruleno,rulepos))
         slist.append("}")
         return " , ".join(slist)
 
     def get_item(self,ruleno,rulepos):
-        """ get string repr of a single state item """
-        return "{} -> {} . {}".format(self.rules[ruleno].head, " ".join(self.rules[ruleno].left[0:rulepos]), " ".join(self.rules[ruleno].left[rulepos:]))    
+        """ get string repr of a single state item, ruleno may also be a variant of epsilon-free compile """
+        names = self.symtab.names
+        left = [names[symbol] for symbol in self.lefts[ruleno]]
+        return "{} -> {} . {}".format(names[self.heads[ruleno]], " ".join(left[0:rulepos]), " ".join(left[rulepos:]))
 
-    def compile(self):
+    def compile(self,lookahead=False,processes=None,lazy=False,epsilon_free=False,unit_chains=False,left_factor=False,minimize=False,packed=False,vectorized=False,bitsets=False):
         """ compile rule list "rules" to a DFA
 
         produces dfa, reduce and ereduce tables(dictionaries) from rules
+        if lookahead is True, additionally produces LALR(1) lookahead sets for reductions, so that parse skips reductions not followed by current token
+        if processes > 1, states are expanded by a pool of worker processes, the tables are identical to serial compile
+        if lazy is True, only rule-level data is prepared and a state is expanded when it is first looked up while parsing,
+        expanded states are kept for following sentences and can be persisted with store_cache
+        if epsilon_free is True, rules are transformed to an epsilon-free form (see remove_epsilon), so that parse has no e-reductions,
+        trees are generated in terms of original rules
+        if unit_chains is True, chains of unit reductions (e.g. S -> SentNorm) are precomputed (see compute_units), so that parse
+        adds a single edge for a chain, the chain is kept on the edge and expanded by make_tree
+        if left_factor is True, rules of an NT sharing a prefix are left-factored into synthetic NTs (see left_factor), which never show up in trees
+        if minimize is True, behaviourally equivalent states are merged after compile (see minimize)
+        if packed is True, dfa, reduce, ereduce and lookahead tables are compressed into arrays after compile (see pack_tables)
+        if vectorized is True, dfa is also kept in numpy arrays (see VectorDfa), so that parse shifts all active states on a symbol at once
+        when there are at least vector_min_active of them, it needs numpy and cannot be used with packed
+        if bitsets is True, parse keeps active states of a position in an int bitset, and finds the states to shift on a symbol
+        or to e-reduce by bitwise and with masks precomputed by compute_masks
+        if the tables are found in cache, they are loaded from cache instead
         """
+        if lazy and (lookahead or unit_chains or minimize or packed or bitsets):
+            raise GrammarError("compile: lookahead, unit_chains, minimize, packed and bitsets need all states to be expanded, they cannot be used with lazy")
+        if vectorized and (numpy is None or lazy or packed):
+            raise GrammarError("compile: vectorized needs numpy and cannot be used with lazy or packed")
+        self.options = options = dict(lookahead=lookahead,lazy=lazy,epsilon_free=epsilon_free,unit_chains=unit_chains,left_factor=left_factor,minimize=minimize,packed=packed,vectorized=vectorized,bitsets=bitsets)
+        if self.cache_entry and self.cache_entry["tables"] and self.cache_entry["options"] == options:
+            logging.info("compile: using cached tables %s", self.cache_key)
+            for name,table in self.cache_entry["tables"].items():
+                setattr(self,name,table)
+            self.expanded = None
+            self.statedict = None # rule-level data and statedict are recomputed if needed by add_rules
+            if lazy:
+                self.prepare(epsilon_free,left_factor)
+                self.statedict = {kernel:state for state,kernel in enumerate(self.kernels)}
+                self.make_lazy(set(self.cache_entry["tables"]["expanded"]))
+            return
 
         rules = self.rules
-        ruledict = defaultdict(list)
         dfa = dict()
         reduce = defaultdict(set)
         ereduce = defaultdict(set)
         
-        self.ruledict = ruledict
         self.dfa = dfa
         self.reduce = reduce
         self.ereduce = ereduce
-        
-        for ruleno,rule in enumerate(rules):
-            ruledict[rule.head].append(ruleno)
-
-        # todo: more efficient algorithm for large grammars
-        nullable = {rule.head for rule in rules if len(rule.left)==0}  # empty productions
-        flag = bool(nullable)
-        while flag:
-            flag = False
-            for rule in rules:
-                if all(map(lambda x:x in nullable,rule.left)): # all of symbols in RHS is nullable
-                    if rule.head not in nullable:
-                        nullable.add(rule.head)
-                        flag = True
-            
-        logging.info("nullable=%s", nullable)
-        self.nullable = nullable
-        
-        statedict = dict() # maps set of nfa states to a single dfa state
-        stateset = {(0,0)}
-        self.closure(stateset)
-        statedict[frozenset(stateset)] = 0
-        states = [stateset] # list of nfa state set, also used to map dfa state to nfa state set
-        todo = [0]
-        for stateno in todo:
-            tempdict = defaultdict(set) # maps symbol to set of next states
-            for ruleno,rulepos in states[stateno]:          
-                try:
-                    symbol = rules[ruleno].left[rulepos] # get next symbol after dot (i.e. A->x.By)
-                    tempdict[symbol].add((ruleno,rulepos+1))
-                except IndexError: # there is no more symbols in the rule (i.e. A->x.)
-                    pass
-            for symbol,nextstateset in tempdict.items():
-                self.closure(nextstateset)
-                f = frozenset(nextstateset)
-                nextstateno = statedict.get(f,-1)
-                if nextstateno == -1:
-                    nextstateno = len(states)
-                    statedict[f] = nextstateno
-                    states.append(nextstateset)
-                    todo.append(nextstateno)
-                dfa[stateno,symbol] = nextstateno
-        for idx,stateset in enumerate(states):
-            for ruleno,rulepos in stateset:
-                body = rules[ruleno].left
-                if all(map(lambda x:x in nullable,body[rulepos:])): # if all remaining items are nullable
-                    if rulepos == 0: # empty or nullable rule
-                        ereduce[idx].add((ruleno,rulepos))                   
-                    else:
-                        reduce[idx].add((ruleno,rulepos))
-        if logging.getLogger().isEnabledFor(logging.DEBUG):
-            for stateno,stateset in enumerate(states):
-                logging.debug("%s : %s REDUCE: %s EREDUCE: %s", stateno, self.get_items(stateset), self.get_items(reduce.get(stateno,set())), self.get_items(ereduce.get(stateno,set())))
+        self.prepare(epsilon_free,left_factor)
+
+        kernels = [((0,0),)] # list of kernel item tuples, also used to map dfa state to its kernel
+        statedict = {kernels[0]:0} # maps kernel of a state to dfa state, as closure is determined by kernel
+        self.kernels = kernels
+        self.statedict = statedict
+        self.expanded = None
+        self.units = None
+        self.smask = self.emask = None
+        if lazy:
+            self.make_lazy(set())
+            self.lookahead = None
+            logging.info("compile: lazy mode, states are expanded on first use")
+        else:
+            gc_enabled = gc.isenabled()
+            gc.disable() # only acyclic tuples are allocated here, cyclic garbage collection passes just slow down large grammars
+            try:
+                if processes and processes > 1:
+                    self.expand_states_parallel(processes)
+                else:
+                    self.expand_states(0)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            self.lookahead = self.compute_lookahead() if lookahead else None
+            if minimize:
+                self.minimize()
+            if unit_chains:
+                self.units = self.compute_units()
+            if bitsets:
+                self.compute_masks()
+            if packed:
+                self.pack_tables()
+            if vectorized:
+                self.dfa = VectorDfa(self.dfa,len(self.kernels),len(self.symtab),self.dense_max_cells)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                for stateno,kernel in enumerate(kernels):
+                    logging.debug("%s : %s REDUCE: %s EREDUCE: %s", stateno, self.get_items(self.get_state_items(kernel)), self.get_items(reduce.get(stateno,set())), self.get_items(ereduce.get(stateno,set())))
+        if self.cache_entry is not None:
+            self.cache_entry["options"] = options
+            self.store_cache()
+
+    def store_cache(self):
+        """ stores compiled tables into the cache, in lazy mode it persists the states expanded so far """
+        tables = {name:getattr(self,name) for name in self.table_names}
+        if self.expanded is not None: # lazy tables are stored as plain dicts
+            for name in ('dfa','reduce','ereduce'):
+                tables[name] = dict(tables[name])
+            tables["expanded"] = self.expanded - {-1}
+        self.cache_entry["tables"] = tables
+        self.cache.store(self.cache_key,self.cache_entry)
+
+    def make_lazy(self,expanded):
+        """ wraps dfa, reduce and ereduce so that a state is expanded on its first lookup, "expanded" is the set of states already expanded """
+        expanded.add(-1) # lookups following a missing transition (i.e. state -1) never expand
+        self.expanded = expanded
+        self.dfa = LazyDfa(self.expand_lazy,expanded,self.dfa)
+        self.reduce = LazyReduce(self.expand_lazy,expanded,self.reduce)
+        self.ereduce = LazyReduce(self.expand_lazy,expanded,self.ereduce)
+
+    def expand_lazy(self,stateno):
+        """ expands a state in lazy mode """
+        self.expanded.add(stateno)
+        self.expand_state(stateno)
+
+    def expand_all(self):
+        """ expands all remaining states in lazy mode, e.g. before saving tables """
+        stateno = 0
+        while stateno < len(self.kernels): # kernels is extended while iterating
+            if stateno not in self.expanded:
+                self.expand_lazy(stateno)
+            stateno += 1
    
-    def load_grammar(self,fname=None,reverse=False,text=None,defines=None):
-        """ loads a grammar file and parse it """
-        grammar = Grammar.load_grammar(fname,reverse,text,defines)
-        self.rules,self.trie = grammar.rules,grammar.trie
-        self.post_processor.suff_idxs,self.post_processor.suff_dict_list =  grammar.suff_idxs,grammar.suff_dict_list
+    def prepare(self,epsilon_free=False,left_factor=False):
+        """ computes rule-level data used by compile: integer views of rules (heads,lefts), ruledict, symrules, nullable, nstart and per non-terminal closure data
+        if epsilon_free is True, rules are transformed by remove_epsilon, after which no NT is nullable
+        if left_factor is True, rules are (then) transformed by left_factor """
+        rules = self.rules
+        intern = self.symtab.intern
+        if type(rules) is RuleStore and rules.symtab is self.symtab: # symbol ids are already stored, rules are not built
+            self.heads = heads = rules.heads.tolist()
+            self.lefts = lefts = [tuple(rules.get_left(ruleno)) for ruleno in range(len(rules))]
+        else:
+            self.heads = heads = [intern(rule.head) for rule in rules]
+            self.lefts = lefts = [tuple(map(intern,rule.left)) for rule in rules]
+
+        lexical = self.lexicon.rulenos
+        names = self.symtab.names
+        ruledict = defaultdict(list)
+        symrules = [[] for symbol in range(len(self.symtab))] # rules of NTs excluding lexical rules, i.e. the rules compiled into LR automaton
+        for ruleno,head in enumerate(heads):
+            ruledict[names[head]].append(ruleno)
+            if ruleno not in lexical:
+                symrules[head].append(ruleno)
+        self.ruledict = ruledict
+        self.symrules = symrules
+
+        self.nullable = nullable = self.compute_nullable()
+        logging.info("nullable=%s", {self.symtab.names[symbol] for symbol in nullable})
+        self.emap = self.nullrules = self.fmap = None
+        if epsilon_free:
+            self.remove_epsilon()
+        if left_factor:
+            self.left_factor()
+
+        self.nstart = [self.get_nstart(left) for left in lefts] # nstart[ruleno] is the first rulepos where all remaining symbols are nullable
+
+        self.reach = dict() # cache for get_reach
+        self.nt_firsts = dict() # maps NT -> non-terminals which are first symbol of its rules
+        self.nt_gotos = dict() # maps NT -> list of (symbol,items) i.e. items (ruleno,1) of its rules grouped by first symbol
+        self.nt_ereduce = dict() # maps NT -> list of items (ruleno,0) of its nullable rules
+        for head,rulenos in enumerate(symrules):
+            if rulenos:
+                self.prepare_nt(head)
+
+    def remove_epsilon(self):
+        """ transforms rules compiled into LR automaton (i.e. symrules) to an equivalent epsilon-free set
+
+        a rule having nullable symbols is replaced by its variants omitting each subset of them, variants with an empty body
+        (e.g. e-rules) are dropped, a nullable NT not deriving any non-empty string is always omitted
+        variants are appended to heads and lefts, a rule without nullable symbols is kept as is
+        emap and nullrules keep information make_tree needs to rebuild omitted sub-trees
+        """
+        heads = self.heads
+        lefts = self.lefts
+        symrules = self.symrules
+        nullable = self.nullable
+        names = self.symtab.names
+        nonempty = {heads[ruleno] for ruleno in self.lexicon.rulenos if heads[ruleno] in nullable} # nullable NTs deriving a non-empty string
+        changed = True
+        while changed:
+            changed = False
+            for head in nullable - nonempty:
+                if any(symbol not in nullable or symbol in nonempty for ruleno in symrules[head] for symbol in lefts[ruleno]):
+                    nonempty.add(head)
+                    changed = True
+
+        emap = dict()
+        nullrules = defaultdict(list)
+        for head,rulenos in enumerate(symrules):
+            variants = []
+            for ruleno in rulenos:
+                left = lefts[ruleno]
+                if head in nullable and all(symbol in nullable for symbol in left):
+                    nullrules[names[head]].append(ruleno)
+                if not any(symbol in nullable for symbol in left):
+                    if left:
+                        variants.append(ruleno)
+                    continue
+                choices = [(True,) if symbol not in nullable else (True,False) if symbol in nonempty else (False,) for symbol in left]
+                for keep in itertools.product(*choices):
+                    kept = tuple(pos for pos,flag in enumerate(keep) if flag)
+                    if not kept:
+                        continue
+                    if len(kept) == len(left):
+                        variants.append(ruleno)
+                        continue
+                    emap[len(heads)] = (ruleno,kept)
+                    variants.append(len(heads))
+                    heads.append(head)
+                    lefts.append(tuple(left[pos] for pos in kept))
+            symrules[head] = variants
+        logging.info("remove_epsilon: %d variants added", len(emap))
+        self.emap = emap
+        self.nullrules = dict(nullrules)
+        self.nullable = set()
+
+    def left_factor(self):
+        """ left-factors rules compiled into LR automaton (i.e. symrules) of an NT sharing a prefix of at least "factor_min_prefix" symbols, e.g.
+            S -> that SentNorm Adv , S -> that SentNorm Conj S => S -> that SentNorm S#1 , S#1 -> Adv , S#1 -> Conj S
+        rules of a synthetic NT are factored recursively, a rule whose rest would be empty or nullable is not factored
+        synthetic rules are appended to heads and lefts, fmap maps a synthetic rule -> ruleno it is the rest of, or None if it ends with
+        a synthetic NT, so that make_tree can put a rule back together from the pieces
+        """
+        heads = self.heads
+        lefts = self.lefts
+        symrules = self.symrules
+        nullable = self.nullable
+        symtab = self.symtab
+        min_prefix = self.factor_min_prefix
+        fmap = dict()
+        count = defaultdict(int) # number of synthetic NTs per NT, used in names
+
+        def add_rule(head,left,ruleno):
+            fmap[len(heads)] = ruleno
+            heads.append(head)
+            lefts.append(left)
+            return len(heads)-1
+
+        def factor(head,name,items,synthetic):
+            """ returns rulenos of "head" for items (ruleno,body), where body is a rest of rule "ruleno" if head is synthetic """
+            groups = dict()
+            for item in items:
+                groups.setdefault(item[1][:min_prefix],[]).append(item)
+            rulenos = []
+            for group in groups.values():
+                rest = [(ruleno,body) for ruleno,body in group if len(body) > min_prefix]
+                while len(rest) > 1:
+                    size = min_prefix
+                    while all(len(body) > size+1 and body[size] == rest[0][1][size] for ruleno,body in rest):
+                        size += 1
+                    nrest = [(ruleno,body) for ruleno,body in rest if len(body) > size and not all(symbol in nullable for symbol in body[size:])]
+                    if len(nrest) == len(rest):
+                        break
+                    rest = nrest
+                if len(rest) < 2:
+                    rest = []
+                factored = {ruleno for ruleno,body in rest}
+                for ruleno,body in group:
+                    if ruleno not in factored:
+                        rulenos.append(add_rule(head,body,ruleno) if synthetic else ruleno)
+                if rest:
+                    count[name] += 1
+                    fhead = symtab.intern("%s#%d" % (name,count[name]))
+                    symrules.extend([] for symbol in range(len(symrules),len(symtab)))
+                    rulenos.append(add_rule(head,rest[0][1][:size]+(fhead,),None))
+                    symrules[fhead] = factor(fhead,name,[(ruleno,body[size:]) for ruleno,body in rest],True)
+            return rulenos
+
+        names = symtab.names
+        for head in range(len(symrules)):
+            if len(symrules[head]) > 1:
+                symrules[head] = factor(head,names[head],[(ruleno,lefts[ruleno]) for ruleno in symrules[head]],False)
+        logging.info("left_factor: %d synthetic NTs, %d synthetic rules", sum(count.values()), len(fmap))
+        self.fmap = fmap
+
+    def get_nstart(self,left):
+        """ returns the first position of a rule body where all remaining symbols are nullable """
+        pos = len(left)
+        while pos and left[pos-1] in self.nullable:
+            pos -= 1
+        return pos
+
+    def prepare_nt(self,head):
+        """ computes closure data (nt_gotos,nt_firsts,nt_ereduce) of a non-terminal from its rules """
+        lefts = self.lefts
+        symrules = self.symrules
+        rulenos = symrules[head]
+        gotos = dict()
+        for ruleno in rulenos:
+            left = lefts[ruleno]
+            if left:
+                gotos.setdefault(left[0],[]).append((ruleno,1))
+        self.nt_gotos[head] = list(gotos.items())
+        self.nt_firsts[head] = [symbol for symbol in gotos if symrules[symbol]]
+        self.nt_ereduce[head] = [(ruleno,0) for ruleno in rulenos if self.nstart[ruleno]==0]
+
+    def expand_states(self,stateno):
+        """ expands states starting from "stateno" up to the last state, states created on the way are expanded too """
+        kernels = self.kernels
+        while stateno < len(kernels): # kernels is extended while iterating
+            self.expand_state(stateno)
+            stateno += 1
+
+    def expand_states_parallel(self,processes):
+        """ expands states level by level, where states of a level (i.e. frontier) are expanded by a pool of worker processes
+
+        results are added in state order, so new states are numbered in the same order as serial compile
+        small frontiers are expanded in main process, as sending them to workers costs more than expanding
+        """
+        kernels = self.kernels
+        min_chunk = self.parallel_min_chunk
+        data = (self.lefts, self.symrules, self.nstart, self.nt_firsts, self.nt_gotos, self.nt_ereduce)
+        with multiprocessing.Pool(processes,Parser.init_worker,(data,)) as pool:
+            stateno = 0
+            while stateno < len(kernels):
+                frontier = kernels[stateno:]
+                if len(frontier) < 2*min_chunk:
+                    results = map(self.expand_kernel,frontier)
+                else:
+                    results = pool.imap(Parser.expand_kernel_worker,frontier,max(min_chunk,len(frontier)//(4*processes)))
+                for gotos,red,ered in results:
+                    self.add_state(stateno,gotos,red,ered)
+                    stateno += 1
+        logging.info("compile: %d states expanded by %d processes", len(kernels), processes)
+
+    def init_worker(data):
+        """ initializes a worker process of parallel compile with rule data of the parser """
+        parser = Parser.__new__(Parser)
+        parser.lefts,parser.symrules,parser.nstart,parser.nt_firsts,parser.nt_gotos,parser.nt_ereduce = data
+        parser.reach = dict()
+        Parser.worker = parser
+
+    def expand_kernel_worker(kernel):
+        """ expands a kernel in a worker process of parallel compile """
+        return Parser.worker.expand_kernel(kernel)
+
+    def expand_state(self,stateno):
+        """ fills dfa, reduce and ereduce entries of a state, adding next states not seen before to "kernels"
+        returns True if an existing transition of the state is redirected to another state """
+        return self.add_state(stateno,*self.expand_kernel(self.kernels[stateno]))
+
+    def add_state(self,stateno,gotos,red,ered):
+        """ adds transitions and reductions of an expanded state (see expand_kernel) to dfa, reduce and ereduce """
+        kernels = self.kernels
+        statedict = self.statedict
+        dfa = self.dfa
+        redirected = False
+        for symbol,nkernel in gotos:
+            nextstateno = statedict.get(nkernel)
+            if nextstateno is None:
+                nextstateno = statedict[nkernel] = len(kernels)
+                kernels.append(nkernel)
+            if dfa.setdefault((stateno,symbol),nextstateno) != nextstateno:
+                dfa[stateno,symbol] = nextstateno
+                redirected = True
+        if red:
+            self.reduce[stateno] = set(red)
+        if ered:
+            self.ereduce[stateno] = set(ered)
+        return redirected
+
+    def add_rules(self,text):
+        """ parses grammar lines in "text" (e.g. rules, %form lines) into current grammar, and if the parser is already compiled updates compiled tables
+
+        only states whose closure contains a non-terminal having a new rule are re-expanded, the resulting tables are
+        equivalent to a full compile (except numbering of states), if the set of nullable NTs changes it falls back to a full compile
+        an epsilon-free, left-factored, minimized, packed or vectorized compile is always redone in full, as variants and synthetic rules are numbered after the rules,
+        merged states have no single kernel and packed or vectorized tables cannot be extended
+        """
+        if self.grammar is None:
+            raise GrammarError("add_rules: no grammar is loaded")
+        recompile = self.kernels is not None and any(self.options.get(name) for name in ('epsilon_free','left_factor','minimize','packed','vectorized'))
+        if self.kernels is not None and self.statedict is None and not recompile: # tables are loaded from cache
+            self.prepare()
+            self.statedict = {kernel:state for state,kernel in enumerate(self.kernels)}
+        self.grammar.line_no = 0
+        self.grammar.parse_grammar(text.split('\n'))
+        self.cache_entry = None # parser doesn't match the cached grammar any more
+        if self.kernels is not None and recompile:
+            self.compile(**self.options)
+        elif self.kernels is not None:
+            self.extend_tables()
+            if self.options.get('bitsets'):
+                self.compute_masks()
+
+    def extend_tables(self):
+        """ incrementally updates compiled tables for rules added to "rules" after the last compile """
+        rules = self.rules
+        heads = self.heads
+        lefts = self.lefts
+        symrules = self.symrules
+        intern = self.symtab.intern
+        lookahead = self.lookahead is not None
+        lazy = self.expanded is not None
+        first_ruleno = len(heads)
+        symrules.extend([] for symbol in range(len(symrules),len(self.symtab)))
+        changed = set() # heads of new rules
+        new_nts = set() # symbols having rules for the first time
+        for ruleno in range(first_ruleno,len(rules)):
+            rule = rules[ruleno]
+            head = intern(rule.head)
+            heads.append(head)
+            lefts.append(tuple(map(intern,rule.left)))
+            self.ruledict[rule.head].append(ruleno)
+            if ruleno in self.lexicon.rulenos: # looked up at shift time
+                continue
+            if not symrules[head]:
+                new_nts.add(head)
+            changed.add(head)
+            symrules[head].append(ruleno)
+        logging.info("add_rules: %d new rules", len(rules)-first_ruleno)
+
+        if changed and self.compute_nullable() != self.nullable: # nstart of existing rules may change
+            logging.info("add_rules: nullable set changed, recompiling")
+            self.compile(**self.options)
+            return
+        self.nstart.extend(self.get_nstart(left) for left in lefts[first_ruleno:])
+        if changed:
+            if new_nts: # non-terminals starting with a new NT have new firsts
+                changed.update(nt for nt,gotos in self.nt_gotos.items() if any(symbol in new_nts for symbol,items in gotos))
+            for head in changed:
+                self.prepare_nt(head)
+            self.reach = dict()
+
+            callers = defaultdict(list) # maps NT -> NTs having it as first symbol of a rule
+            for nt,firsts in self.nt_firsts.items():
+                for first in firsts:
+                    callers[first].append(nt)
+            affected = set(changed) # NTs whose closure contains a changed NT
+            todo = list(changed)
+            for nt in todo:
+                for caller in callers.get(nt,empty_list):
+                    if caller not in affected:
+                        affected.add(caller)
+                        todo.append(caller)
+
+            states = [stateno for stateno,kernel in enumerate(self.kernels)
+                if any(rulepos < len(lefts[ruleno]) and lefts[ruleno][rulepos] in affected for ruleno,rulepos in kernel)
+                and (not lazy or stateno in self.expanded)] # in lazy mode, states not expanded yet will be expanded with new rules
+            nstates = len(self.kernels)
+            redirected = False
+            for stateno in states:
+                if self.expand_state(stateno):
+                    redirected = True
+            if not lazy:
+                self.expand_states(nstates)
+            logging.info("add_rules: %d states re-expanded, %d new states", len(states), len(self.kernels)-nstates)
+            if redirected and not lazy: # some states may not be reachable any more, in lazy mode they are never expanded
+                self.remove_unreachable()
+        if lookahead:
+            self.lookahead = self.compute_lookahead()
+        if self.units is not None:
+            self.units = self.compute_units()
+
+    def remove_unreachable(self):
+        """ removes states not reachable from initial state, renumbering the remaining states preserving their order """
+        succ = defaultdict(list)
+        for (state,symbol),nstate in self.dfa.items():
+            succ[state].append(nstate)
+        reached = {0}
+        todo = [0]
+        for state in todo:
+            for nstate in succ[state]:
+                if nstate not in reached:
+                    reached.add(nstate)
+                    todo.append(nstate)
+        if len(reached) == len(self.kernels):
+            return
+        logging.info("remove_unreachable: %d states removed", len(self.kernels)-len(reached))
+        renum = {state:idx for idx,state in enumerate(sorted(reached))}
+        self.kernels = [self.kernels[state] for state in sorted(reached)]
+        self.statedict = {kernel:state for state,kernel in enumerate(self.kernels)}
+        self.dfa = {(renum[state],symbol):renum[nstate] for (state,symbol),nstate in self.dfa.items() if state in renum}
+        self.reduce = defaultdict(set,((renum[state],items) for state,items in self.reduce.items() if state in renum))
+        self.ereduce = defaultdict(set,((renum[state],items) for state,items in self.ereduce.items() if state in renum))
+
+    def minimize(self):
+        """ merges behaviourally equivalent states, i.e. states having the same reduce and ereduce items (and lookaheads) whose
+        transitions on each symbol go to equivalent states, found by partition refinement (Moore's algorithm)
+
+        merged states keep their order, so initial state stays 0, kernel of a merged state is the kernel of its first state
+        returns dict(states=(before,after),transitions=(before,after))
+        """
+        nstates = len(self.kernels)
+        ntrans = len(self.dfa)
+        lookahead = self.lookahead
+        def actions(table,state):
+            items = table.get(state,empty_set)
+            if lookahead is None:
+                return frozenset(items)
+            return frozenset((item,lookahead[(state,)+item]) for item in items)
+        trans = [[] for state in range(nstates)]
+        for (state,symbol),nstate in self.dfa.items():
+            trans[state].append((symbol,nstate))
+        for row in trans:
+            row.sort()
+        signatures = [(actions(self.reduce,state),actions(self.ereduce,state)) for state in range(nstates)]
+        nblocks = 0
+        while True:
+            blockdict = dict()
+            block = [blockdict.setdefault(signature,len(blockdict)) for signature in signatures]
+            if len(blockdict) == nblocks: # no block is split
+                break
+            nblocks = len(blockdict)
+            signatures = [(block[state],tuple((symbol,block[nstate]) for symbol,nstate in trans[state])) for state in range(nstates)]
+
+        if nblocks < nstates:
+            first = dict() # maps block -> its first state
+            for state in range(nstates):
+                first.setdefault(block[state],state)
+            renum = {blk:idx for idx,blk in enumerate(sorted(first,key=first.get))} # blocks are numbered in order of their first states
+            merged = [renum[block[state]] for state in range(nstates)]
+            reps = sorted(first.values())
+            self.dfa = {(merged[state],symbol):merged[nstate] for (state,symbol),nstate in self.dfa.items() if first[block[state]] == state}
+            self.reduce = defaultdict(set,((merged[state],items) for state,items in self.reduce.items() if first[block[state]] == state))
+            self.ereduce = defaultdict(set,((merged[state],items) for state,items in self.ereduce.items() if first[block[state]] == state))
+            if lookahead is not None:
+                self.lookahead = {(merged[state],ruleno,rulepos):lset for (state,ruleno,rulepos),lset in lookahead.items() if first[block[state]] == state}
+            self.statedict = {kernel:merged[state] for state,kernel in enumerate(self.kernels)}
+            self.kernels = [self.kernels[state] for state in reps]
+        report = dict(states=(nstates,len(self.kernels)),transitions=(ntrans,len(self.dfa)))
+        logging.info("minimize: states %d -> %d, transitions %d -> %d", *report['states'], *report['transitions'])
+        return report
+
+    def pack_tables(self):
+        """ replaces dfa, reduce, ereduce and lookahead tables with compressed equivalents having the same lookup interface
+
+        dfa is packed by row displacement into int arrays (see PackedDfa), reduce and ereduce items are stored as rows of
+        an int array (see FlatReduce), lookahead sets of default reductions are dropped (see PackedLookahead), a default reduction is
+        the only reduction of a state having no transitions, as there is nothing else to do in that state it is done without checking the token
+        returns dict(transitions,slots,defaults): number of dfa transitions, size of packed dfa arrays and number of default reductions
+        """
+        nstates = len(self.kernels)
+        shifting = {state for state,symbol in self.dfa}
+        defaults = set()
+        for state in range(nstates):
+            items = self.reduce.get(state,empty_set) | self.ereduce.get(state,empty_set)
+            if len(items) == 1 and state not in shifting:
+                defaults.add((state,)+next(iter(items)))
+        self.dfa = PackedDfa(self.dfa,nstates)
+        for name in ('reduce','ereduce'):
+            table = getattr(self,name)
+            offs = array('i',[0])
+            items = array('i')
+            for state in range(nstates):
+                for item in table.get(state,empty_set): # iteration order of sets is kept, so are the alternatives of trees
+                    items.extend(item)
+                offs.append(len(items)//2)
+            setattr(self,name,FlatReduce(offs,items))
+        if self.lookahead is not None:
+            self.lookahead = PackedLookahead((key,lset) for key,lset in self.lookahead.items() if key not in defaults)
+        report = dict(transitions=len(self.dfa),slots=self.dfa.size,defaults=len(defaults))
+        logging.info("pack_tables: %d transitions in %d slots, %d default reductions", report['transitions'], report['slots'], report['defaults'])
+        return report
+
+    def compute_nullable(self):
+        """ returns set of nullable NTs, using a worklist where each rule keeps count of its symbols not known to be nullable """
+        heads = self.heads
+        lefts = self.lefts
+        count = [len(left) for left in lefts]
+        occurs = defaultdict(list) # maps symbol to rulenos it occurs in (once for each occurrence)
+        for ruleno,left in enumerate(lefts):
+            for symbol in left:
+                occurs[symbol].append(ruleno)
+        nullable = set()
+        todo = [head for head,left in zip(heads,lefts) if not left] # empty productions
+        for symbol in todo:
+            if symbol in nullable:
+                continue
+            nullable.add(symbol)
+            for ruleno in occurs.get(symbol,empty_list):
+                count[ruleno] -= 1
+                if count[ruleno] == 0: # all of symbols in RHS is nullable
+                    todo.append(heads[ruleno])
+        return nullable
+
+    def expand_kernel(self,kernel):
+        """ computes transitions and reductions of a state given by its (sorted) kernel items
+
+        closure items are never materialized, transitions of closure items are taken from per non-terminal "nt_gotos"
+        returns (gotos,reduce,ereduce), where gotos is a list of (symbol,next kernel) and reduce,ereduce are lists of items
+        """
+        lefts = self.lefts
+        symrules = self.symrules
+        nstart = self.nstart
+        gotos = dict() # maps symbol to items of next kernel
+        red = []
+        ered = []
+        expect = dict() # non-terminals to be expanded, dict is used as an ordered set
+        for ruleno,rulepos in kernel:
+            left = lefts[ruleno]
+            if rulepos >= nstart[ruleno]: # if all remaining items are nullable
+                if rulepos == 0:
+                    ered.append((ruleno,rulepos))
+                else:
+                    red.append((ruleno,rulepos))
+            if rulepos < len(left):
+                symbol = left[rulepos]
+                gotos.setdefault(symbol,[]).append((ruleno,rulepos+1))
+                if symrules[symbol]:
+                    for nt in self.get_reach(symbol):
+                        expect[nt] = None
+        for nt in expect:
+            for symbol,items in self.nt_gotos[nt]:
+                gotos.setdefault(symbol,[]).extend(items)
+            ered.extend(self.nt_ereduce[nt])
+        return [(symbol,tuple(sorted(items))) for symbol,items in gotos.items()],red,ered
+
+    def compute_first(self):
+        """ returns FIRST sets of non-terminals (i.e. set of terminals a non-terminal can start with), including lexical rules """
+        first = defaultdict(set)
+        nonterms = set(self.heads)
+        changed = True
+        while changed:
+            changed = False
+            for head,left in zip(self.heads,self.lefts):
+                fset = first[head]
+                size = len(fset)
+                for symbol in left:
+                    if symbol not in nonterms:
+                        fset.add(symbol)
+                        break
+                    fset |= first[symbol]
+                    if symbol not in self.nullable:
+                        break
+                if len(fset) != size:
+                    changed = True
+        return first,nonterms
+
+    def compute_lookahead(self):
+        """ computes LALR(1) lookahead sets of reductions by propagating lookaheads over LR(0) states
+
+        lookaheads are kept per kernel item (state,ruleno,rulepos) and per closure non-terminal (state,symbol),
+        as all closure items of a non-terminal in a state share the same lookahead set
+        returns dict mapping (state,ruleno,rulepos) -> frozenset of terminals, for all items in reduce and ereduce
+        """
+        heads = self.heads
+        lefts = self.lefts
+        dfa = self.dfa
+        nullable = self.nullable
+        first,nonterms = self.compute_first()
+
+        def node(state,ruleno,rulepos):
+            return (state,ruleno,rulepos) if rulepos else (state,heads[ruleno])
+
+        la = defaultdict(set) # maps node -> lookahead set
+        succ = defaultdict(set) # maps node -> set of nodes, its lookahead set propagates to
+        la[0,heads[0]].add(self.symtab.ids[SymbolTable.end])
+        for state,kernel in enumerate(self.kernels):
+            for ruleno,rulepos in self.get_state_items(kernel):
+                left = lefts[ruleno]
+                if rulepos == len(left):
+                    continue
+                src = node(state,ruleno,rulepos)
+                symbol = left[rulepos]
+                succ[src].add(node(dfa[state,symbol],ruleno,rulepos+1))
+                if symbol in nonterms:
+                    dst = (state,symbol)
+                    for nsymbol in left[rulepos+1:]: # spontaneous lookaheads: FIRST of rest of the rule
+                        if nsymbol not in nonterms:
+                            la[dst].add(nsymbol)
+                            break
+                        la[dst] |= first[nsymbol]
+                        if nsymbol not in nullable:
+                            break
+                    else: # rest of the rule is nullable, lookaheads propagate
+                        succ[src].add(dst)
+
+        todo = [src for src,lset in la.items() if lset]
+        while todo:
+            src = todo.pop()
+            lset = la[src]
+            for dst in succ.get(src,empty_set):
+                dset = la[dst]
+                if not lset <= dset:
+                    dset |= lset
+                    todo.append(dst)
+
+        lookahead = dict()
+        for table in (self.reduce,self.ereduce):
+            for state,items in table.items():
+                for ruleno,rulepos in items:
+                    lookahead[state,ruleno,rulepos] = frozenset(la.get(node(state,ruleno,rulepos),empty_set))
+        return lookahead
+
+    def compute_masks(self):
+        """ computes bitsets of states used by parse with bitsets=True: smask maps a symbol -> states having a transition on it, emask is states having e-reductions """
+        smask = defaultdict(int)
+        for state,symbol in self.dfa:
+            smask[symbol] |= 1 << state
+        self.smask = dict(smask)
+        emask = 0
+        for state,items in self.ereduce.items():
+            if items:
+                emask |= 1 << state
+        self.emask = emask
+
+    def compute_units(self):
+        """ returns chains of unit reductions, which parse applies at once
+
+        a state is unit-only if it has no transitions and its only reductions are of unit rules (e.g. S -> SentNorm .),
+        reducing a unit rule goes back to the state the unit-only state is reached from, so for a goto (state,symbol) to a unit-only
+        state, the unit reductions up to the goto to a state which is not unit-only are known at compile time
+        returns dict mapping (state,symbol) -> [(chain,head,nstate,la)*] where
+            chain : tuple of rulenos of unit rules, the last applied first
+            head,nstate : head of the last applied rule and its goto from "state", i.e. the edge parse adds
+            la : set of terminals all reductions in chain are allowed with, None if compiled without lookahead
+        """
+        lefts = self.lefts
+        fmap = self.fmap or empty_dict # synthetic rules of left-factoring are never collapsed
+        unit_only = {state for state,items in self.reduce.items()
+            if items and all(ruleno and rulepos == 1 and len(lefts[ruleno]) == 1 and ruleno not in fmap for ruleno,rulepos in items) and not self.ereduce.get(state)}
+        unit_only.difference_update(state for state,symbol in self.dfa)
+        units = dict()
+        for (state,symbol),nstate in self.dfa.items():
+            if nstate in unit_only:
+                units[state,symbol] = self.get_unit_chains(state,nstate,unit_only,(),None,(symbol,))
+        logging.info("compute_units: %d unit-only states, %d gotos to them", len(unit_only), len(units))
+        return units
+
+    def get_unit_chains(self,state,nstate,unit_only,chain,la,seen):
+        """ returns unit chains (see compute_units) following "chain" of unit reductions, which reached unit-only state "nstate" from "state"
+        "seen" keeps symbols reduced so far, to cut cyclic unit rules """
+        result = []
+        for ruleno,rulepos in self.reduce[nstate]:
+            head = self.heads[ruleno]
+            hstate = self.dfa.get((state,head),-1)
+            if hstate == -1 or head in seen:
+                continue
+            hla = la
+            if self.lookahead is not None:
+                hla = self.lookahead[nstate,ruleno,rulepos]
+                if la is not None:
+                    hla = hla & la
+                if not hla:
+                    continue
+            if hstate in unit_only:
+                result.extend(self.get_unit_chains(state,hstate,unit_only,(ruleno,)+chain,hla,seen+(head,)))
+            else:
+                result.append(((ruleno,)+chain,head,hstate,hla))
+        return result
+
+    def compile_report(self,top=10):
+        """ returns statistics of compiled tables as a dict, to find grammar constructs causing non-determinism
+
+            states, transitions : number of states and dfa transitions
+            nullable : sorted list of nullable NTs
+            conflicts : list of dict(state,shift_reduce,reduce_reduce) for states having a conflict, where
+                shift_reduce is a list of (terminal,[item*]), i.e. reductions applicable when terminal can also be shifted
+                reduce_reduce is a list of ([terminal*],[item*]) i.e. reductions applicable together on terminals, if compiled without lookahead, terminals is None (any terminal)
+            shift_reduce, reduce_reduce : total number of conflicts
+            closures : list of (state,item count) of "top" states with largest closures
+            forks : list of (state,action count) of "top" states with most actions (shift or reduction) on a single terminal, i.e. states forking the GSS most
+        an item is a dotted rule string e.g. "S -> NP . VP"
+        in lazy mode all remaining states are expanded first, rule-level data of tables loaded from cache is recomputed first
+        """
+        if self.kernels is None:
+            raise GrammarError("compile_report: parser is not compiled (tables loaded by load_tables have no kernels, report the compiled parser instead)")
+        if self.statedict is None: # tables are loaded from cache
+            self.prepare(self.options.get('epsilon_free',False),self.options.get('left_factor',False))
+            self.statedict = {kernel:state for state,kernel in enumerate(self.kernels)}
+        if self.expanded is not None:
+            self.expand_all()
+        names = self.symtab.names
+        lookahead = self.lookahead
+        nonterms = set(self.heads)
+        lexfirst = defaultdict(set) # maps NT -> first words of its lexicon phrases, shifted at parse time by a goto on NT
+        for ruleno in self.lexicon.rulenos:
+            lexfirst[self.heads[ruleno]].add(self.lefts[ruleno][0])
+        shifts = defaultdict(set) # maps state -> terminals shifted, including words of lexicon phrases
+        for (state,symbol),nstate in self.dfa.items():
+            if symbol not in nonterms:
+                shifts[state].add(symbol)
+            elif symbol in lexfirst:
+                shifts[state].update(lexfirst[symbol])
+
+        conflicts = []
+        forks = []
+        for state in range(len(self.kernels)):
+            items = sorted(set(self.reduce.get(state,empty_set)) | set(self.ereduce.get(state,empty_set)))
+            terms = shifts.get(state,empty_set)
+            if lookahead is None:
+                sr = [(term,items) for term in terms] if items else []
+                rr = [(None,items)] if len(items) > 1 else []
+                actions = len(items) + bool(terms)
+            else:
+                byterm = defaultdict(list) # maps terminal -> reductions applicable on it
+                for item in items:
+                    lset = lookahead[(state,)+item]
+                    if lset is any_symbol: # default reduction of a packed table, the state has no other action
+                        continue
+                    for term in lset:
+                        byterm[term].append(item)
+                sr = [(term,byterm[term]) for term in terms if term in byterm]
+                groups = defaultdict(list) # maps reductions -> terminals they are applicable together
+                for term,titems in byterm.items():
+                    if len(titems) > 1:
+                        groups[tuple(titems)].append(term)
+                rr = [(sorted(names[term] for term in gterms),list(gitems)) for gitems,gterms in groups.items()]
+                actions = max([len(titems) + (term in terms) for term,titems in byterm.items()] + [bool(terms)])
+            if sr or rr:
+                conflicts.append(dict(
+                    state = state,
+                    shift_reduce = sorted((names[term],[self.get_item(*item) for item in sitems]) for term,sitems in sr),
+                    reduce_reduce = sorted((gterms,[self.get_item(*item) for item in gitems]) for gterms,gitems in rr)
+                ))
+            if actions > 1:
+                forks.append((state,actions))
+
+        closures = [(state,len(self.get_state_items(kernel))) for state,kernel in enumerate(self.kernels)]
+        bysize = lambda item: (-item[1],item[0])
+        return dict(
+            states = len(self.kernels),
+            transitions = len(self.dfa),
+            nullable = sorted(names[symbol] for symbol in self.nullable),
+            conflicts = conflicts,
+            shift_reduce = sum(len(conflict["shift_reduce"]) for conflict in conflicts),
+            reduce_reduce = sum(len(conflict["reduce_reduce"]) for conflict in conflicts),
+            closures = sorted(closures,key=bysize)[:top],
+            forks = sorted(forks,key=bysize)[:top]
+        )
+
+    def load_grammar(self,fname=None,reverse=False,text=None,defines=None,lexical=True,optimize=False):
+        """ loads a grammar file and parse it, if parser has a cache the grammar is loaded from cache when possible
+        if lexical is True terminal-only rules are looked up in lexicon at shift time, instead of being compiled into LR automaton
+        if optimize is True unproductive and unreachable rules are removed (see Grammar.optimize), report is kept in grammar.optimized """
+        if self.cache:
+            self.cache_key = self.cache.make_key(fname,reverse,text,defines,lexical,optimize,
+                {name:getattr(self,name) for name in self.cache_tunables})
+            self.cache_entry = self.cache.load(self.cache_key)
+            if self.cache_entry:
+                logging.info("load_grammar: cache hit %s", self.cache_key)
+                self.set_grammar(self.cache_entry["grammar"])
+                return
+        grammar = Grammar.load_grammar(fname,reverse,text,defines,lexical)
+        if optimize:
+            report = grammar.optimize()
+            logging.info("optimize: %d unproductive, %d unreachable rules removed", len(report['unproductive']), len(report['unreachable']))
+        self.set_grammar(grammar)
+        if self.cache:
+            self.cache_entry = GrammarCache.new_entry(grammar.includes,grammar)
+            self.cache.store(self.cache_key,self.cache_entry)
         
         if logging.getLogger().isEnabledFor(logging.INFO):
             logging.info("rules=%s",self.format_rules())
-            logging.info("dict=%s","\n".join(self.trie.list()))
+            logging.info("lexicon=%d rules", len(self.lexicon))
+
+    def save_tables(self,fname):
+        """ writes compiled tables together with rules, symbol table and lexicon into a flat binary file to be loaded by load_tables """
+        if self.expanded is not None:
+            self.expand_all()
+        FlatTables.write(fname,self)
+
+    def generate_module(self,fname):
+        """ writes compiled tables into a Python module, importing it gives a ready-to-use parser (see ParserModule), whose parse
+        is specialized for the compile options, i.e. branches of other options and debug logging are removed """
+        if self.kernels is None:
+            raise GrammarError("generate_module: parser is not compiled")
+        if self.expanded is not None:
+            self.expand_all()
+        ParserModule.write(fname,self)
+
+    def load_tables(self,fname):
+        """ maps a file written by save_tables read-only, after which the parser can parse and translate without load_grammar and compile
+
+        tables are queried directly from the mapped file, so all processes loading the same file share one physical copy of it
+        """
+        self.tables = tables = FlatTables(fname)
+        for name in ('symtab', 'heads', 'lefts', 'rules', 'ruledict', 'dfa', 'reduce', 'ereduce', 'lookahead', 'lexicon', 'suff_idxs', 'suff_dict_list'):
+            setattr(self,name,getattr(tables,name))
+        self.post_processor.suff_idxs,self.post_processor.suff_dict_list = tables.suff_idxs,tables.suff_dict_list
+        self.grammar = None
+        self.kernels = None
+        self.expanded = None
+        self.cache_entry = None
+        self.emap,self.nullrules,self.units,self.fmap = tables.emap,tables.nullrules,tables.units,tables.fmap
+        self.smask,self.emask = tables.smask,tables.emask
+
+    def set_grammar(self,grammar):
+        """ sets rules, lexicon, symbol table and suffixes from a Grammar object, previously compiled tables are discarded """
+        self.grammar = grammar
+        self.rules,self.lexicon,self.symtab = grammar.rules,grammar.lexicon,grammar.symtab
+        self.suff_idxs,self.suff_dict_list = grammar.suff_idxs,grammar.suff_dict_list
+        self.post_processor.suff_idxs,self.post_processor.suff_dict_list = grammar.suff_idxs,grammar.suff_dict_list
+        self.kernels = None
+        self.expanded = None
+        self.emap = None
+        self.units = None
+        self.fmap = None
+        self.smask = self.emask = None
 
     def unify_up(dst,param,src,checklist):
         """ unification of "src" features into "dst" features, using filtering of "param", if unification fails raises UnifyError
@@ -502,18 +1408,19 @@ class Parser:
     def format_edge_item(alts):
         """ internal: format an edge item to str (used internally for logging/debugging) """
         return " ".join(["{2}({0},{1};{3},{4})".format(*alt) if type(alt)==tuple else " ".join(alt)
-                         for alt in alts[1:]])
+                         for alt in alts[2 if type(alts[0])==tuple else 1:]])
       
     def format_edge(self,edge):
         """ internal: format an edge into str (used internally for logging/debugging) """
+        names = self.symtab.names
         if edge not in self.edges:
             if type(edge)==tuple:
-                return "{2}({0},{1};{3},{4}) -> None".format(*edge)
+                return "{2}({0},{1};{3},{4}) -> None".format(*edge[:2],names[edge[2]],*edge[3:])
             else:
                 return " ".join(edge)
-        return  "{2}({0},{1};{3},{4}) -> ".format(*edge) + " | ".join( [ " ".join(
-            ["{2}({0},{1};{3},{4})".format(*alt) if type(alt)==tuple else alt
-             for alt in alts[1:]]) for alts in self.edges[edge]] )       
+        return  "{2}({0},{1};{3},{4}) -> ".format(*edge[:2],names[edge[2]],*edge[3:]) + " | ".join( [ " ".join(
+            ["{2}({0},{1};{3},{4})".format(*alt[:2],names[alt[2]],*alt[3:]) if type(alt)==tuple else alt
+             for alt in alts[2 if type(alts[0])==tuple else 1:]]) for alts in self.edges[edge]] )       
     
     def print_parse_tables(self):
         """ internal: print parse tables after parse """
@@ -524,9 +1431,10 @@ class Parser:
         print()
         for (epos,estate,symbol),startset in sorted(self.nodes.items()):
             for spos,sstate in startset:
-                print(space*spos, str(sstate).rjust(2), symbol.center((epos-spos)*indent-2,"="), str(estate).rjust(2,"="), " ", self.format_edge((spos,sstate,symbol,epos,estate)), sep="")
+                print(space*spos, str(sstate).rjust(2), self.symtab.names[symbol].center((epos-spos)*indent-2,"="), str(estate).rjust(2,"="), " ", self.format_edge((spos,sstate,symbol,epos,estate)), sep="")
 
     def make_tree(self):
+        """ generates a parse forest from edges, symbol ids of edges are resolved back to names here """
         self.tree = Tree(
             head = "S'",
             rule = self.rules[0],
@@ -539,27 +1447,95 @@ class Parser:
         """ generates a tree (which is a recursive list of lists) from edges """
         if edge not in self.edges:
             if type(edge)==tuple: #(state1,pos1,term,state2,pos2)
-                return edge[2]
+                return self.symtab.names[edge[2]]
             else: # list of non-terminals
                 return edge;
         alt = []
+        chains = []
+        head = self.symtab.names[edge[2]]
         for alt_edge in self.edges[edge]: 
-            ruleno = alt_edge[0]
-            if type(ruleno)==int:
-                rule = self.rules[ruleno]
+            if type(alt_edge[0])==tuple: # collapsed unit chain
+                chains.append(alt_edge)
             else:
-                rule = ruleno
-                ruleno = None
+                alt.extend(self.make_alt_trees(head,alt_edge))
+        if chains:
+            alt.extend(self.make_chain_trees(head,chains,0))
+        return alt
+
+    def make_alt_trees(self,head,alt_edge):
+        """ generates trees of an edge alternative [ruleno,sub_edge*], which are more than one if the rule is left-factored """
+        if self.fmap and alt_edge[0] in self.fmap:
+            return [self.make_rule_tree(head,ruleno,left) for ruleno,left in self.get_factored(alt_edge)]
+        return [self.make_rule_tree(head,alt_edge[0],[self.make_tree_int(sub_edge) for sub_edge in alt_edge[1:]])]
+
+    def get_factored(self,alt_edge):
+        """ returns list of (ruleno,left) for an edge alternative of a left-factored rule, i.e. the rules it is a part of with their sub-trees,
+        sub-trees of a synthetic NT (i.e. the last sub-edge of a rule ending with a synthetic NT) are merged into the rule """
+        ruleno = self.fmap[alt_edge[0]]
+        if ruleno is not None: # rest of a rule
+            return [(ruleno,[self.make_tree_int(sub_edge) for sub_edge in alt_edge[1:]])]
+        prefix = [self.make_tree_int(sub_edge) for sub_edge in alt_edge[1:-1]]
+        return [(ruleno,prefix+left) for rest_edge in self.edges[alt_edge[-1]] for ruleno,left in self.get_factored(rest_edge)]
+
+    def make_rule_tree(self,head,ruleno,left):
+        """ generates a tree of a reduction of rule "ruleno" with sub-trees "left" """
+        emap = self.emap
+        if emap and ruleno in emap: # variant of epsilon-free compile, omitted sub-trees are put back
+            ruleno,kept = emap[ruleno]
+            sub_trees = iter(left)
+            kept = set(kept)
+            left = [next(sub_trees) if pos in kept else self.make_null_tree(symbol) for pos,symbol in enumerate(self.rules[ruleno].left)]
+        if type(ruleno)==int:
+            rule = self.rules[ruleno]
+        else:
+            rule = ruleno
+            ruleno = None
+
+        assert type(ruleno)==int or ruleno is None, "ruleno=%s" % ruleno
+        assert type(rule) in (Rule,FrozenRule,MacroRule)
+
+        return Tree(
+            head = head,
+            rule = rule,
+            ruleno = ruleno, 
+            left = left,
+            right = rule.right,#.copy(),
+            feat = rule.feat,
+            cost = rule.cost
+        )
 
-            assert type(ruleno)==int or ruleno is None, "ruleno=%s" % ruleno
-            assert type(rule) == Rule
+    def make_chain_trees(self,head,chains,depth):
+        """ generates trees of collapsed unit chains (see compute_units), i.e. edge alternatives [chain,ruleno,sub_edge*] sharing chain[:depth]
 
+        alternatives sharing the unit rule at "depth" share its sub-forest, so the forest is the same as if unit reductions were not collapsed
+        """
+        alt = []
+        groups = dict()
+        for alt_edge in chains:
+            chain = alt_edge[0]
+            if depth == len(chain): # the reduction the chain starts with
+                alt.extend(self.make_alt_trees(head,alt_edge[1:]))
+            else:
+                groups.setdefault(chain[depth],[]).append(alt_edge)
+        for ruleno,group in groups.items():
+            symbol = self.symtab.names[self.lefts[ruleno][0]]
+            alt.append(self.make_rule_tree(head,ruleno,[self.make_chain_trees(symbol,group,depth+1)]))
+        return alt
+
+    def make_null_tree(self,symbol,visiting=()):
+        """ returns parse forest of a nullable NT deriving empty string, which is omitted by epsilon-free compile
+        rules being expanded (i.e. in "visiting") are skipped, so that cyclic empty derivations are cut """
+        alt = []
+        for ruleno in self.nullrules.get(symbol,empty_list):
+            if ruleno in visiting:
+                continue
+            rule = self.rules[ruleno]
             alt.append( Tree(
-                head = edge[2],
+                head = symbol,
                 rule = rule,
-                ruleno = ruleno, 
-                left = [self.make_tree_int(sub_edge) for sub_edge in alt_edge[1:]],
-                right = rule.right,#.copy(),
+                ruleno = ruleno,
+                left = [self.make_null_tree(sub_symbol,visiting+(ruleno,)) for sub_symbol in rule.left],
+                right = rule.right,
                 feat = rule.feat,
                 cost = rule.cost
             ) )
@@ -573,7 +1549,7 @@ class Parser:
         states.add(0)
         print("".rjust(width),",",end="")
         for symbol in symbols:
-            print(symbol.rjust(width),",",end="")
+            print(self.symtab.names[symbol].rjust(width),",",end="")
         print("$")
         for state in states:
             print(str(state).rjust(width),",",end="")
@@ -587,28 +1563,46 @@ class Parser:
         dfa = self.dfa
         reduce = self.reduce
         ereduce = self.ereduce
+        lookahead = self.lookahead
+        heads = self.heads
+        lefts = self.lefts
+        lexicon = self.lexicon
+        symid = self.symtab.get
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        epsilon_free = self.emap is not None # there are no e-reductions, e-reduce phase is skipped
+        units = self.units
+        vectorized = isinstance(dfa,VectorDfa) # shifts of many active states on a symbol are found at once
+        min_active = self.vector_min_active
+        smask,emask = self.smask,self.emask
+        bitsets = smask is not None # active states of a position are an int with a bit set for each state
         logging.info("input=%s", instr)
 
         instr = instr.split(" ")
-        instr.append("$")
+        instr.append(SymbolTable.end)
         inlen = len(instr)
+        tokens = [symid(word) for word in instr] # input mapped to symbol ids once, unknown words are -1
+        end = tokens[-1]
         nodes = defaultdict(set) # maps (pos,state,symbol) to set of (oldpos,oldstate) (i.e adds an arc from (pos,state) to (oldpos,oldstate) labeled with symbol)
         edges = defaultdict(list) # maps an edge to sub-edges of a production e.g. (p0,s0,S,p2,s2') -> [ (p0,s0,NP,p1,s1), (p1,s1,VP,p2,s2) ] where s0,S->s2'
-        fstate = dfa[0,"S"]
+        start = lefts[0][0] # S' -> S
+        fstate = dfa[0,start]
         
         self.nodes = nodes
         self.edges = edges
         self.instr = instr
-        self.top_edge = (0,0,"S",inlen-1,fstate)
+        self.top_edge = (0,0,start,inlen-1,fstate)
 
-        act_states = [set() for i in range(inlen)] # active set of states for each position
+        act_states = [0]*inlen if bitsets else [set() for i in range(inlen)] # active set of states for each position
         act_edges  = [set() for i in range(inlen)] # active set of edges for each position
 
-        act_states[0].add(0); # add initial state to initial position
+        if bitsets:
+            act_states[0] = 1 # add initial state to initial position
+        else:
+            act_states[0].add(0);
 
         
         for pos in range(inlen):
-            token = instr[pos]         
+            token = tokens[pos]
              
             rlist = list(act_edges[pos])
             active = act_states[pos]
@@ -619,9 +1613,12 @@ class Parser:
                 spos,sstate,esymbol,epos,estate = edge
                 logging.debug("Checking Work Item: %s  All: %s", edge, rlist)
                 for ruleno,rulepos in reduce.get(estate,set()): # find reducible items for end_state
-                    head = self.rules[ruleno].head
-                    body = self.rules[ruleno].left
-                    logging.debug("Reducing %s ", self.get_item(ruleno,rulepos))
+                    if lookahead is not None and token not in lookahead[estate,ruleno,rulepos]:
+                        continue
+                    head = heads[ruleno]
+                    body = lefts[ruleno]
+                    if debug:
+                        logging.debug("Reducing %s ", self.get_item(ruleno,rulepos))
                     ptree = [edge]
                         
                     state = estate
@@ -642,25 +1639,42 @@ class Parser:
                                     
                             stack = nstack
                     for ppos,pstate,ptree in stack:                      
-                        nstate = self.dfa.get((pstate,head),-1)
-                        logging.debug("REDUCE %s , %s -> %s", pstate, head, nstate)
-                        if nstate != -1:
-                            active.add(nstate)
-                            nodes[pos,nstate,head].add((ppos,pstate))
-                            nedge = (ppos,pstate,head,pos,nstate) 
-                            if nedge not in edges:
-                                rlist.append(nedge)
-                            ptree = [ruleno] + ptree
-                            logging.debug("appending edge %s to %s", Parser.format_edge_item(ptree), self.format_edge(nedge))
-                            edges[nedge].append(ptree)
-
-            actlist = list(active)
+                        ptree = [ruleno] + ptree
+                        chains = units.get((pstate,head)) if units else None
+                        if chains is None:
+                            gotos = ((head,dfa.get((pstate,head),-1),ptree),)
+                        else: # goto to a unit-only state, whole chains of unit reductions are applied at once
+                            gotos = [(uhead,ustate,[chain]+ptree) for chain,uhead,ustate,la in chains if la is None or token in la]
+                        for nhead,nstate,ptree in gotos:
+                            logging.debug("REDUCE %s , %s -> %s", pstate, nhead, nstate)
+                            if nstate != -1:
+                                if bitsets:
+                                    active |= 1 << nstate
+                                else:
+                                    active.add(nstate)
+                                nodes[pos,nstate,nhead].add((ppos,pstate))
+                                nedge = (ppos,pstate,nhead,pos,nstate) 
+                                if nedge not in edges:
+                                    rlist.append(nedge)
+                                if debug:
+                                    logging.debug("appending edge %s to %s", Parser.format_edge_item(ptree), self.format_edge(nedge))
+                                edges[nedge].append(ptree)
+
+            if epsilon_free:
+                actlist = empty_list
+            elif bitsets: # only states having e-reductions
+                actlist = list(iter_bits(active & emask))
+            else:
+                actlist = list(active)
 
             for state in actlist:
                 for ruleno,rulepos in ereduce.get(state,set()):
-                    logging.debug("e-Reducing %s", self.get_item(ruleno,rulepos))
-                    head = self.rules[ruleno].head
-                    body = self.rules[ruleno].left
+                    if lookahead is not None and token not in lookahead[state,ruleno,rulepos]:
+                        continue
+                    if debug:
+                        logging.debug("e-Reducing %s", self.get_item(ruleno,rulepos))
+                    head = heads[ruleno]
+                    body = lefts[ruleno]
                     ptree = [ruleno]
                     estate = state
                     for symbol in body[rulepos:]:
@@ -670,17 +1684,25 @@ class Parser:
                     nstate = dfa.get((state,head),-1)
                     logging.debug("EREDUCE %s , %s -> %s", state, head, nstate)
                     if nstate!= -1:
-                        if nstate not in active:
+                        if bitsets:
+                            if not active >> nstate & 1:
+                                active |= 1 << nstate
+                                if emask >> nstate & 1:
+                                    actlist.append(nstate)
+                        elif nstate not in active:
                             active.add(nstate)
                             actlist.append(nstate)
                         nodes[pos,nstate,head].add((pos,state))
                         nedge = (pos,state,head,pos,nstate)
-                        logging.debug("appending edge %s to %s", Parser.format_edge_item(ptree), self.format_edge(nedge))
+                        if debug:
+                            logging.debug("appending edge %s to %s", Parser.format_edge_item(ptree), self.format_edge(nedge))
                         edges[nedge].append(ptree)
       
+            if bitsets:
+                act_states[pos] = active
             logging.debug("active=%s input= %s", active, token)
-            if token == "$":
-                if fstate in active:
+            if token == end:
+                if (active >> fstate & 1 if bitsets else fstate in active):
                     logging.info("Parse successful")
                 else:
                     while not act_states[pos]:
@@ -693,8 +1715,8 @@ class Parser:
                     #logging.error("not active, %s",active)
                     #raise ParseError("Cannot shift %s<< %s" % (" ".join(instr[0:pos])," ".join(instr[pos:])))
 
-                for state in active:
-                    nstate = dfa.get((state,token),-1)
+                states = list(iter_bits(active & smask.get(token,0))) if bitsets else active # with bitsets, only states having a transition on token
+                for state,nstate in (dfa.shift(states,token) if vectorized and len(states) >= min_active else [(state,dfa.get((state,token),-1)) for state in states]):
                     #print(state,",",token,"->",nstate)
                     if nstate != -1:                       
                         logging.debug("add nodes[%s] = %s",(pos+1,nstate,token),(pos,state)) 
@@ -702,27 +1724,40 @@ class Parser:
                         logging.debug("shift %s = %s", (pos+1,nstate,token,pos,state),token)
                     
                         act_edges[pos+1].add((pos,state,token,pos+1,nstate))
-                        act_states[pos+1].add(nstate)
+                        if bitsets:
+                            act_states[pos+1] |= 1 << nstate
+                        else:
+                            act_states[pos+1].add(nstate)
 
-                items = self.trie.search(instr[pos:])
+                items = lexicon.search(tokens,pos)
                 logging.debug("Shift pos: %d items: %s", pos, items)
-                #items.append((1,(token,[],[]))
-                for input_len,rule in items:
-                    token = rule.head
+                key = None
+                for input_len,head,ruleno in items:
                     nextpos = pos + input_len
-                    for state in active:
-                        nstate = dfa.get((state,token),-1)
-                        if nstate != -1:                           
-                            logging.debug("add nodes[%s] = %s",(nextpos,nstate,token),(pos,state)) 
-                            nodes[nextpos,nstate,token].add((pos,state))
-                            nedge = (pos,state,token,nextpos,nstate)
-                            logging.debug("shift %s = %s", nedge, token)
-                    
-                            act_edges[nextpos].add(nedge)
-                            act_states[nextpos].add(nstate)
-
-                            edges[nedge].append([rule]+rule.left)
-                            #logging.debug("appending edge %s to %s", Parser.format_edge_item(ptree), self.format_edge(nedge))
+                    if (input_len,head) != key: # values of a lexicon node are grouped by head, so gotos are found once per (length,head)
+                        key = (input_len,head)
+                        targets = [] # list of (state,head,nstate,chain), chain is None unless unit reductions following the shift are collapsed
+                        states = list(iter_bits(active & smask.get(head,0))) if bitsets else active
+                        for state,nstate in (dfa.shift(states,head) if vectorized and len(states) >= min_active else [(state,dfa.get((state,head),-1)) for state in states]):
+                            if nstate == -1:
+                                continue
+                            chains = units.get((state,head)) if units else None
+                            if chains is None:
+                                targets.append((state,head,nstate,None))
+                            else: # unit reductions are done at "nextpos"
+                                targets.extend((state,uhead,ustate,chain) for chain,uhead,ustate,la in chains if la is None or tokens[nextpos] in la)
+                        for state,nhead,nstate,chain in targets:
+                            logging.debug("add nodes[%s] = %s",(nextpos,nstate,nhead),(pos,state)) 
+                            nodes[nextpos,nstate,nhead].add((pos,state))
+                            act_edges[nextpos].add((pos,state,nhead,nextpos,nstate))
+                            if bitsets:
+                                act_states[nextpos] |= 1 << nstate
+                            else:
+                                act_states[nextpos].add(nstate)
+                    words = instr[pos:nextpos]
+                    for state,nhead,nstate,chain in targets:
+                        logging.debug("shift %s = %s", (pos,state,nhead,nextpos,nstate), nhead)
+                        edges[pos,state,nhead,nextpos,nstate].append([ruleno]+words if chain is None else [chain,ruleno]+words)
 
     def trans_sent(self,sent):
         """ translates a sentence, returns a list of possible translations or an error """
@@ -0,0 +1,506 @@
+""" Flat binary format of compiled parse tables, which can be memory mapped read-only and queried directly by Parser.parse
+
+This file define classes:
+    FlatTables: writes compiled tables of a parser into a flat binary file and opens such a file with mmap
+    FlatSymbolTable,FlatDfa,FlatReduce,FlatLookahead,FlatLefts,FlatLexicon,FlatRules,FlatRuleDict: read-only views on
+        sections of a mapped file, providing the part of the interface of the corresponding in-memory tables used by Parser
+    PackedDfa,PackedLookahead: compressed in-memory tables produced by compile(packed=True), see Parser.pack_tables
+    VectorDfa: dfa produced by compile(vectorized=True), which also finds transitions of a set of states at once using numpy
+
+All sections are arrays of native int32 or byte strings, which are accessed via memoryview over the mapped file without copying,
+so that all processes mapping the same file share one physical copy. Only rules (and post-processor suffix data, maps of transformed rules, unit chains, state bitsets) are pickled;
+a rule is unpickled when it is accessed, e.g. while generating a tree
+"""
+import mmap, pickle, zlib, sys, struct
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+try:
+    import numpy
+except ImportError: # optional, only needed by VectorDfa
+    numpy = None
+
+class FlatSymbolTable:
+    """ SymbolTable view: names (id -> name) and get (name -> id) using an open-addressing hash table """
+    def __init__(self,offs,data,slots):
+        self.offs = offs
+        self.data = data
+        self.slots = slots
+        self.mask = len(slots)-1
+        self.names = FlatNames(offs,data)
+
+    def hash(name):
+        return zlib.crc32(name)
+
+    def get(self,name,default=-1):
+        """ returns id of a symbol, or default if symbol is unknown """
+        key = name.encode("utf-8")
+        offs,data,slots,mask = self.offs,self.data,self.slots,self.mask
+        idx = FlatSymbolTable.hash(key) & mask
+        while True:
+            symbol = slots[idx]
+            if symbol < 0:
+                return default
+            if data[offs[symbol]:offs[symbol+1]] == key:
+                return symbol
+            idx = (idx+1) & mask
+
+    def __len__(self):
+        return len(self.offs)-1
+
+class FlatNames:
+    """ list of symbol names stored as utf-8 strings """
+    def __init__(self,offs,data):
+        self.offs = offs
+        self.data = data
+
+    def __getitem__(self,symbol):
+        return str(self.data[self.offs[symbol]:self.offs[symbol+1]],"utf-8")
+
+    def __len__(self):
+        return len(self.offs)-1
+
+class FlatDfa:
+    """ dfa view, transitions of each state are stored as sorted rows of (symbol,nextstate) """
+    def __init__(self,offs,symbols,states):
+        self.offs = offs
+        self.symbols = symbols
+        self.states = states
+
+    def get(self,key,default=None):
+        state,symbol = key
+        if state < 0:
+            return default
+        hi = self.offs[state+1]
+        idx = bisect_left(self.symbols,symbol,self.offs[state],hi)
+        if idx < hi and self.symbols[idx] == symbol:
+            return self.states[idx]
+        return default
+
+    def __getitem__(self,key):
+        nstate = self.get(key)
+        if nstate is None:
+            raise KeyError(key)
+        return nstate
+
+    def items(self):
+        offs = self.offs
+        for state in range(len(offs)-1):
+            for idx in range(offs[state],offs[state+1]):
+                yield (state,self.symbols[idx]),self.states[idx]
+
+    def __len__(self):
+        return len(self.symbols)
+
+class PackedDfa:
+    """ dfa packed by row displacement: rows of all states are overlaid in a single pair of arrays, transition (state,symbol)
+    is at index base[state]+symbol of "nexts" if check[index] == state, rows are placed first-fit in order of decreasing length """
+    def __init__(self,dfa,nstates):
+        rows = [[] for state in range(nstates)]
+        for (state,symbol),nstate in dfa.items():
+            rows[state].append((symbol,nstate))
+        base = array('i',[0])*nstates
+        check = array('i')
+        nexts = array('i')
+        used = bytearray() # 1 for a used slot
+        usedmask = 0 # same as a bit mask
+        for state in sorted(range(nstates),key=lambda state: -len(rows[state])):
+            row = rows[state]
+            if not row:
+                continue
+            low = min(symbol for symbol,nstate in row)
+            mask = 0
+            for symbol,nstate in row:
+                mask |= 1 << (symbol-low)
+            pos = used.find(0)
+            while pos >= 0 and (usedmask >> pos) & mask: # first fit, only free slots are tried for the lowest symbol
+                pos = used.find(0,pos+1)
+            if pos < 0:
+                pos = len(used)
+            usedmask |= mask << pos
+            offset = pos-low
+            top = offset+max(symbol for symbol,nstate in row)+1
+            if top > len(check):
+                check.extend([-1]*(top-len(check)))
+                nexts.extend([-1]*(top-len(nexts)))
+                used.extend(bytes(top-len(used)))
+            for symbol,nstate in row:
+                check[offset+symbol] = state
+                nexts[offset+symbol] = nstate
+                used[offset+symbol] = 1
+            base[state] = offset
+        self.base = base
+        self.check = check
+        self.nexts = nexts
+        self.size = len(check)
+        self.count = len(dfa)
+
+    def get(self,key,default=None):
+        state,symbol = key
+        if state < 0:
+            return default
+        idx = self.base[state]+symbol
+        if 0 <= idx < self.size and self.check[idx] == state:
+            return self.nexts[idx]
+        return default
+
+    def __getitem__(self,key):
+        nstate = self.get(key)
+        if nstate is None:
+            raise KeyError(key)
+        return nstate
+
+    def items(self):
+        for idx,state in enumerate(self.check):
+            if state >= 0:
+                yield (state,idx-self.base[state]),self.nexts[idx]
+
+    def __len__(self):
+        return self.count
+
+class AnySymbol:
+    """ lookahead set of a default reduction, containing every symbol """
+    def __contains__(self,symbol):
+        return True
+
+    def __reduce__(self):
+        return "any_symbol" # pickled by reference, so the singleton can be compared with "is"
+
+any_symbol = AnySymbol()
+
+class PackedLookahead(dict):
+    """ lookahead table without entries of default reductions, i.e. reductions which are the only action of their states,
+    those are done on any token and their lookahead set is any_symbol """
+    def __missing__(self,key):
+        return any_symbol
+
+class VectorDfa(dict):
+    """ dfa dict which also keeps transitions in numpy int32 arrays, so that shift finds the transitions of all active states on a symbol with a single gather
+
+    if nstates*nsymbols <= max_cells, transitions are kept in a dense matrix[state,symbol] -> nextstate or -1, otherwise in
+    compressed columns: transitions sorted by (symbol,state), those on a symbol are col_states[col_off[symbol]:col_off[symbol+1]] with next states in col_next
+    single lookups (e.g. while reducing) use the dict
+    """
+    def __init__(self,dfa,nstates,nsymbols,max_cells):
+        dict.__init__(self,dfa)
+        self.nsymbols = nsymbols
+        trans = numpy.array([(symbol,state,nstate) for (state,symbol),nstate in dfa.items()],dtype=numpy.int32).reshape(-1,3)
+        if nstates*nsymbols <= max_cells:
+            self.matrix = numpy.full((nstates,nsymbols),-1,dtype=numpy.int32)
+            self.matrix[trans[:,1],trans[:,0]] = trans[:,2]
+        else:
+            self.matrix = None
+            trans = trans[numpy.lexsort((trans[:,1],trans[:,0]))]
+            self.col_off = numpy.searchsorted(trans[:,0],numpy.arange(nsymbols+1,dtype=numpy.int32))
+            self.col_states = numpy.ascontiguousarray(trans[:,1])
+            self.col_next = numpy.ascontiguousarray(trans[:,2])
+
+    def shift(self,states,symbol):
+        """ returns (state,nextstate) pairs for "states" having a transition on "symbol", in iteration order of "states" """
+        if not states or not 0 <= symbol < self.nsymbols:
+            return ()
+        states = numpy.fromiter(states,dtype=numpy.int32,count=len(states))
+        if self.matrix is not None:
+            nexts = self.matrix[states,symbol]
+            found = nexts >= 0
+            return zip(states[found].tolist(),nexts[found].tolist())
+        lo,hi = self.col_off[symbol],self.col_off[symbol+1]
+        if lo == hi:
+            return ()
+        column = self.col_states[lo:hi]
+        idx = numpy.minimum(numpy.searchsorted(column,states),hi-lo-1)
+        found = column[idx] == states
+        return zip(states[found].tolist(),self.col_next[lo:hi][idx[found]].tolist())
+
+class FlatReduce:
+    """ reduce/ereduce view, items of each state are stored as rows of (ruleno,rulepos) pairs """
+    def __init__(self,offs,items):
+        self.offs = offs
+        self.items_ = items
+
+    def get(self,state,default=None):
+        lo,hi = self.offs[state],self.offs[state+1]
+        if lo == hi:
+            return default
+        items = self.items_
+        return [(items[idx],items[idx+1]) for idx in range(2*lo,2*hi,2)]
+
+    def find(self,state,ruleno,rulepos):
+        """ returns index of an item of a state, or -1 """
+        items = self.items_
+        for idx in range(self.offs[state],self.offs[state+1]):
+            if items[2*idx] == ruleno and items[2*idx+1] == rulepos:
+                return idx
+        return -1
+
+    def items(self):
+        for state in range(len(self.offs)-1):
+            items = self.get(state)
+            if items:
+                yield state,items
+
+class FlatLookahead:
+    """ lookahead view, lookahead sets are stored as sorted rows aligned with items of reduce and ereduce """
+    def __init__(self,reduce,ereduce,red_offs,red_syms,ered_offs,ered_syms):
+        self.tables = ((ereduce,ered_offs,ered_syms),(reduce,red_offs,red_syms))
+
+    def __getitem__(self,key):
+        state,ruleno,rulepos = key
+        table,offs,symbols = self.tables[rulepos>0]
+        idx = table.find(state,ruleno,rulepos)
+        if idx < 0:
+            raise KeyError(key)
+        lo = offs[idx]
+        if offs[idx+1] == lo+1 and symbols[lo] == -1:
+            return any_symbol
+        return FlatSet(symbols,lo,offs[idx+1])
+
+class FlatSet:
+    """ a sorted row of symbols supporting "in" operator """
+    __slots__ = ('symbols','lo','hi')
+    def __init__(self,symbols,lo,hi):
+        self.symbols = symbols
+        self.lo = lo
+        self.hi = hi
+
+    def __contains__(self,symbol):
+        idx = bisect_left(self.symbols,symbol,self.lo,self.hi)
+        return idx < self.hi and self.symbols[idx] == symbol
+
+    def __iter__(self):
+        return iter(self.symbols[self.lo:self.hi].tolist())
+
+    def __len__(self):
+        return self.hi-self.lo
+
+class FlatLefts:
+    """ lefts view, lefts[ruleno] -> (symbol*) """
+    def __init__(self,offs,symbols):
+        self.offs = offs
+        self.symbols = symbols
+
+    def __getitem__(self,ruleno):
+        return tuple(self.symbols[self.offs[ruleno]:self.offs[ruleno+1]])
+
+    def __len__(self):
+        return len(self.offs)-1
+
+class FlatLexicon:
+    """ Lexicon view, phrases following a node are stored as sorted rows of (word,node) """
+    def __init__(self,first,next_offs,next_words,next_nodes,value_offs,values):
+        self.first = first
+        self.next_offs = next_offs
+        self.next_words = next_words
+        self.next_nodes = next_nodes
+        self.value_offs = value_offs
+        self.values = values
+
+    def search(self,tokens,pos):
+        """ returns list of (length,head,ruleno) of all phrases in the lexicon starting at "pos" of "tokens" (list of symbol ids) """
+        result = []
+        word = tokens[pos]
+        if word < 0 or word >= len(self.first):
+            return result
+        node = self.first[word]
+        next_offs,next_words,value_offs,values = self.next_offs,self.next_words,self.value_offs,self.values
+        end = len(tokens)
+        length = 1
+        while node:
+            for idx in range(value_offs[node],value_offs[node+1]):
+                result.append((length,values[2*idx],values[2*idx+1]))
+            if pos+length == end:
+                break
+            word = tokens[pos+length]
+            hi = next_offs[node+1]
+            idx = bisect_left(next_words,word,next_offs[node],hi)
+            node = self.next_nodes[idx] if idx < hi and next_words[idx] == word else 0
+            length += 1
+        return result
+
+    def __len__(self):
+        return self.value_offs[-1]
+
+class FlatRules:
+    """ rule list view, each rule is pickled separately and unpickled on first access """
+    def __init__(self,offs,data):
+        self.offs = offs
+        self.data = data
+        self.rules = dict()
+
+    def __getitem__(self,ruleno):
+        rule = self.rules.get(ruleno)
+        if rule is None:
+            if ruleno < 0:
+                ruleno += len(self)
+            rule = self.rules[ruleno] = pickle.loads(self.data[self.offs[ruleno]:self.offs[ruleno+1]])
+        return rule
+
+    def __iter__(self):
+        return (self[ruleno] for ruleno in range(len(self)))
+
+    def __len__(self):
+        return len(self.offs)-1
+
+class FlatRuleDict:
+    """ ruledict view, maps NT name -> list of rulenos """
+    def __init__(self,symtab,offs,rulenos):
+        self.symtab = symtab
+        self.offs = offs
+        self.rulenos = rulenos
+
+    def __getitem__(self,name):
+        symbol = self.symtab.get(name)
+        if symbol < 0:
+            return []
+        return self.rulenos[self.offs[symbol]:self.offs[symbol+1]].tolist()
+
+class FlatTables:
+    """ Compiled tables in a flat binary file
+
+    file format: MAGIC + VERSION(4 bytes) + section count(4 bytes) + directory + sections
+        directory: for each section name(16 bytes) + typecode(1 byte, 'i' or 'B') + offset(8 bytes) + size in bytes(8 bytes)
+        sections are aligned to 8 bytes, int32 arrays are in native byte order which is checked when the file is opened
+    """
+    MAGIC = b"GLRT"
+    VERSION = 1
+    entry = struct.Struct("<16scQQ")
+
+    def lookahead_row(lset):
+        """ returns a lookahead set as a sorted row, [-1] for any_symbol """
+        return [-1] if lset is any_symbol else sorted(lset)
+
+    def write(fname,parser):
+        """ writes compiled tables of "parser" (including rules, symbol table and lexicon) into a file """
+        sections = dict()
+        def int_array(name,values=()):
+            sections[name] = arr = array('i',values)
+            return arr
+        def rows(prefix,nrows,get_row,width=1):
+            """ stores rows as offsets + flattened items, a row is a list of tuples(of width items) or ints """
+            offs = int_array(prefix+"_off",[0])
+            data = int_array(prefix)
+            for idx in range(nrows):
+                row = get_row(idx)
+                for item in row:
+                    if width == 1:
+                        data.append(item)
+                    else:
+                        data.extend(item)
+                offs.append(len(data)//width)
+
+        sections["byteorder"] = sys.byteorder.encode()
+        # symbol table
+        symtab = parser.symtab
+        names = [name.encode("utf-8") for name in symtab.names]
+        offs = int_array("sym_off",[0])
+        for name in names:
+            offs.append(offs[-1]+len(name))
+        sections["sym_str"] = b"".join(names)
+        size = 1
+        while size < 2*len(names):
+            size *= 2
+        slots = int_array("sym_hash",[-1]*size)
+        for symbol,name in enumerate(names):
+            idx = FlatSymbolTable.hash(name) & (size-1)
+            while slots[idx] >= 0:
+                idx = (idx+1) & (size-1)
+            slots[idx] = symbol
+
+        # rules
+        int_array("heads",parser.heads)
+        rows("lefts",len(parser.lefts),lambda ruleno: parser.lefts[ruleno])
+        data = []
+        offs = int_array("rule_off",[0])
+        for rule in parser.rules:
+            data.append(pickle.dumps(rule,pickle.HIGHEST_PROTOCOL))
+            offs.append(offs[-1]+len(data[-1]))
+        sections["rule_data"] = b"".join(data)
+        ruledict = defaultdict(list)
+        for name,rulenos in parser.ruledict.items():
+            ruledict[symtab.ids[name]] = rulenos
+        rows("ruledict",len(names),lambda symbol: ruledict.get(symbol,()))
+
+        # automaton
+        nstates = len(parser.kernels)
+        dfa = defaultdict(list)
+        for (state,symbol),nstate in parser.dfa.items():
+            dfa[state].append((symbol,nstate))
+        trans = [sorted(dfa[state]) for state in range(nstates)]
+        rows("dfa_sym",nstates,lambda state: [symbol for symbol,nstate in trans[state]])
+        int_array("dfa_next",[nstate for row in trans for symbol,nstate in row])
+        reduce = [list(parser.reduce.get(state,())) for state in range(nstates)] # iteration order of sets is kept, so are the alternatives of trees
+        ereduce = [list(parser.ereduce.get(state,())) for state in range(nstates)]
+        rows("reduce",nstates,lambda state: reduce[state],2)
+        rows("ereduce",nstates,lambda state: ereduce[state],2)
+        if parser.lookahead is not None:
+            for name,table in (("la_reduce",reduce),("la_ereduce",ereduce)):
+                items = [(state,)+item for state in range(nstates) for item in table[state]]
+                rows(name,len(items),lambda idx: FlatTables.lookahead_row(parser.lookahead[items[idx]]))
+
+        # lexicon
+        lexicon = parser.lexicon
+        int_array("lex_first",lexicon.first)
+        nexts = defaultdict(list)
+        for (node,word),nnode in lexicon.nexts.items():
+            nexts[node].append((word,nnode))
+        nexts = [sorted(nexts[node]) for node in range(len(lexicon.values))]
+        rows("lex_next",len(nexts),lambda node: [word for word,nnode in nexts[node]])
+        int_array("lex_next_node",[nnode for row in nexts for word,nnode in row])
+        rows("lex_val",len(lexicon.values),lambda node: lexicon.values[node],2)
+
+        sections["extra"] = pickle.dumps(dict(suff_idxs=parser.suff_idxs, suff_dict_list=parser.suff_dict_list, emap=parser.emap, nullrules=parser.nullrules, units=parser.units, fmap=parser.fmap, smask=parser.smask, emask=parser.emask),pickle.HIGHEST_PROTOCOL)
+
+        header_size = len(FlatTables.MAGIC)+8+len(sections)*FlatTables.entry.size
+        directory = []
+        blobs = []
+        pos = (header_size+7) & ~7
+        for name,section in sections.items():
+            blob = section.tobytes() if type(section) == array else section
+            directory.append(FlatTables.entry.pack(name.encode(),b'i' if type(section) == array else b'B',pos,len(blob)))
+            pad = -len(blob) & 7
+            blobs.append(blob+b"\0"*pad)
+            pos += len(blob)+pad
+        with open(fname,"wb") as f:
+            f.write(FlatTables.MAGIC)
+            f.write(struct.pack("<II",FlatTables.VERSION,len(sections)))
+            f.write(b"".join(directory))
+            f.write(b"\0"*(-header_size & 7))
+            for blob in blobs:
+                f.write(blob)
+
+    def __init__(self,fname):
+        """ maps a flat table file read-only """
+        with open(fname,"rb") as f:
+            self.mmap = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        view = memoryview(self.mmap)
+        magic = bytes(view[:len(self.MAGIC)])
+        version,count = struct.unpack_from("<II",view,len(self.MAGIC))
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("%s: not a flat table file of version %d" % (fname,self.VERSION))
+        self.sections = sections = dict()
+        pos = len(self.MAGIC)+8
+        for idx in range(count):
+            name,typecode,offset,size = self.entry.unpack_from(view,pos)
+            pos += self.entry.size
+            section = view[offset:offset+size]
+            sections[name.rstrip(b"\0").decode()] = section.cast('i') if typecode == b'i' else section
+        if bytes(sections["byteorder"]) != sys.byteorder.encode():
+            raise ValueError("%s: byte order mismatch" % fname)
+
+        self.symtab = FlatSymbolTable(sections["sym_off"],sections["sym_str"],sections["sym_hash"])
+        self.heads = sections["heads"]
+        self.lefts = FlatLefts(sections["lefts_off"],sections["lefts"])
+        self.rules = FlatRules(sections["rule_off"],sections["rule_data"])
+        self.ruledict = FlatRuleDict(self.symtab,sections["ruledict_off"],sections["ruledict"])
+        self.dfa = FlatDfa(sections["dfa_sym_off"],sections["dfa_sym"],sections["dfa_next"])
+        self.reduce = FlatReduce(sections["reduce_off"],sections["reduce"])
+        self.ereduce = FlatReduce(sections["ereduce_off"],sections["ereduce"])
+        if "la_reduce" in sections:
+            self.lookahead = FlatLookahead(self.reduce,self.ereduce,sections["la_reduce_off"],sections["la_reduce"],sections["la_ereduce_off"],sections["la_ereduce"])
+        else:
+            self.lookahead = None
+        self.lexicon = FlatLexicon(sections["lex_first"],sections["lex_next_off"],sections["lex_next"],sections["lex_next_node"],sections["lex_val_off"],sections["lex_val"])
+        extra = pickle.loads(sections["extra"])
+        self.suff_idxs,self.suff_dict_list = extra["suff_idxs"],extra["suff_dict_list"]
+        self.emap,self.nullrules,self.units,self.fmap = extra.get("emap"),extra.get("nullrules"),extra.get("units"),extra.get("fmap")
+        self.smask,self.emask = extra.get("smask"),extra.get("emask")
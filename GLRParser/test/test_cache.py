@@ -0,0 +1,229 @@
+import sys, os, unittest, tempfile, shutil, time
+sys.path.append("../..")
+from GLRParser import Parser, ParseError, GrammarError, Tree, Grammar, IncludeCache
+
+class TestCache(unittest.TestCase):
+    grammar = """
+        S -> NP VP : NP VP
+        S -> S in NP : NP -de S
+        NP -> i :
+        NP -> the man : adam
+        NP -> the house : ev
+        NP -> NP-1 in NP-2 : NP-2 -deki NP-1
+        %include "{}"
+    """
+    include = """
+        VP -> saw NP : NP -ı gördüm
+    """
+    sent = "i saw the man in the house"
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.include_fname = os.path.join(self.cache_dir,"vp.grm")
+        self.write_include(self.include)
+        self.text = self.grammar.format(self.include_fname.replace("\\","/"))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def write_include(self,text):
+        with open(self.include_fname,"w") as f:
+            f.write(text)
+
+    def make_parser(self,**kwargs):
+        parser = Parser(cache_dir=self.cache_dir)
+        parser.load_grammar(text=self.text,**kwargs)
+        parser.compile()
+        return parser
+
+    def translate(self,parser):
+        return sorted(parser.trans_sent(self.sent))
+
+    def test_hit(self):
+        parser1 = self.make_parser()
+        parser2 = Parser(cache_dir=self.cache_dir)
+        parser2.load_grammar(text=self.text)
+        self.assertIsNotNone(parser2.cache_entry["tables"])
+        parser2.compile()
+        self.assertEqual(parser1.rules, parser2.rules)
+        for name in Parser.table_names:
+            with self.subTest(table=name):
+                self.assertEqual(getattr(parser1,name), getattr(parser2,name))
+        self.assertEqual(self.translate(parser1), self.translate(parser2))
+
+    def test_report(self):
+        parser1 = self.make_parser()
+        parser2 = Parser(cache_dir=self.cache_dir)
+        parser2.load_grammar(text=self.text)
+        parser2.compile()
+        self.assertIsNone(parser2.statedict)
+        self.assertEqual(parser2.compile_report(), parser1.compile_report())
+        self.assertEqual(self.translate(parser1), self.translate(parser2))
+
+    def test_key(self):
+        parser = self.make_parser()
+        key = parser.cache_key
+        self.assertNotEqual(key, self.make_parser(reverse=True).cache_key)
+        self.assertNotEqual(key, self.make_parser(defines={"token"}).cache_key)
+        self.assertEqual(key, self.make_parser().cache_key)
+
+    def test_tunables(self):
+        """ parser attributes which change compiled tables are part of the key """
+        key = self.make_parser().cache_key
+        class FactorParser(Parser):
+            factor_min_prefix = 3
+        parser = FactorParser(cache_dir=self.cache_dir)
+        parser.load_grammar(text=self.text)
+        self.assertIsNone(parser.cache_entry["tables"]) # miss
+        keys = [key,parser.cache_key]
+        parser = Parser(cache_dir=self.cache_dir)
+        parser.dense_max_cells = 16
+        parser.load_grammar(text=self.text)
+        self.assertIsNone(parser.cache_entry["tables"])
+        keys.append(parser.cache_key)
+        self.assertEqual(len(set(keys)), 3)
+
+    def test_include_changed(self):
+        parser1 = self.make_parser()
+        self.write_include("VP -> saw NP : NP -ı gördün")
+        parser2 = Parser(cache_dir=self.cache_dir)
+        parser2.load_grammar(text=self.text)
+        self.assertIsNone(parser2.cache_entry["tables"])
+        parser2.compile()
+        self.assertEqual(self.translate(parser2), [('evde adamı gördün', 0), ('evdeki adamı gördün', 0)])
+
+    def test_corrupt(self):
+        parser1 = self.make_parser()
+        with open(parser1.cache.path(parser1.cache_key),"wb") as f:
+            f.write(b"GLRC\x01\x00\x00\x00garbage")
+        parser2 = self.make_parser()
+        self.assertEqual(self.translate(parser1), self.translate(parser2))
+
+class TestIncludeCache(unittest.TestCase):
+    files = {
+        "lex.grm": """
+            NP -> i : ben
+            NP -> the man : adam
+            NP -> the house : ev
+            %ifdef past
+            VP -> saw NP : NP -yH gördüm
+            %else
+            VP -> see NP : NP -yH görüyorum
+            %endif
+            %define lexicon
+            %include "{dir}/verbs.grm"
+        """,
+        "verbs.grm": """
+            %macro V -> V,Ved
+            %form V -> go,went
+            $V -> $go : git
+            %suffix_macro N -> base,acc
+            %suffix N -> ev,evi
+            NP -> the house : ev
+        """,
+        "uses_macro.grm": """
+            %form W -> turn,turned
+            $W -> $turn : dön
+        """,
+        "open_if.grm": """
+            %ifdef past
+            NP -> you : sen
+        """
+    }
+    grammar = """
+        S -> NP VP : NP VP
+        S -> NP V : NP V
+        NP -> the house : ev
+        %macro W -> W,Wed
+        %include "{dir}/lex.grm"
+        %include "{dir}/uses_macro.grm"
+        %ifdef lexicon
+        VP -> V : V
+        %endif
+        %include "{dir}/open_if.grm"
+        %endif
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp().replace("\\","/")
+        for fname,text in self.files.items():
+            self.write(fname,text)
+        self.text = self.grammar.format(dir=self.dir)
+
+    def tearDown(self):
+        Grammar.include_cache = None
+        shutil.rmtree(self.dir)
+
+    def write(self,fname,text):
+        with open(os.path.join(self.dir,fname),"w") as f:
+            f.write(text.format(dir=self.dir))
+
+    def load(self,cache,**kwargs):
+        """ returns rules, lexicon, macros, forms, suffixes and defines of the grammar, in names """
+        Grammar.include_cache = cache
+        try:
+            grammar = Grammar.load_grammar(text=self.text,**kwargs)
+        finally:
+            Grammar.include_cache = None
+        names = grammar.symtab.names
+        lexicon = sorted((names[head],ruleno) for values in grammar.lexicon.values for head,ruleno in values)
+        return ([rule.format() for rule in grammar.rules], lexicon, sorted(grammar.lexicon.rulenos), grammar.macros,
+            {name:dict(dict.items(forms)) for name,forms in grammar.forms.items()}, grammar.suff_dict_names, grammar.suff_idxs,
+            [dict(dict.items(suff_dict)) for suff_dict in grammar.suff_dict_list], grammar.defines, grammar.includes, grammar.line_no)
+
+    def test_same(self):
+        cache = IncludeCache()
+        for kwargs in (dict(),dict(defines={"past"}),dict(lexical=False),dict()):
+            with self.subTest(**kwargs):
+                self.assertEqual(self.load(cache,**kwargs), self.load(None,**kwargs))
+        fragments = {os.path.basename(entry["includes"][0][0]):entry["fragment"] for entry in cache.entries.values()}
+        self.assertIsNotNone(fragments["lex.grm"])
+        self.assertIsNone(fragments["uses_macro.grm"]) # parsed in place
+        self.assertIsNone(fragments["open_if.grm"])
+        self.assertEqual(len(cache.entries), 4*3) # an entry for each file and options, verbs.grm is taken from cache while lex.grm is parsed
+
+    def test_translate(self):
+        parsers = []
+        for cache in (None,IncludeCache(),IncludeCache()):
+            Grammar.include_cache = cache
+            parser = Parser()
+            parser.load_grammar(text=self.text,defines={"past"})
+            parser.compile()
+            parsers.append(parser)
+        for sent,trans in (("i saw the house",[("ben evyH gördüm",0)]),("i go",[("ben git",0)]*2)):
+            with self.subTest(sent=sent):
+                self.assertEqual([parser.trans_sent(sent) for parser in parsers], [trans]*3)
+
+    def test_changed(self):
+        cache = IncludeCache()
+        self.load(cache)
+        time.sleep(0.01)
+        self.write("verbs.grm", self.files["verbs.grm"].replace("$V -> $go : git", "$V -> $go : gel"))
+        rules = self.load(cache)[0]
+        self.assertIn('Ved -> "went" : "gel" {0}  []', rules)
+        self.assertEqual(rules, self.load(None)[0])
+
+    def test_conflict(self):
+        """ a macro defined in both files is reported as when the file is parsed in place """
+        self.write("macro.grm", "%macro W -> W,Wed")
+        self.text = self.grammar.format(dir=self.dir).replace('%include "{}/lex.grm"'.format(self.dir), '%include "{}/macro.grm"'.format(self.dir))
+        errors = []
+        for cache in (None,IncludeCache()):
+            with self.assertRaises(GrammarError) as cm:
+                self.load(cache)
+            errors.append(str(cm.exception))
+        self.assertEqual(errors[0], errors[1])
+
+    def test_disk(self):
+        cache_dir = os.path.join(self.dir,"cache")
+        expected = self.load(None)
+        self.assertEqual(self.load(IncludeCache(cache_dir)), expected)
+        self.assertEqual(len(os.listdir(cache_dir)), 4)
+        cache = IncludeCache(cache_dir)
+        self.assertEqual(self.load(cache), expected)
+        self.assertEqual(len(cache.entries), 3) # verbs.grm is in the fragment of lex.grm
+        os.remove(os.path.join(self.dir,"verbs.grm"))
+        self.assertRaises(OSError, self.load, IncludeCache(cache_dir))
+
+if __name__== '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import sys, os, unittest, tempfile, shutil, importlib.util, ast
+sys.path.append("../..")
+from GLRParser import Parser, GrammarError
+from GLRParser.test.test_compile import CompileOptions, grm_dir
+
+class TestGenerateModule(unittest.TestCase):
+    option_sets = [dict(), dict(lookahead=True), dict(epsilon_free=True,unit_chains=True), dict(bitsets=True,left_factor=True), dict(packed=True,lookahead=True)]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def generate(self,parser,name):
+        fname = os.path.join(self.dir,name+".py")
+        parser.generate_module(fname)
+        spec = importlib.util.spec_from_file_location(name,fname)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def test_parse(self):
+        for idx,options in enumerate(self.option_sets):
+            for name,text,sents in CompileOptions.grammars:
+                base = CompileOptions.load(name,text,**options)
+                module = self.generate(base,"gen_%s_%d" % (name,idx))
+                parser = module.parser
+                with self.subTest(grammar=name,**options):
+                    self.assertIsInstance(parser, Parser)
+                    self.assertEqual(dict(parser.dfa.items()), dict(base.dfa.items()))
+                    self.assertEqual(parser.options, base.options)
+                for sent in sents:
+                    with self.subTest(grammar=name,sent=sent,**options):
+                        self.assertEqual(CompileOptions.parse(self,parser,sent), CompileOptions.parse(self,base,sent))
+
+    @unittest.skipUnless(hasattr(ast,"unparse"), "needs Python 3.9+")
+    def test_specialized(self):
+        name,text,sents = CompileOptions.grammars[1]
+        module = self.generate(CompileOptions.load(name,text,epsilon_free=True),"gen_specialized")
+        with open(module.__file__,encoding="utf-8") as f:
+            source = f.read()
+        parse = source[source.index("    def parse("):]
+        for name in ("logging.debug","bitsets","vectorized","lookahead","epsilon_free","units"):
+            self.assertNotIn(name, parse)
+
+    def test_translate(self):
+        parser = Parser("EN","TR")
+        with open(os.path.join(grm_dir,"tenses.grm"),encoding="cp1254") as f: # grammar is in Turkish Windows encoding
+            parser.load_grammar(text=f.read())
+        parser.compile()
+        module = self.generate(parser,"gen_tenses")
+        for sent in ["I am not watching her", "she was watching me"]:
+            with self.subTest(sent=sent):
+                self.assertEqual(module.parser.trans_sent(sent), parser.trans_sent(sent))
+
+    def test_not_compiled(self):
+        parser = Parser()
+        parser.load_grammar(text=CompileOptions.grammars[0][1])
+        self.assertRaises(GrammarError, parser.generate_module, os.path.join(self.dir,"gen.py"))
+
+if __name__ == '__main__':
+    unittest.main()
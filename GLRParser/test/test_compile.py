@@ -0,0 +1,553 @@
+import sys, os, unittest, itertools, tempfile
+sys.path.append("../..")
+from GLRParser import Parser, ParseError, GrammarError, Tree
+from GLRParser.tables import PackedDfa, any_symbol, numpy
+
+grm_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","grm")
+
+def canon(item):
+    """ returns an order independent string representation of a parse forest """
+    if type(item) in (str,int):
+        return str(item)
+    if type(item)==Tree:
+        return "{}#{}{}({}:{})".format(item.head, item.ruleno, sorted(item.feat.items()), " ".join(canon(sub) for sub in item.left), " ".join(canon(sub) for sub in item.right))
+    return "[" + "|".join(sorted(canon(alt) for alt in item)) + "]"
+
+class CompileOptions:
+    """ Base class for testing that parser compiled with "options" gives the same parse forests and translations as default compile """
+    options = {}
+    grammars = [
+        ("trans", """
+            S -> NP VP : NP VP
+            S -> S in NP : NP -de S
+            S -> S with NP : NP -la S
+            NP -> i :
+            NP -> the man : adam
+            NP -> the telescope : teleskop
+            NP -> the house : ev
+            NP -> NP-1 in NP-2 : NP-2 -deki NP-1
+            NP -> NP-1 with NP-2 : NP-2 -lu NP-1
+            VP -> saw NP : NP -ı gördüm
+        """, ["i saw the man in the house with the telescope", "i saw the man", "the man saw i in the house", "i saw", "saw the man"]),
+        ("nullable", """
+            S -> NP VP : NP VP
+            S -> VP : VP
+            NP -> Det N Adj : Det Adj N
+            Det -> :
+            Det -> the : o
+            Adj -> :
+            Adj -> big : büyük
+            Adj -> very Adj : çok Adj
+            N -> man : adam
+            N -> N-1 N-2 : N-2 N-1
+            VP -> V Adv : Adv V
+            V -> sleeps : uyur
+            Adv -> :
+            Adv -> well : iyi
+            Adv -> Adv-1 and Adv-2 : Adv-2 ve Adv-1
+        """, ["man sleeps", "the big man sleeps well", "the man big sleeps", "man man very big sleeps well and well", "sleeps", "the sleeps", "big"]),
+        ("feature", None, ["i am watching her", "she is watching me", "these men are watching us", "me am watching you", "a man watch us", "he watches the men", "i watch him"]),
+    ]
+    feature_file = "feature.grm"
+
+    @classmethod
+    def load(cls,name,text,**options):
+        parser = Parser()
+        if text is None:
+            parser.load_grammar(os.path.join(grm_dir,cls.feature_file))
+        else:
+            parser.load_grammar(text=text)
+        parser.compile(**options)
+        return parser
+
+    def parse(self,parser,sent):
+        try:
+            parser.parse(sent)
+            tree = parser.make_tree()
+            result = [canon(tree)]
+            utree = parser.unify_tree(tree)
+            result.append(canon(utree))
+            ttree = parser.trans_tree(utree)
+            result.append(sorted(ttree.enumx()))
+            return result
+        except ParseError as pe:
+            return type(pe)
+
+    def test_forests(self):
+        for name,text,sents in self.grammars:
+            base = self.load(name,text)
+            parser = self.load(name,text,**self.options)
+            for sent in sents:
+                with self.subTest(grammar=name,sent=sent):
+                    self.assertEqual(self.parse(parser,sent), self.parse(base,sent))
+
+class TestCompileDefault(CompileOptions,unittest.TestCase):
+    options = {}
+
+class TestCompileEngine(unittest.TestCase):
+    grammar = """
+        S -> A B C
+        S -> D
+        A -> B C
+        B -> C
+        B -> b
+        C ->
+        D -> D d
+        D -> E
+        E -> e E
+    """
+
+    def test_nullable(self):
+        parser = CompileOptions.load("engine",self.grammar)
+        self.assertEqual({parser.symtab.names[symbol] for symbol in parser.nullable}, {"S'","S","A","B","C"})
+
+    def test_closure(self):
+        parser = CompileOptions.load("engine",self.grammar)
+        for stateno,kernel in enumerate(parser.kernels):
+            with self.subTest(state=stateno):
+                # naive closure
+                items = set(kernel)
+                todo = list(kernel)
+                for ruleno,rulepos in todo:
+                    left = parser.lefts[ruleno]
+                    if rulepos < len(left):
+                        for nextno in parser.symrules[left[rulepos]]:
+                            if (nextno,0) not in items:
+                                items.add((nextno,0))
+                                todo.append((nextno,0))
+                self.assertEqual(set(parser.get_state_items(kernel)), items)
+                stateset = set(kernel)
+                parser.closure(stateset)
+                self.assertEqual(stateset, items)
+                for symbol in {parser.lefts[ruleno][rulepos] for ruleno,rulepos in items if rulepos < len(parser.lefts[ruleno])}:
+                    nkernel = tuple(sorted((ruleno,rulepos+1) for ruleno,rulepos in items if parser.lefts[ruleno][rulepos:rulepos+1]==(symbol,)))
+                    self.assertEqual(parser.kernels[parser.dfa[stateno,symbol]], nkernel)
+
+class TestCompileLookahead(CompileOptions,unittest.TestCase):
+    options = dict(lookahead=True)
+
+    def test_edges(self):
+        for name,text,sents in self.grammars:
+            base = self.load(name,text)
+            parser = self.load(name,text,**self.options)
+            for sent in sents:
+                with self.subTest(grammar=name,sent=sent):
+                    try:
+                        base.parse(sent)
+                        parser.parse(sent)
+                    except ParseError:
+                        continue
+                    self.assertLessEqual(set(parser.edges), set(base.edges))
+
+class TestCompileParallel(CompileOptions,unittest.TestCase):
+    options = dict(processes=2)
+
+    def test_tables(self):
+        for name,text,sents in self.grammars:
+            base = self.load(name,text)
+            parser = Parser()
+            parser.parallel_min_chunk = 1 # send even smallest frontiers to workers
+            if text is None:
+                parser.load_grammar(os.path.join(grm_dir,self.feature_file))
+            else:
+                parser.load_grammar(text=text)
+            parser.compile(processes=2)
+            with self.subTest(grammar=name):
+                for table in ("kernels","dfa","reduce","ereduce"):
+                    self.assertEqual(getattr(parser,table), getattr(base,table))
+
+class TestCompileLazy(CompileOptions,unittest.TestCase):
+    options = dict(lazy=True)
+
+    def test_expanded(self):
+        name,text,sents = self.grammars[2]
+        base = self.load(name,text)
+        parser = self.load(name,text,**self.options)
+        self.assertEqual(len(parser.expanded), 1) # only the marker for missing transitions (-1)
+        parser.parse(sents[0])
+        expanded = len(parser.expanded)
+        self.assertLess(expanded, len(base.kernels))
+        parser.parse(sents[0]) # states are reused for next sentences
+        self.assertEqual(len(parser.expanded), expanded)
+        parser.expand_all()
+        self.assertEqual(automaton(parser), automaton(base))
+
+    def test_persist(self):
+        name,text,sents = self.grammars[0]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            parser = Parser(cache_dir=cache_dir)
+            parser.load_grammar(text=text)
+            parser.compile(lazy=True)
+            result = self.parse(parser,sents[0])
+            parser.store_cache()
+            cached = Parser(cache_dir=cache_dir)
+            cached.load_grammar(text=text)
+            cached.compile(lazy=True)
+            self.assertEqual(cached.expanded, parser.expanded)
+            self.assertEqual(dict(cached.dfa), dict(parser.dfa))
+            self.assertEqual(self.parse(cached,sents[0]), result)
+            self.assertEqual(self.parse(cached,sents[1]), self.parse(parser,sents[1]))
+
+    def test_lookahead(self):
+        self.assertRaises(GrammarError, self.load, "trans", self.grammars[0][1], lazy=True, lookahead=True)
+        self.assertRaises(GrammarError, self.load, "trans", self.grammars[0][1], lazy=True, unit_chains=True)
+        self.assertRaises(GrammarError, self.load, "trans", self.grammars[0][1], lazy=True, minimize=True)
+        self.assertRaises(GrammarError, self.load, "trans", self.grammars[0][1], lazy=True, bitsets=True)
+
+class TestCompileEpsilonFree(CompileOptions,unittest.TestCase):
+    options = dict(epsilon_free=True)
+
+    def test_tables(self):
+        name,text,sents = self.grammars[1]
+        parser = self.load(name,text,**self.options)
+        self.assertFalse(any(parser.ereduce.values()))
+        self.assertEqual(parser.nullable, set())
+        self.assertEqual(set(parser.nullrules), {"Det","Adj","Adv"})
+        for ruleno,(orig,kept) in parser.emap.items():
+            self.assertGreaterEqual(ruleno, len(parser.rules))
+            self.assertEqual(parser.lefts[ruleno], tuple(parser.lefts[orig][pos] for pos in kept))
+
+    def test_add_rules(self):
+        name,text,sents = self.grammars[1]
+        parser = self.load(name,text,**self.options)
+        parser.add_rules("Adv -> fast : hızlı")
+        base = self.load(name,text+"\nAdv -> fast : hızlı")
+        self.assertEqual(self.parse(parser,"man sleeps fast"), self.parse(base,"man sleeps fast"))
+
+class TestCompileEpsilonFreeLookahead(CompileOptions,unittest.TestCase):
+    options = dict(epsilon_free=True,lookahead=True)
+
+class TestCompileUnitChains(CompileOptions,unittest.TestCase):
+    options = dict(unit_chains=True)
+    grammar = """
+        S -> SentNorm : SentNorm
+        S -> SentQuest : SentQuest
+        SentNorm -> NP VP : NP VP
+        SentQuest -> does NP VP : NP VP mı
+        NP -> N : N
+        NP -> Pron : Pron
+        N -> man : adam
+        Pron -> he : o
+        VP -> VBe : VBe
+        VBe -> V : V
+        VBe -> V Adv : Adv V
+        V -> sleeps : uyur
+        V -> sleep : uyu
+        Adv -> well : iyi
+    """
+
+    def test_units(self):
+        parser = self.load("units",self.grammar,**self.options)
+        self.assertTrue(parser.units)
+        for (state,symbol),chains in parser.units.items():
+            for chain,head,nstate,la in chains:
+                self.assertEqual(parser.dfa[state,head], nstate)
+                self.assertEqual(parser.heads[chain[0]], head)
+                self.assertEqual(parser.lefts[chain[-1]], (symbol,))
+        base = self.load("units",self.grammar)
+        for sent in ["he sleeps", "does the man sleep well", "man sleeps well"]:
+            with self.subTest(sent=sent):
+                self.assertEqual(self.parse(parser,sent), self.parse(base,sent))
+        self.assertLess(len(parser.edges), len(base.edges))
+
+class TestCompileUnitChainsLookahead(CompileOptions,unittest.TestCase):
+    options = dict(unit_chains=True,lookahead=True)
+
+class TestCompileUnitChainsEpsilonFree(CompileOptions,unittest.TestCase):
+    options = dict(unit_chains=True,epsilon_free=True)
+
+class TestCompileLeftFactor(CompileOptions,unittest.TestCase):
+    options = dict(left_factor=True)
+    grammar = """
+        S -> NP VP : NP VP
+        S -> that NP VP Adv : Adv NP VP
+        S -> that NP VP and S : NP VP ve S
+        S -> that NP-1 VP-1 and NP-2 VP-2 : NP-1 VP-1 ve NP-2 VP-2
+        S -> that NP-1 VP with NP-2 : NP-2 ile NP-1 VP
+        NP -> the man : adam
+        NP -> the N : N
+        N -> dog : köpek
+        N -> N-1 of N-2 : N-2 -nHn N-1 -sH
+        VP -> sleeps : uyur
+        VP -> sleeps now : şimdi uyur
+        Adv -> well : iyi
+    """
+    sents = ["that the man sleeps and the dog sleeps", "that the man sleeps and that the dog sleeps well", "that the dog of dog sleeps with the man", "the man sleeps now"]
+
+    def test_factored(self):
+        base = self.load("factor",self.grammar)
+        for min_prefix in (1,2,3):
+            parser = Parser()
+            parser.factor_min_prefix = min_prefix
+            parser.load_grammar(text=self.grammar)
+            parser.compile(**self.options)
+            self.assertTrue(parser.fmap)
+            for ruleno,orig in parser.fmap.items():
+                self.assertIn(parser.symtab.names[parser.heads[ruleno]].split("#")[0], ("S","N","NP","VP"))
+            for sent in self.sents:
+                with self.subTest(min_prefix=min_prefix,sent=sent):
+                    self.assertEqual(self.parse(parser,sent), self.parse(base,sent))
+
+class TestCompileAll(TestCompileLeftFactor):
+    options = dict(left_factor=True,epsilon_free=True,unit_chains=True,lookahead=True,minimize=True,bitsets=True)
+
+class TestCompileMinimize(CompileOptions,unittest.TestCase):
+    options = dict(minimize=True)
+
+    def test_minimize(self):
+        for name,text,sents in self.grammars:
+            base = self.load(name,text)
+            report = base.minimize()
+            with self.subTest(grammar=name):
+                self.assertLessEqual(report['states'][1], report['states'][0])
+                self.assertEqual(report['states'][1], len(base.kernels))
+                self.assertEqual(base.minimize()['states'], (len(base.kernels),len(base.kernels))) # minimal already
+                self.assertEqual(self.load(name,text,minimize=True).dfa, base.dfa)
+        # states of a kernel-keyed LR(0) automaton are never equivalent, so a copy of a state is added to be merged back
+        name,text,sents = self.grammars[0]
+        base = self.load(name,text)
+        parser = self.load(name,text)
+        (state,symbol),nstate = max(parser.dfa.items(),key=lambda item:item[1])
+        copy = len(parser.kernels)
+        parser.kernels.append(parser.kernels[nstate])
+        parser.dfa[state,symbol] = copy
+        parser.dfa.update({(copy,sym):nxt for (src,sym),nxt in list(parser.dfa.items()) if src == nstate})
+        for table in (parser.reduce,parser.ereduce):
+            if nstate in table:
+                table[copy] = table[nstate]
+        ntrans = len(parser.dfa)
+        self.assertEqual(parser.minimize(), dict(states=(len(base.kernels)+1,len(base.kernels)),transitions=(ntrans,len(base.dfa))))
+        self.assertEqual(parser.dfa, base.dfa)
+        for sent in sents:
+            with self.subTest(sent=sent):
+                self.assertEqual(self.parse(parser,sent), self.parse(base,sent))
+
+class TestCompileMinimizeLookahead(CompileOptions,unittest.TestCase):
+    options = dict(minimize=True,lookahead=True)
+
+class TestCompilePacked(CompileOptions,unittest.TestCase):
+    options = dict(packed=True,lookahead=True)
+
+    def test_tables(self):
+        for name,text,sents in self.grammars:
+            base = self.load(name,text,lookahead=True)
+            parser = self.load(name,text,**self.options)
+            with self.subTest(grammar=name):
+                self.assertEqual(dict(parser.dfa.items()), base.dfa)
+                self.assertEqual(len(parser.dfa), len(base.dfa))
+                for state in range(-1,len(base.kernels)):
+                    for symbol in range(-1,len(base.symtab)+1):
+                        self.assertEqual(parser.dfa.get((state,symbol),-1), base.dfa.get((state,symbol),-1))
+                defaults = 0
+                for state in range(len(base.kernels)):
+                    for table in ("reduce","ereduce"):
+                        items = getattr(base,table).get(state,set())
+                        self.assertEqual(list(getattr(parser,table).get(state,())), list(items))
+                        for item in items:
+                            lset = parser.lookahead[(state,)+item]
+                            if lset is any_symbol:
+                                defaults += 1
+                                self.assertNotIn(state, {src for src,symbol in base.dfa})
+                            else:
+                                self.assertEqual(lset, base.lookahead[(state,)+item])
+                self.assertEqual(base.pack_tables()['defaults'], defaults)
+                self.assertGreater(defaults, 0)
+
+    def test_cache(self):
+        name,text,sents = self.grammars[0]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            parser = Parser(cache_dir=cache_dir)
+            parser.load_grammar(text=text)
+            parser.compile(**self.options)
+            cached = Parser(cache_dir=cache_dir)
+            cached.load_grammar(text=text)
+            cached.compile(**self.options)
+            self.assertEqual(dict(cached.dfa.items()), dict(parser.dfa.items()))
+            self.assertIs(cached.lookahead[max(parser.dfa.items(),key=lambda item:item[1])[1],0,0], any_symbol)
+            for sent in sents:
+                with self.subTest(sent=sent):
+                    self.assertEqual(self.parse(cached,sent), self.parse(parser,sent))
+
+    def test_add_rules(self):
+        name,text,sents = self.grammars[0]
+        parser = self.load(name,text,**self.options)
+        parser.add_rules("NP -> the dog : köpek")
+        self.assertEqual(type(parser.dfa), PackedDfa)
+        self.assertEqual(self.parse(parser,"i saw the dog")[2], [("köpek -ı gördüm",0)])
+        self.assertRaises(GrammarError, self.load, name, text, lazy=True, packed=True)
+
+class TestCompileBitsets(CompileOptions,unittest.TestCase):
+    options = dict(bitsets=True)
+
+    def test_masks(self):
+        for name,text,sents in self.grammars:
+            base = self.load(name,text)
+            parser = self.load(name,text,**self.options)
+            with self.subTest(grammar=name):
+                self.assertEqual(set(parser.smask), {symbol for state,symbol in base.dfa})
+                for symbol,mask in parser.smask.items():
+                    self.assertEqual(mask, sum(1 << state for state in range(len(base.kernels)) if (state,symbol) in base.dfa))
+                self.assertEqual(parser.emask, sum(1 << state for state in range(len(base.kernels)) if base.ereduce.get(state)))
+            for sent in sents:
+                with self.subTest(grammar=name,sent=sent):
+                    try:
+                        base.parse(sent)
+                    except ParseError:
+                        self.assertRaises(ParseError, parser.parse, sent)
+                        continue
+                    parser.parse(sent)
+                    self.assertEqual(set(parser.edges), set(base.edges))
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestCompileVectorized(CompileOptions,unittest.TestCase):
+    options = dict(vectorized=True)
+
+    def test_shift(self):
+        for name,text,sents in self.grammars:
+            base = self.load(name,text)
+            for max_cells in (Parser.dense_max_cells,0): # dense matrix and compressed columns
+                parser = Parser()
+                parser.dense_max_cells = max_cells
+                if text is None:
+                    parser.load_grammar(os.path.join(grm_dir,self.feature_file))
+                else:
+                    parser.load_grammar(text=text)
+                parser.compile(**self.options)
+                self.assertEqual(parser.dfa.matrix is None, max_cells == 0)
+                states = list(range(len(base.kernels)))
+                for symbol in range(-1,len(base.symtab)+1):
+                    with self.subTest(grammar=name,max_cells=max_cells,symbol=symbol):
+                        expected = [(state,base.dfa[state,symbol]) for state in states if (state,symbol) in base.dfa]
+                        self.assertEqual(list(parser.dfa.shift(states,symbol)), expected)
+                        self.assertEqual(list(parser.dfa.shift(states[::-1],symbol)), expected[::-1])
+                for sent in sents:
+                    with self.subTest(grammar=name,max_cells=max_cells,sent=sent):
+                        self.assertEqual(self.parse(parser,sent), self.parse(base,sent))
+
+class TestCompileVectorizedOptions(unittest.TestCase):
+    def test_options(self):
+        text = CompileOptions.grammars[0][1]
+        self.assertRaises(GrammarError, CompileOptions.load, "trans", text, vectorized=True, packed=True)
+        self.assertRaises(GrammarError, CompileOptions.load, "trans", text, vectorized=True, lazy=True)
+        if numpy is None:
+            self.assertRaises(GrammarError, CompileOptions.load, "trans", text, vectorized=True)
+
+class TestCompileReport(unittest.TestCase):
+    grammar = """
+        S -> NP VP
+        S -> S PP
+        NP -> NP PP
+        NP -> i
+        NP -> the man
+        PP -> in NP
+        VP -> saw NP
+        S -> A x
+        S -> B x
+        A -> a Det
+        B -> a Det
+        Det ->
+    """
+
+    def test_report(self):
+        parser = CompileOptions.load("report",self.grammar)
+        report = parser.compile_report()
+        self.assertEqual(report["states"], len(parser.kernels))
+        self.assertEqual(report["transitions"], len(parser.dfa))
+        self.assertEqual(report["nullable"], ["Det"])
+        conflicts = {conflict["state"]:conflict for conflict in report["conflicts"]}
+        self.assertIn(("in",["S' -> S . "]), conflicts[parser.dfa[0,parser.symtab.ids["S"]]]["shift_reduce"])
+        self.assertIn([(None,["A -> a Det . ","B -> a Det . "])], [conflict["reduce_reduce"] for conflict in conflicts.values()])
+        self.assertEqual(report["reduce_reduce"], 2) # after "a" (with empty Det) and after "a Det"
+        self.assertEqual(report["closures"][0], (0,len(parser.get_state_items(parser.kernels[0]))))
+
+    def test_report_lookahead(self):
+        parser = CompileOptions.load("report",self.grammar,lookahead=True)
+        report = parser.compile_report()
+        conflicts = report["conflicts"]
+        self.assertEqual(report["shift_reduce"], 2) # PP attachment after "in NP" and "saw NP"
+        self.assertEqual(sorted(item for conflict in conflicts for term,items in conflict["shift_reduce"] for item in items),
+            ["PP -> in NP . ", "VP -> saw NP . "])
+        self.assertIn([(["x"],["A -> a Det . ","B -> a Det . "])], [conflict["reduce_reduce"] for conflict in conflicts])
+        self.assertEqual(report["forks"][0][1], 3) # A -> a . Det, B -> a . Det, Det -> . on x
+
+def automaton(parser):
+    """ returns a state numbering independent representation of the states reachable from initial state """
+    names = parser.symtab.names
+    order = {0:0}
+    todo = [0]
+    result = []
+    for state in todo:
+        trans = sorted((names[symbol],nstate) for (pstate,symbol),nstate in parser.dfa.items() if pstate==state)
+        for name,nstate in trans:
+            if nstate not in order:
+                order[nstate] = len(order)
+                todo.append(nstate)
+        items = lambda table: sorted(table.get(state,()))
+        lookahead = parser.lookahead and sorted((item,sorted(names[symbol] for symbol in parser.lookahead[(state,)+item])) for item in items(parser.reduce)+items(parser.ereduce))
+        result.append((parser.kernels[state], [(name,order[nstate]) for name,nstate in trans], items(parser.reduce), items(parser.ereduce), lookahead))
+    return result
+
+class TestAddRules(unittest.TestCase):
+    """ add_rules should give the same tables as compiling the whole grammar """
+    grammar = CompileOptions.grammars[0][1]
+    macros = """
+        S -> NP VP-3 : NP VP-3
+        VP-3 -> V3 NP : NP -ı V3
+        %macro V -> V,V3
+        %form V -> see,sees
+        $V -> $see : gör
+    """
+    cases = [
+        ("lexical", ["NP -> the dog : köpek", "NP -> you : sen\nVP -> kicked NP : NP -ı tekmeledi"]),
+        ("redirect", ["VP -> saw : gördüm", "NP -> the : o"]),
+        ("new_nt", ["NP -> Adj NP : Adj NP", "Adj -> big : büyük\nAdj -> very Adj : çok Adj"]),
+        ("nullable", ["NP -> Det dog : Det köpek\nDet -> a : bir", "Det -> :"]),
+        ("macro", ["%form V -> kick,kicks\n$V -> $kick : tekmele", "NP -> the dog : köpek"]),
+    ]
+    sents = ["i saw the man in the house with the telescope", "i saw the dog", "i saw a dog", "dog saw i", "you kicked the big man", "i saw", "the man sees the dog",
+        "i saw very big the man", "the kicks you", "the dog kicks the man"]
+
+    def check(self,name,additions,**options):
+        parser = Parser()
+        parser.load_grammar(text=self.grammar+self.macros)
+        parser.compile(**options)
+        for idx,text in enumerate(additions):
+            parser.add_rules(text)
+            full = CompileOptions.load(name,self.grammar+self.macros+"\n".join(additions[:idx+1]),**options)
+            with self.subTest(case=name,step=idx,**options):
+                self.assertEqual([rule.format() for rule in parser.rules], [rule.format() for rule in full.rules])
+                if options.get("lazy"):
+                    parser.expand_all()
+                    full.expand_all()
+                else:
+                    self.assertEqual(len(parser.kernels), len(full.kernels))
+                self.assertEqual(automaton(parser), automaton(full))
+                for sent in self.sents:
+                    self.assertEqual(CompileOptions.parse(self,parser,sent), CompileOptions.parse(self,full,sent))
+
+    def test_add_rules(self):
+        for name,additions in self.cases:
+            self.check(name,additions)
+
+    def test_add_rules_lookahead(self):
+        for name,additions in self.cases:
+            self.check(name,additions,lookahead=True)
+
+    def test_add_rules_bitsets(self):
+        for name,additions in self.cases:
+            self.check(name,additions,bitsets=True)
+
+    def test_add_rules_lazy(self):
+        for name,additions in self.cases:
+            self.check(name,additions,lazy=True)
+
+    def test_not_compiled(self):
+        parser = Parser()
+        parser.load_grammar(text=self.grammar)
+        parser.add_rules("NP -> the dog : köpek")
+        parser.compile()
+        full = CompileOptions.load("lexical",self.grammar+"NP -> the dog : köpek")
+        self.assertEqual(automaton(parser), automaton(full))
+
+if __name__== '__main__':
+    unittest.main()
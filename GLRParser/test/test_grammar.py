@@ -0,0 +1,168 @@
+import sys, unittest, pickle, operator
+sys.path.append("../..")
+from GLRParser import Grammar, GrammarError, Rule, FrozenRule, RuleStore, Parser, format_feat
+from GLRParser.test.test_compile import grm_dir
+import os
+
+rules = """
+S -> a b : c d
+S->a
+S -> "" a
+S -> A (x) : A
+S -> A(x=1,y) : A
+S -> a : b [x=1,!y,?z,+w,-v]
+S -> a : b [ x = *A , y=*bb , z="q,r" ]
+S -> a : b []
+S -> a : b [x=1,]
+S -> a : b [x=1] c
+S -> a : b [x=Ab]
+S -> a : b # comment
+S -> a # comment : b
+S -> a | b : c
+S -> a {1} : b
+S -> a ! : b
+S -> a : b : c
+S -> a : b [x=1
+*x -> a
+s -> a
+S ->
+S -> : x
+S -> a : -yA +passive 'x
+S -> NP-prim V NP-secn : NP-secn -yA NP-prim V [x=*NP-prim]
+S -> a : b [y=*Z]
+S -> A' B'' : B'' A'
+S -> a\tb\t:\tc\t[x=1]\t
+S -> ab@c^d! : x
+S -> a : b ]
+""".strip().split("\n")
+
+class TestScanRule(unittest.TestCase):
+    def load(self,text,fast_scan,**kwargs):
+        """ returns rules, lexicon, macros and symbols of a grammar, or the error raised """
+        Grammar.fast_scan = fast_scan
+        try:
+            grammar = Grammar.load_grammar(text=text,**kwargs)
+        except Exception as e:
+            return type(e),str(e)
+        finally:
+            Grammar.fast_scan = True
+        return ([(rule.head,rule.left,rule.right,rule.feat,rule.lparam,rule.rparam,rule.cost,rule.cut) for rule in grammar.rules],
+            pickle.dumps(grammar.lexicon), grammar.macros, grammar.forms, grammar.symtab.names)
+
+    def test_same(self):
+        """ fast path gives the same grammar and the same errors as recursive descent """
+        texts = []
+        for fname in sorted(os.listdir(grm_dir)):
+            if fname.endswith(".grm"):
+                with open(os.path.join(grm_dir,fname),encoding="cp1254") as f: # grammar files are in Turkish Windows encoding
+                    texts.append(f.read())
+        for text in texts+rules:
+            for kwargs in (dict(),dict(reverse=True),dict(lexical=False)):
+                with self.subTest(text=text[:40],**kwargs):
+                    self.assertEqual(self.load(text,True,**kwargs), self.load(text,False,**kwargs))
+
+    def test_errors(self):
+        for text in ("S -> a : b [x=1", "S -> a : b : c", "s -> a", "S -> a : b [x=Ab]"):
+            with self.subTest(text=text):
+                self.assertRaises(GrammarError, Grammar.load_grammar, text=text)
+
+    def test_scan(self):
+        grammar = Grammar()
+        self.assertEqual(grammar.scan_rule("VP -> V NP : NP -yH V [tense=past,!neg]"),
+            ("VP", [(["V","NP"],[None,None],0,None,None)], [(["NP","-yH","V"],[None,False,None],0,None,None)], {"tense":"past","neg":"!"}))
+        for rule in ("$V -> $go : git", "S -> a | b : c", "S -> a {1} : b", "S -> A(x) : A", "S -> a : b : c"):
+            with self.subTest(rule=rule):
+                self.assertIsNone(grammar.scan_rule(rule)) # left to recursive descent
+        with open(os.path.join(grm_dir,"tenses.grm"),encoding="cp1254") as f:
+            lines = [line.strip() for line in f if line.strip() and line.strip()[0] not in "#%"]
+        scanned = sum(grammar.scan_rule(line) is not None for line in lines)
+        self.assertGreater(scanned, len(lines)*3//4)
+
+class TestRuleStore(unittest.TestCase):
+    grammar = """
+S -> NP VP : NP VP [x=1]
+NP -> i | i : ben
+VP -> V NP : NP -yH V {2} !
+VP -> V NP : NP -yH V {2} !
+V -> see : gör
+"""
+    def test_key(self):
+        """ rules are deduplicated on rows computed when added, a rule changed later doesn't change the store """
+        rule1 = Rule("S",["a","B"],[1,"c"],{"x":"1"},[False,{"y":None}],[False,None],2,True)
+        rule2 = Rule("S",["a","B"],[1,"c"],{"x":"1"},[False,{"y":None}],[False,None],2,True)
+        rules = Grammar().rules
+        self.assertEqual([rules.add(rule) for rule in (rule1,rule2,Rule("S",["a","B"],[1,"c"],{"x":"1"},[False,{}],[False,None],2,True))], [1,1,2])
+        rule1.right.append("d")
+        rule1.feat["x"] = "2"
+        rule1.lparam[1]["y"] = "3"
+        self.assertEqual(rules[1], rule2)
+        self.assertEqual(rules.add(rule2), 1)
+        self.assertEqual(rules.add(rule1), 3)
+
+    def test_frozen(self):
+        """ stored rules are immutable and hashable """
+        rules = Grammar.load_grammar(text=self.grammar).rules
+        other = Grammar.load_grammar(text=self.grammar).rules
+        self.assertIsInstance(rules[3], FrozenRule)
+        memo = {rule:ruleno for ruleno,rule in enumerate(rules)}
+        self.assertEqual([memo[rule] for rule in other], list(range(len(rules))))
+        self.assertEqual(len(set(rules)|set(other)), len(rules))
+        self.assertEqual(hash(rules[1]), hash(other[1]))
+        self.assertEqual(rules[1], Rule("S",["NP","VP"],[0,1],{"x":"1"},[None,None],[None,None]))
+        self.assertNotEqual(rules[1], rules[2])
+        rule = rules[3]
+        for name in ("head","left","right","feat","lparam","cost","cut"):
+            with self.subTest(name=name):
+                self.assertRaises(AttributeError, setattr, rule, name, None)
+        self.assertRaises(TypeError, operator.setitem, rule.right, 0, "x")
+        self.assertRaises(TypeError, operator.setitem, rules[1].feat, "x", "2")
+        self.assertRaises(TypeError, rules[0].lparam[0].update, {"y":"1"})
+        self.assertEqual(pickle.loads(pickle.dumps(rule)), rule)
+        self.assertEqual((rule.format(),format_feat(rules[0].lparam[0],'()')), ('VP -> V NP : 1 "-yH" 0 {2} ! []','()'))
+
+    def test_dedupe(self):
+        grammar = Grammar.load_grammar(text=self.grammar)
+        rules = grammar.rules
+        self.assertIsInstance(rules, RuleStore)
+        self.assertEqual([rule.format() for rule in rules], [
+            "S' -> S() : 0() {0}  []",
+            "S -> NP VP : 0 1 {0}  [x=1]",
+            'NP -> "i" : "ben" {0}  []',
+            'VP -> V NP : 1 "-yH" 0 {2} ! []',
+            'V -> "see" : "gör" {0}  []'])
+        self.assertEqual(len(grammar.lexicon), 2)
+        self.assertEqual(rules.add(Rule("V",["see"],["gör"],{},[False],[False])), 4)
+        self.assertEqual(len(rules), 5)
+
+    def test_arrays(self):
+        rules = Grammar.load_grammar(text=self.grammar).rules
+        names = rules.symtab.names
+        self.assertEqual([names[head] for head in rules.heads], ["S'","S","NP","VP","V"])
+        self.assertEqual([names[symbol] for symbol in rules.get_left(3)], ["V","NP"])
+        self.assertEqual(rules.left_offs.tolist(), [0,1,3,4,6,7])
+        self.assertEqual(rules.values[rules.rights[3]], (1,"-yH",0))
+        self.assertEqual(rules.values[rules.feats[1]], {"x":"1"})
+        self.assertEqual((rules.costs[3],rules.cuts[3],rules.cuts[2]), (2,1,0))
+        self.assertEqual((rules.lparams[2],rules.rparams[4]), (rules.rparams[2],rules.lparams[2])) # [False] is stored once
+        self.assertIs(rules[3], rules[-2])
+        self.assertEqual(rules[1:3], [rules[1],rules[2]])
+
+    def test_pickle(self):
+        grammar = Grammar.load_grammar(text=self.grammar)
+        rules = pickle.loads(pickle.dumps(grammar.rules))
+        self.assertEqual(rules, grammar.rules)
+        self.assertEqual(rules.add(grammar.rules[3]), 3)
+        self.assertEqual(rules.add(Rule("V",["go"],["git"],{},[False],[False])), 5)
+
+    def test_parse(self):
+        parser = Parser()
+        parser.load_grammar(text=self.grammar)
+        parser.compile()
+        self.assertEqual(parser.trans_sent("i see i"), [("ben benyH gör",2)])
+        parser.parse("i see i")
+        tree = parser.make_tree()
+        self.assertIs(tree.rule, parser.rules[tree.ruleno])
+        self.assertEqual(tree.ruleno, 0)
+
+if __name__ == '__main__':
+    unittest.main()
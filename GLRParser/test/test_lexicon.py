@@ -0,0 +1,77 @@
+import sys, unittest
+sys.path.append("../..")
+from GLRParser import Parser, Grammar, Lexicon
+from GLRParser.test.test_compile import CompileOptions, canon, grm_dir
+import os
+
+class TestLexicon(unittest.TestCase):
+    def test_search(self):
+        lexicon = Lexicon()
+        lexicon.add([3],10,1)
+        lexicon.add([3,4,5],11,2)
+        lexicon.add([3,4,5],12,3)
+        lexicon.add([4],13,4)
+        self.assertEqual(lexicon.search([3,4,5,0],0), [(1,10,1),(3,11,2),(3,12,3)])
+        self.assertEqual(lexicon.search([3,4,6,0],0), [(1,10,1)])
+        self.assertEqual(lexicon.search([3,4,5],1), [(1,13,4)])
+        self.assertEqual(lexicon.search([-1,99,0],0), [])
+        self.assertEqual(len(lexicon), 4)
+        lexicon.add([4],14,5)
+        lexicon.add([4],13,6)
+        self.assertEqual(lexicon.search([4],0), [(1,13,4),(1,13,6),(1,14,5)]) # values of a head are adjacent
+
+    def test_rules(self):
+        grammar = Grammar.load_grammar(text="S -> NP VP\nNP -> the man : adam\nVP -> NP saw : NP gördü")
+        self.assertEqual(grammar.lexicon.rulenos, {2})
+        self.assertEqual(len(grammar.rules), 4) # lexical rules are kept in rule list, so rulenos don't change
+        grammar = Grammar.load_grammar(text="S -> NP VP\nNP -> the man : adam", lexical=False)
+        self.assertEqual(len(grammar.lexicon), 0)
+
+    def test_forests(self):
+        for name,text,sents in CompileOptions.grammars:
+            parsers = []
+            for lexical in (False,True):
+                parser = Parser()
+                if text is None:
+                    parser.load_grammar(os.path.join(grm_dir,CompileOptions.feature_file), lexical=lexical)
+                else:
+                    parser.load_grammar(text=text, lexical=lexical)
+                parser.compile()
+                parsers.append(parser)
+            for sent in sents:
+                with self.subTest(grammar=name,sent=sent):
+                    self.assertEqual(CompileOptions.parse(self,parsers[1],sent), CompileOptions.parse(self,parsers[0],sent))
+
+    def test_vocabulary(self):
+        """ number of states doesn't depend on the size of vocabulary """
+        states = []
+        for cnt in (10,1000):
+            text = "\n".join(["S -> NP VP : NP VP", "NP -> Det N : Det N", "Det -> the :", "VP -> V NP : NP -yH V"] +
+                ["N -> noun%d : isim%d" % (idx,idx) for idx in range(cnt)] + ["V -> verb%d : fiil%d" % (idx,idx) for idx in range(cnt)])
+            sent = "the noun%d verb%d the noun1" % (cnt-1,cnt-1)
+            parsers = []
+            for lexical in (False,True):
+                parser = Parser()
+                parser.load_grammar(text=text, lexical=lexical)
+                parser.compile()
+                parsers.append(parser)
+            states.append((len(parser.kernels),len(parser.dfa)))
+            self.assertGreater(len(parsers[0].kernels), 2*cnt)
+            self.assertEqual(CompileOptions.parse(self,parsers[1],sent), CompileOptions.parse(self,parsers[0],sent))
+        self.assertEqual(states[0], states[1])
+
+    def test_report(self):
+        """ words of lexicon phrases are counted as shifts by compile_report """
+        text = "S -> NP VP\nVP -> V\nVP -> V NP\nNP -> the man\nNP -> he\nV -> sees"
+        reports = []
+        for lexical in (False,True):
+            parser = Parser()
+            parser.load_grammar(text=text, lexical=lexical)
+            parser.compile()
+            report = parser.compile_report()
+            reports.append((report["shift_reduce"],[conflict["shift_reduce"] for conflict in report["conflicts"]],[actions for state,actions in report["forks"]]))
+        self.assertEqual(reports[1], (2,[[("he",["VP -> V . "]),("the",["VP -> V . "])]],[2]))
+        self.assertEqual(reports[1], reports[0])
+
+if __name__== '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
-import sys, unittest, textwrap
+import sys, unittest, textwrap, tempfile, shutil, os
 sys.path.append("../..")
-from GLRParser import Parser, ParseError, GrammarError, Tree, Rule
+from GLRParser import Parser, ParseError, GrammarError, Tree, Rule, Grammar
 
 class TestMacro(unittest.TestCase):
     grammar = """
@@ -46,6 +46,81 @@ $V -> $go   : git
             with self.subTest(rule=rule,exp_rule=exp_rule):
                 self.assertEqual(rule, exp_rule)
 
+    def test_compact(self):
+        rules = self.parser.rules
+        self.assertEqual(len(rules), 16)
+        self.assertEqual(len({rules.rights[ruleno] for ruleno in range(6,16)}), 2) # body of "$V -> $turn : dön" is stored once for its expansions
+        self.assertIs(rules[6].right, rules[10].right)
+        self.assertEqual((rules[9].head,rules[9].left,rules[9].right), ('Ved',('turned',),('dön',)))
+        self.assertEqual(str(rules[14]), str(self.rules[14]))
+        Grammar.compact_macros = False
+        try:
+            parser = Parser()
+            parser.load_grammar(text=self.grammar)
+            parser.compile()
+        finally:
+            Grammar.compact_macros = True
+        self.assertEqual(parser.rules, self.parser.rules)
+        self.assertEqual(parser.rules.rights, rules.rights)
+        self.assertEqual(self.parser.trans_sent("went"), parser.trans_sent("went"))
+
+class TestIncludeForm(unittest.TestCase):
+    grammar = """
+S -> V    : V
+S -> Vs   : Vs
+%macro V -> V,Vs
+%include_form V "{forms}"
+$V -> $turn : dön
+$V -> $go   : git
+%suffix_macro V -> base,aorist,caus
+%include_suffix V "{suffixes}"
+"""
+    forms = "# verb forms\nturn / spin, turns / spins\n\ngo,goes\n"
+    suffixes = "dön,döner,döndür\n# comment\ngit, gider, götür\n"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fnames = dict()
+        for name in ("forms","suffixes"):
+            self.fnames[name] = os.path.join(self.dir,name+".txt")
+            with open(self.fnames[name],"w") as f:
+                f.write(getattr(self,name))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def load(self,grammar):
+        parser = Parser("EN","TR")
+        parser.load_grammar(text=grammar.format(**self.fnames))
+        return parser
+
+    def test_forms(self):
+        parser = self.load(self.grammar)
+        forms = parser.grammar.forms["V"]
+        self.assertEqual(forms["turn"], (("turn","spin"),("turns","spins")))
+        self.assertEqual(forms.get("go"), (("go",),("goes",)))
+        self.assertIsNone(forms.get("sleep"))
+        self.assertIs(dict.get(forms,"turn"), dict.get(forms,"spin")) # row is shared by alternative words
+        self.assertEqual(dict.get(forms,"turn"), "turn/spin,turns/spins")
+        self.assertEqual([(rule.head,rule.left,rule.right) for rule in parser.rules[3:]],
+            [('V',('turn',),('dön',)),('V',('spin',),('dön',)),('Vs',('turns',),('dön',)),('Vs',('spins',),('dön',)),('V',('go',),('git',)),('Vs',('goes',),('git',))])
+        grammar = self.grammar.replace('%include_form V "{forms}"', "%form V -> turn / spin, turns / spins\n%form V -> go,goes")
+        self.assertEqual(self.load(grammar).rules, parser.rules)
+
+    def test_suffixes(self):
+        parser = self.load(self.grammar)
+        suffixes = parser.suff_dict_list[0]
+        self.assertEqual({key:suffixes[key] for key in suffixes}, {"dön":("dön","döner","döndür"), "git":("git","gider","götür")})
+        self.assertEqual(parser.post_processor("git +caus -dH"), "götürdü")
+        self.assertEqual(parser.suff_idxs["caus"], (0,2))
+
+    def test_errors(self):
+        for name,line,error in (("suffixes","uyu,uyur","Suffix Form expecting 3 items"),("forms","sleep,sleeps,slept","Form expecting 2 items")):
+            with open(self.fnames[name],"a") as f:
+                f.write(line+"\n")
+            with self.subTest(name=name):
+                self.assertRaisesRegex(GrammarError, error, self.load, self.grammar)
+
 def genTestMacro():
     parser = Parser()
     parser.load_grammar(text=TestMacro.grammar)
@@ -0,0 +1,77 @@
+import sys, unittest
+sys.path.append("../..")
+from GLRParser import Parser, Grammar, Tree
+from GLRParser.test.test_compile import CompileOptions, grm_dir
+import os
+
+grammar = """
+S -> NP VP : NP VP
+S -> NP Adv VP : Adv NP VP
+NP -> Det N : Det N
+NP -> N : N
+Det -> the :
+Det -> a : bir
+N -> man : adam
+N -> dog : köpek
+VP -> saw NP : NP Acc gördü
+VP -> ran : koştu
+Acc -> : -yH
+X -> N N : N N
+Y -> Z : Z
+"""
+
+class TestOptimize(unittest.TestCase):
+    def test_report(self):
+        grammar_ = Grammar.load_grammar(text=grammar)
+        rules = list(grammar_.rules)
+        report = grammar_.optimize()
+        self.assertIs(grammar_.optimized, report)
+        self.assertEqual([rule.head for rule in report['unproductive']], ['S','Y'])
+        self.assertEqual([rule.head for rule in report['unreachable']], ['X'])
+        self.assertEqual(len(grammar_.rules), len(rules)-3)
+        self.assertIn('Acc', [rule.head for rule in grammar_.rules]) # right-only NT is kept
+        for ruleno,rule in enumerate(rules):
+            if report['renumber'][ruleno] is not None:
+                self.assertIs(grammar_.rules[report['renumber'][ruleno]], rule)
+        for ruleno in grammar_.lexicon.rulenos:
+            self.assertFalse(any(param is not False for param in grammar_.rules[ruleno].lparam))
+
+    def test_rulenos(self):
+        parser = Parser()
+        parser.load_grammar(text=grammar, optimize=True)
+        parser.compile()
+        parser.parse("the man saw a dog")
+        self.check_rules(parser,parser.make_tree())
+
+    def check_rules(self,parser,item):
+        if type(item) == Tree:
+            self.assertIs(parser.rules[item.ruleno], item.rule)
+            for sub in item.left:
+                self.check_rules(parser,sub)
+        elif type(item) == list:
+            for alt in item:
+                self.check_rules(parser,alt)
+
+    def test_forests(self):
+        sents = ["the man saw a dog", "man ran", "the man saw man man"]
+        for name,text,_sents in CompileOptions.grammars + [("optimize",grammar,sents)]:
+            parsers = []
+            for optimize in (False,True):
+                parser = Parser()
+                if text is None:
+                    parser.load_grammar(os.path.join(grm_dir,CompileOptions.feature_file), optimize=optimize)
+                else:
+                    parser.load_grammar(text=text, optimize=optimize)
+                parser.compile()
+                parsers.append(parser)
+            for sent in _sents:
+                with self.subTest(grammar=name,sent=sent):
+                    self.assertEqual(self.translate(parsers[1],sent), self.translate(parsers[0],sent))
+
+    def translate(self,parser,sent):
+        """ rulenos differ after optimize, so only translations are compared """
+        result = CompileOptions.parse(self,parser,sent)
+        return result if type(result) != list else result[2]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import sys, os, unittest, tempfile, shutil
+sys.path.append("../..")
+from GLRParser import Parser, ParseError, GrammarError
+from GLRParser.tables import FlatTables
+from GLRParser.test.test_compile import CompileOptions, grm_dir
+
+class TestFlatTables(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.dir,"tables.glrt")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self,**options):
+        for name,text,sents in CompileOptions.grammars:
+            base = CompileOptions.load(name,text,**options)
+            base.save_tables(self.fname)
+            parser = Parser()
+            parser.load_tables(self.fname)
+            with self.subTest(grammar=name,**options):
+                self.assertEqual(len(parser.rules), len(base.rules))
+                self.assertEqual(sorted(parser.dfa.items()), sorted(base.dfa.items()))
+                self.assertEqual([parser.symtab.get(name) for name in base.symtab.names], list(range(len(base.symtab))))
+                self.assertEqual([parser.symtab.names[symbol] for symbol in range(len(base.symtab))], base.symtab.names)
+                self.assertEqual(parser.symtab.get("unknown-word"), -1)
+            for sent in sents:
+                with self.subTest(grammar=name,sent=sent,**options):
+                    self.assertEqual(CompileOptions.parse(self,parser,sent), CompileOptions.parse(self,base,sent))
+
+    def test_parse(self):
+        self.check()
+
+    def test_parse_lookahead(self):
+        self.check(lookahead=True)
+
+    def test_parse_epsilon_free(self):
+        self.check(epsilon_free=True)
+
+    def test_parse_bitsets(self):
+        self.check(bitsets=True)
+
+    def test_parse_packed(self):
+        self.check(lookahead=True,packed=True)
+
+    def test_lexicon(self):
+        text = "S -> NP VP : NP VP\nNP -> the united states : abd\nNP -> the united : birleşik\nNP -> the : o\nVP -> sleeps : uyur\nVP -> states : belirtir"
+        base = CompileOptions.load("lexicon",text)
+        base.save_tables(self.fname)
+        parser = Parser()
+        parser.load_tables(self.fname)
+        tokens = [parser.symtab.get(word) for word in "the united states $".split()]
+        self.assertEqual(sorted(parser.lexicon.search(tokens,0)), sorted(base.lexicon.search(tokens,0)))
+        self.assertEqual(len(parser.lexicon), len(base.lexicon))
+        for sent in ["the united states sleeps", "the united states", "the sleeps"]:
+            with self.subTest(sent=sent):
+                self.assertEqual(CompileOptions.parse(self,parser,sent), CompileOptions.parse(self,base,sent))
+
+    def test_report(self):
+        base = CompileOptions.load("report","S -> NP VP : NP VP\nNP -> i : ben\nVP -> sleep : uyurum")
+        base.save_tables(self.fname)
+        parser = Parser()
+        parser.load_tables(self.fname)
+        self.assertRaises(GrammarError, parser.compile_report)
+
+    def test_bad_file(self):
+        with open(self.fname,"wb") as f:
+            f.write(b"GLRC" + bytes(100))
+        self.assertRaises(ValueError, FlatTables, self.fname)
+
+if __name__== '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+""" Measures compile time of generated lexicalized grammars of increasing size, to show compile time scales near-linearly with rule count
+
+usage: python bench_compile.py [max_rules] [processes]
+if processes is given, grammars are compiled in parallel with that many worker processes and tables are checked against serial compile
+"""
+import sys
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+
+core = """
+S -> NP VP : NP VP
+S -> S-1 and S-2 : S-1 ve S-2
+NP -> N : N
+NP -> Det N : Det N
+NP -> NP-1 of NP-2 : NP-2 -nHn NP-1 -sH
+NP -> NP PP : PP NP
+PP -> P NP : NP P
+Det -> the :
+Det -> a : bir
+P -> in : -dA
+P -> with : -ylA
+VP -> V : V
+VP -> V NP : NP -yH V
+VP -> V NP NP : NP-2 -yA NP-1 -yH V
+VP -> am Ving : Ving -Hyor
+VP -> is Ving : Ving -Hyor
+VP -> Ved NP : NP -yH Ved -dH
+VP -> have Ven NP : NP -yH Ven -mHş
+%macro V -> V,Vs,Ving,Ved,Ven
+"""
+
+def make_grammar(verb_cnt,noun_cnt):
+    lines = [core]
+    for idx in range(verb_cnt):
+        verb = "verb%d" % idx
+        lines.append("%form V -> {0},{0}s,{0}ing,{0}ed,{0}en".format(verb))
+        lines.append("$V -> ${} : fiil{}".format(verb,idx))
+    for idx in range(noun_cnt):
+        lines.append("N -> noun{0} : isim{0}".format(idx))
+    return "\n".join(lines)
+
+def main():
+    max_rules = int(sys.argv[1]) if len(sys.argv)>1 else 100000
+    processes = int(sys.argv[2]) if len(sys.argv)>2 else None
+    print("{:>8} {:>8} {:>10} {:>10} {:>12}".format("rules","states","load(ms)","compile(ms)","compile(us)/rule"))
+    size = 1000
+    while size <= max_rules:
+        verb_cnt = size // 10 # each verb expands into 5 rules
+        noun_cnt = size - verb_cnt*5
+        text = make_grammar(verb_cnt,noun_cnt)
+        parser = Parser()
+        start = timer()
+        parser.load_grammar(text=text)
+        load_time = timer()-start
+        start = timer()
+        parser.compile(processes=processes)
+        compile_time = timer()-start
+        if processes:
+            serial = Parser()
+            serial.load_grammar(text=text)
+            serial.compile()
+            assert (parser.dfa,parser.reduce,parser.ereduce) == (serial.dfa,serial.reduce,serial.ereduce), "parallel compile differs"
+        print("{:8} {:8} {:10} {:10} {:12.1f}".format(len(parser.rules), len(parser.kernels), int(load_time*1000), int(compile_time*1000), compile_time*1e6/len(parser.rules)))
+        size *= 2 if str(size)[0] != '2' else 2.5
+        size = int(size)
+
+if __name__ == "__main__": # required by worker processes of parallel compile
+    main()
@@ -0,0 +1,81 @@
+""" Measures loading of generated %include_form and %include_suffix files: load time and memory of the compact rows
+(FormDict and SuffixDict, a row is a single string shared by alternative words) against lists of lists of strings, as they were stored before
+
+usage: python bench_forms.py [lines]
+both files have the given number of lines, every 4th form line has alternatives e.g. "burn / burnt, burns, ..."
+memory is measured with tracemalloc, in a separate load than time
+"""
+import sys, os, tempfile, tracemalloc
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+
+grammar = """
+S -> V : V
+%macro V -> V,Vs,Ving,Ved,Ven
+%include_form V "{forms}"
+$V -> $verb0 : fiil0
+%suffix_macro V -> base,aorist,caus,passive,neg
+%include_suffix V "{suffixes}"
+"""
+
+def write_files(dir,cnt):
+    fnames = dict(forms=os.path.join(dir,"forms.txt"), suffixes=os.path.join(dir,"suffixes.txt"))
+    with open(fnames["forms"],"w") as f:
+        for idx in range(cnt):
+            verb = "verb%d" % idx
+            if idx % 4:
+                f.write("{0},{0}s,{0}ing,{0}ed,{0}en\n".format(verb))
+            else:
+                f.write("{0} / {0}x,{0}s,{0}ing,{0}ed / {0}t,{0}en / {0}t\n".format(verb))
+    with open(fnames["suffixes"],"w") as f:
+        for idx in range(cnt):
+            f.write("fiil{0},fiil{0}ir,fiil{0}dir,fiil{0}il,fiil{0}me\n".format(idx))
+    return fnames
+
+def load_lists(fnames):
+    """ loads the files into lists of lists of strings, as %include_form and %include_suffix did before """
+    forms,suffixes = dict(),dict()
+    with open(fnames["forms"]) as f:
+        for line in f:
+            items = [[alt.strip() for alt in item.split("/")] for item in line.strip().split(",")]
+            for alt in items[0]:
+                forms[alt] = items
+    with open(fnames["suffixes"]) as f:
+        for line in f:
+            items = [item.strip() for item in line.strip().split(",")]
+            suffixes[items[0]] = items
+    return forms,suffixes
+
+def load_grammar(fnames):
+    """ loads the files with Grammar, only form and suffix tables are kept """
+    grammar_ = Grammar.load_grammar(text=grammar.format(**fnames))
+    return grammar_.forms,grammar_.suff_dict_list
+
+def measure(load,fnames):
+    start = timer()
+    load(fnames)
+    elapsed = timer()-start
+    tracemalloc.start()
+    tables = load(fnames)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed,size
+
+def main():
+    cnt = int(sys.argv[1]) if len(sys.argv)>1 else 1000000
+    with tempfile.TemporaryDirectory() as dir:
+        fnames = write_files(dir,cnt)
+        forms,suffixes = load_grammar(fnames)
+        lists = load_lists(fnames)
+        same = {key:[list(item) for item in forms["V"][key]] for key in forms["V"]} == lists[0] and \
+            {key:list(suffixes[0][key]) for key in suffixes[0]} == lists[1]
+        del forms,suffixes,lists
+        print("{} form lines + {} suffix lines, same tables: {}".format(cnt,cnt,same))
+        for name,load in (("lists",load_lists),("compact",load_grammar)):
+            elapsed,size = measure(load,fnames)
+            print("{:>8} load={:6.2f}s memory={:6}MB".format(name,elapsed,size//(1024*1024)))
+
+if __name__ == "__main__":
+    main()
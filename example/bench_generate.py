@@ -0,0 +1,79 @@
+""" Compares a generated parser module (Parser.generate_module) with load_grammar + compile on tenses.grm:
+start-up time of a fresh process (first import compiles the module to .pyc, following imports load the .pyc) and parse time of tenses.in.txt
+
+usage: python bench_generate.py [options], e.g. python bench_generate.py "dict(lookahead=True)"
+"""
+import sys, os, subprocess, tempfile, shutil, logging
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+
+grm_dir = "../GLRParser/grm/"
+encoding = "cp1254" # grammar and test files are in Turkish Windows encoding
+
+def read_sents(fname):
+    with open(fname, encoding=encoding) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                sent = line.split('@')[0].strip()
+                if sent != '*':
+                    yield sent
+
+startup = {
+    "compile": """
+from GLRParser import Parser
+parser = Parser("EN","TR")
+with open({grm!r}, encoding="cp1254") as f:
+    parser.load_grammar(text=f.read())
+parser.compile(**{options})
+""",
+    "import": """
+from gen_tenses import parser
+"""}
+
+def startup_ms(name,options,tmpdir):
+    """ returns time of creating a ready-to-use parser in a fresh process """
+    code = "import sys, time\nsys.path[:0] = [{!r},{!r}]\nimport GLRParser\nstart = time.perf_counter()\n".format(os.path.abspath(".."),tmpdir)
+    code += startup[name].format(grm=os.path.abspath(grm_dir+"tenses.grm"),options=options)
+    code += "print((time.perf_counter()-start)*1000)\n"
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE",None)
+    return float(subprocess.check_output([sys.executable,"-c",code],env=env))
+
+def parse_ms(parser,sents):
+    best = None
+    for rep in range(3):
+        start = timer()
+        for sent in sents:
+            try:
+                parser.parse(sent)
+            except ParseError:
+                pass
+        elapsed = timer()-start
+        best = elapsed if best is None else min(best,elapsed)
+    return best*1000
+
+def main():
+    logging.disable(logging.CRITICAL)
+    options = sys.argv[1] if len(sys.argv)>1 else "dict()"
+    parser = Parser("EN","TR")
+    with open(grm_dir+"tenses.grm", encoding=encoding) as f:
+        parser.load_grammar(text=f.read())
+    parser.compile(**eval(options))
+    tmpdir = tempfile.mkdtemp()
+    fname = os.path.join(tmpdir,"gen_tenses.py")
+    parser.generate_module(fname)
+    print("options={} module={}KB".format(options,os.path.getsize(fname)//1024))
+    print("start-up(ms): load+compile={:.1f} first import={:.1f} import={:.1f}".format(
+        startup_ms("compile",options,tmpdir), startup_ms("import",options,tmpdir), startup_ms("import",options,tmpdir)))
+    sys.path.insert(0,tmpdir)
+    from gen_tenses import parser as generated
+    sents = [parser.pre_processor(sent) for sent in read_sents(grm_dir+"tenses.in.txt")]
+    print("parse(ms): Parser.parse={:.1f} generated={:.1f}".format(parse_ms(parser,sents),parse_ms(generated,sents)))
+    print("same translations:", [parser.trans_sent(sent) for sent in sents] == [generated.trans_sent(sent) for sent in sents])
+    shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    main()
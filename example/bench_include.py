@@ -0,0 +1,56 @@
+""" Measures loading of grammar variants (built with %define/%ifdef) which %include the same generated lexicon file,
+with files parsed in place, with an in-process IncludeCache and with an on-disk IncludeCache read by a new cache object (as a new process would do)
+
+usage: python bench_include.py [lines] [variants]
+"""
+import sys, os, tempfile, shutil, logging
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+
+sys.path.append(".")
+from bench_load import make_lexicon
+
+variant = """
+S -> NP VP : NP VP
+%ifdef formal
+NP -> you : siz
+%else
+NP -> you : sen
+%endif
+%include "{lexicon}"
+"""
+
+def load_all(lexicon,cnt,cache):
+    """ loads "cnt" variants, every second one with "formal" defined, returns load time and rules of the variants """
+    Grammar.include_cache = cache
+    elapsed = 0
+    rules = []
+    for idx in range(cnt):
+        start = timer()
+        grammar = Grammar.load_grammar(text=variant.format(lexicon=lexicon), defines={"formal"} if idx % 2 else set())
+        elapsed += timer()-start
+        rules.append([rule.format() for rule in grammar.rules])
+    Grammar.include_cache = None
+    return elapsed,rules
+
+def main():
+    logging.disable(logging.CRITICAL)
+    lines = int(sys.argv[1]) if len(sys.argv)>1 else 100000
+    cnt = int(sys.argv[2]) if len(sys.argv)>2 else 6
+    tmpdir = tempfile.mkdtemp()
+    lexicon = os.path.join(tmpdir,"lexicon.grm").replace("\\","/")
+    with open(lexicon,"w") as f:
+        f.write(make_lexicon(lines))
+    cache_dir = os.path.join(tmpdir,"cache")
+    print("{} variants including {} lines".format(cnt,lines))
+    base,base_rules = load_all(lexicon,cnt,None)
+    print("{:>10} load={:6.2f}s".format("in place",base))
+    for name,cache in (("memory",IncludeCache()),("disk",IncludeCache(cache_dir)),("disk warm",IncludeCache(cache_dir))):
+        elapsed,rules = load_all(lexicon,cnt,cache)
+        print("{:>10} load={:6.2f}s speedup={:5.2f} same rules: {}".format(name,elapsed,base/elapsed,rules == base_rules))
+    shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    main()
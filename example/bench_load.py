@@ -0,0 +1,53 @@
+""" Compares load time of grammars with the fast rule scanner (Grammar.scan_rule) and with recursive descent only (Grammar.fast_scan=False),
+on tenses.grm and on a generated lexicon grammar, and checks both give the same rules
+
+usage: python bench_load.py [lines]
+"""
+import sys, os, tempfile
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+
+grm_dir = "../GLRParser/grm/"
+
+def make_lexicon(cnt):
+    lines = ["S -> NP VP : NP VP", "NP -> Det N : Det N", "VP -> V NP : NP -yH V [tense=past]"]
+    for idx in range(cnt):
+        if idx % 3 == 0:
+            lines.append("N -> noun%d : isim%d [numb=sing]" % (idx,idx))
+        elif idx % 3 == 1:
+            lines.append("V -> verb%d up : fiil%d\t\t# phrasal verb" % (idx,idx))
+        else:
+            lines.append("Adj -> adj%d : sıfat%d [deg=pos]" % (idx,idx))
+    return "\n".join(lines)
+
+def load_ms(fname,encoding,fast_scan):
+    Grammar.fast_scan = fast_scan
+    best = None
+    for rep in range(3):
+        start = timer()
+        parser = Parser()
+        with open(fname,encoding=encoding) as f:
+            parser.load_grammar(text=f.read())
+        elapsed = timer()-start
+        best = elapsed if best is None else min(best,elapsed)
+    Grammar.fast_scan = True
+    return best*1000, [rule.format() for rule in parser.rules]
+
+def main():
+    cnt = int(sys.argv[1]) if len(sys.argv)>1 else 100000
+    fd,lexicon = tempfile.mkstemp(suffix=".grm")
+    with os.fdopen(fd,"w",encoding="utf-8") as f:
+        f.write(make_lexicon(cnt))
+    print("{:>10} {:>8} {:>12} {:>10} {:>8} {:>6}".format("grammar","lines","descent(ms)","scan(ms)","speedup","same"))
+    for name,fname,encoding in (("tenses",grm_dir+"tenses.grm","cp1254"),("lexicon",lexicon,"utf-8")):
+        with open(fname,encoding=encoding) as f:
+            lines = sum(1 for line in f)
+        slow,slow_rules = load_ms(fname,encoding,False)
+        fast,fast_rules = load_ms(fname,encoding,True)
+        print("{:>10} {:>8} {:>12.1f} {:>10.1f} {:>8.2f} {!s:>6}".format(name,lines,slow,fast,slow/fast,slow_rules==fast_rules))
+    os.remove(lexicon)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+""" Compares LR(0) and LALR(1) parse tables on tenses.in.txt: number of edges created, parse time and translations """
+import sys
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+
+grm_dir = "../GLRParser/grm/"
+encoding = "cp1254" # grammar and test files are in Turkish Windows encoding
+
+def read_sents(fname):
+    with open(fname, encoding=encoding) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                sent = line.split('@')[0].strip()
+                if sent != '*':
+                    yield sent
+
+def run(lookahead):
+    parser = Parser("EN","TR")
+    with open(grm_dir+"tenses.grm", encoding=encoding) as f:
+        parser.load_grammar(text=f.read())
+    start = timer()
+    parser.compile(lookahead=lookahead)
+    compile_time = timer()-start
+    edge_cnt = alt_cnt = 0
+    results = []
+    start = timer()
+    for sent in read_sents(grm_dir+"tenses.in.txt"):
+        try:
+            parser.parse(parser.pre_processor(sent))
+        except ParseError:
+            pass
+        edge_cnt += len(parser.edges)
+        alt_cnt += sum(len(alts) for alts in parser.edges.values())
+        results.append(parser.trans_sent(sent))
+    parse_time = timer()-start
+    print("lookahead={!s:5} compile={:5}ms parse={:5}ms edges={:7} edge_alts={:7}".format(
+        lookahead, int(compile_time*1000), int(parse_time*1000), edge_cnt, alt_cnt))
+    return edge_cnt, [sorted(item) if type(item)==list else item for item in results]
+
+def main():
+    lr0_edges, lr0_results = run(False)
+    lalr_edges, lalr_results = run(True)
+    print("edges saved: {} ({:.1f}%)".format(lr0_edges-lalr_edges, (lr0_edges-lalr_edges)*100/lr0_edges))
+    print("same translations:", lr0_results == lalr_results)
+
+main()
@@ -0,0 +1,73 @@
+""" Compares macro rules expanded via MacroRule objects (Grammar.compact_macros=True) with full Rule objects,
+on a generated grammar with a large %form set: rule count, distinct bodies in RuleStore, memory, load and compile time, and translations
+
+usage: python bench_macro.py [verbs]
+each verb has a %form line of 5 forms (every 4th with an alternative past form) and a $V rule, so it expands into 5 or 6 rules
+memory: "load" is measured with tracemalloc as the memory allocated by load_grammar (rule store, lexicon, symbol table and forms),
+"store" is the size of the arrays of the rule store
+"""
+import sys, tracemalloc, logging
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+
+core = """
+S -> NP VP : NP VP
+NP -> i : ben
+NP -> you : sen
+VP -> V : V -dH
+VP -> Ved : Ved -dH
+VP -> have Ven : Ven -mHş
+VP -> am Ving : Ving -Hyor
+VP -> Vs : Vs -Hr
+%macro V -> V,Vs,Ving,Ved,Ven
+"""
+
+def make_grammar(cnt):
+    lines = [core]
+    for idx in range(cnt):
+        verb = "verb%d" % idx
+        if idx % 4:
+            lines.append("%form V -> {0},{0}s,{0}ing,{0}ed,{0}en".format(verb))
+        else:
+            lines.append("%form V -> {0},{0}s,{0}ing,{0}ed / {0}t,{0}en".format(verb))
+        lines.append("$V -> ${} : fiil{}".format(verb,idx))
+    return "\n".join(lines)
+
+def load(text,compact):
+    Grammar.compact_macros = compact
+    parser = Parser()
+    tracemalloc.start()
+    start = timer()
+    parser.load_grammar(text=text)
+    load_time = timer()-start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    Grammar.compact_macros = True
+    start = timer()
+    parser.compile()
+    return parser,load_time,timer()-start,size
+
+def store_size(rules):
+    return sum(sys.getsizeof(arr) for arr in (rules.heads,rules.left_offs,rules.left_syms,rules.rights,rules.feats,rules.lparams,
+        rules.rparams,rules.costs,rules.cuts))
+
+def main():
+    logging.disable(logging.CRITICAL)
+    cnt = int(sys.argv[1]) if len(sys.argv)>1 else 50000
+    text = make_grammar(cnt)
+    sents = ["i verb1ed", "you have verb%den" % (cnt-1), "i am verb%ding" % (cnt//2), "you verb0t", "i verb%ds" % (cnt//3)]
+    results = []
+    print("{:>8} {:>8} {:>8} {:>14} {:>15} {:>8} {:>11}".format("compact","rules","bodies","load mem(MB)","store mem(MB)","load(s)","compile(s)"))
+    for compact in (False,True):
+        parser,load_time,compile_time,size = load(text,compact)
+        bodies = len(set(parser.rules.rights))
+        print("{!s:>8} {:>8} {:>8} {:>14.1f} {:>15.1f} {:>8.2f} {:>11.2f}".format(compact,len(parser.rules),bodies,
+            size/(1024*1024),store_size(parser.rules)/(1024*1024),load_time,compile_time))
+        results.append(([rule.format() for rule in parser.rules],[parser.trans_sent(sent) for sent in sents]))
+        del parser
+    print("same rules:", results[0][0] == results[1][0], "same translations:", results[0][1] == results[1][1])
+
+if __name__ == "__main__":
+    main()
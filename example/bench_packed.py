@@ -0,0 +1,104 @@
+""" Compares dict tables with packed tables (compile(packed=True)): memory of dfa, reduce, ereduce and lookahead tables,
+lookup speed of each table and parse time, on tenses.grm and a generated non-lexicalized grammar
+
+usage: python bench_packed.py [rules]
+both are compiled with lookahead=True, so that default reductions take effect
+memory is measured with tracemalloc as the size of an unpickled copy of each table
+"""
+import sys, pickle, tracemalloc, logging
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+from bench_compile import make_grammar
+
+grm_dir = "../GLRParser/grm/"
+encoding = "cp1254" # grammar and test files are in Turkish Windows encoding
+
+def read_sents(fname):
+    with open(fname, encoding=encoding) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                sent = line.split('@')[0].strip()
+                if sent != '*':
+                    yield sent
+
+def table_kb(table):
+    data = pickle.dumps(table,pickle.HIGHEST_PROTOCOL)
+    tracemalloc.start()
+    copy = pickle.loads(data)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size//1024
+
+def lookup_time(parser,keys,states,items):
+    """ returns time of looking up all dfa keys, reduce and ereduce rows of all states and lookahead sets of all items """
+    dfa,reduce,ereduce,lookahead = parser.dfa,parser.reduce,parser.ereduce,parser.lookahead
+    result = []
+    start = timer()
+    for key in keys:
+        dfa.get(key,-1)
+    result.append(timer()-start)
+    start = timer()
+    for state in states:
+        reduce.get(state,())
+        ereduce.get(state,())
+    result.append(timer()-start)
+    start = timer()
+    for key,term in items:
+        term in lookahead[key]
+    result.append(timer()-start)
+    return result
+
+def run(name,load,sents):
+    results = []
+    for packed in (False,True):
+        parser = load()
+        start = timer()
+        parser.compile(lookahead=True,packed=packed)
+        compile_time = timer()-start
+        if not packed:
+            nstates = len(parser.kernels)
+            terms = sorted({symbol for state,symbol in parser.dfa} - set(parser.heads))
+            keys = [(state,symbol) for state in range(nstates) for symbol in terms[:50]] + list(parser.dfa) # mostly misses + all hits
+            states = list(range(nstates))
+            items = [((state,)+item,term) for table in (parser.reduce,parser.ereduce) for state,sitems in table.items() for item in sitems for term in terms[:5]]
+        memory = [table_kb(getattr(parser,name)) for name in ('dfa','reduce','ereduce','lookahead')]
+        lookups = min(lookup_time(parser,keys,states,items) for rep in range(3))
+        start = timer()
+        edges = 0
+        for sent in sents:
+            try:
+                parser.parse(sent)
+                edges += len(parser.edges)
+            except ParseError:
+                pass
+        parse_time = timer()-start
+        trans = [parser.trans_sent(sent) for sent in sents]
+        print("{:>8} packed={!s:5} compile={:5}ms memory(KB) dfa={:5} reduce={:5} ereduce={:5} lookahead={:5} lookup(ms) dfa={:6.1f} reduce={:6.1f} lookahead={:6.1f} parse={:5}ms edges={}".format(
+            name, packed, int(compile_time*1000), *memory, *[t*1000 for t in lookups], int(parse_time*1000), edges))
+        results.append([sorted(item) if type(item)==list else item for item in trans])
+    print("{:>8} same translations: {}".format(name, results[0] == results[1])) # default reductions may add a few edges which are never completed
+
+def load_tenses():
+    parser = Parser("EN","TR")
+    with open(grm_dir+"tenses.grm", encoding=encoding) as f:
+        parser.load_grammar(text=f.read())
+    return parser
+
+def main():
+    logging.disable(logging.CRITICAL)
+    size = int(sys.argv[1]) if len(sys.argv)>1 else 2000
+    parser = load_tenses()
+    sents = [parser.pre_processor(sent) for sent in read_sents(grm_dir+"tenses.in.txt")]
+    run("tenses",load_tenses,sents)
+    text = make_grammar(size//10,size-size//10*5)
+    def load_generated():
+        parser = Parser()
+        parser.load_grammar(text=text,lexical=False)
+        return parser
+    run("generated",load_generated,["the noun1 verb1ed the noun2", "a noun3 of the noun4 verb2s the noun5 in a noun6 and the noun7 verb3"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+""" Compares loading compiled tables in worker processes: pickled tables (each worker has its own copy) vs memory-mapped flat tables (shared)
+
+usage: python bench_tables.py [rules] [workers]
+private memory of workers is read from /proc/self/smaps_rollup, so it is only reported on Linux
+"""
+import sys, os, pickle, tempfile, multiprocessing
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+from bench_compile import make_grammar
+
+def private_kb():
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            return sum(int(line.split()[1]) for line in f if line.startswith("Private_"))
+    except OSError:
+        return 0
+
+def load_pickle(fname):
+    before = private_kb()
+    start = timer()
+    with open(fname,"rb") as f:
+        tables = pickle.load(f)
+    parser = Parser()
+    for name,table in tables.items():
+        setattr(parser,name,table)
+    return parse(parser,timer()-start,before)
+
+def load_flat(fname):
+    before = private_kb()
+    start = timer()
+    parser = Parser()
+    parser.load_tables(fname)
+    return parse(parser,timer()-start,before)
+
+def parse(parser,load_time,before):
+    parser.parse("the noun1 verb1ed the noun2")
+    parser.make_tree()
+    return load_time, private_kb()-before
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv)>1 else 100000
+    workers = int(sys.argv[2]) if len(sys.argv)>2 else 4
+    parser = Parser()
+    parser.load_grammar(text=make_grammar(size//10,size-size//10*5))
+    parser.compile()
+    tmpdir = tempfile.mkdtemp()
+    pickle_file = os.path.join(tmpdir,"tables.pickle")
+    flat_file = os.path.join(tmpdir,"tables.glrt")
+    with open(pickle_file,"wb") as f:
+        pickle.dump({name:getattr(parser,name) for name in Parser.table_names+('rules','lexicon','symtab','suff_idxs','suff_dict_list')},f,pickle.HIGHEST_PROTOCOL)
+    parser.save_tables(flat_file)
+    print("rules={} pickle={}KB flat={}KB".format(len(parser.rules),os.path.getsize(pickle_file)//1024,os.path.getsize(flat_file)//1024))
+    with multiprocessing.Pool(workers) as pool:
+        for name,func,fname in (("pickle",load_pickle,pickle_file),("flat",load_flat,flat_file)):
+            results = pool.map(func,[fname]*workers,1)
+            print("{:>6}: load(ms)/worker={:.1f} private(KB)/worker={}".format(name, 1000*sum(t for t,m in results)/workers, sum(m for t,m in results)//workers))
+    os.remove(pickle_file)
+    os.remove(flat_file)
+    os.rmdir(tmpdir)
+
+if __name__ == "__main__":
+    main()
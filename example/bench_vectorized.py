@@ -0,0 +1,64 @@
+""" Compares shifting active states one by one with vectorized shift (compile(vectorized=True), needs numpy)
+on an ambiguous generated grammar where each word can be read as any of "width" categories, so hundreds of states are active at each position
+reports time of the shift lookups of the largest active set alone and total parse time
+
+usage: python bench_vectorized.py [width] [words]
+"""
+import sys, logging
+
+sys.path.append("..")
+from GLRParser import *
+from timeit import default_timer as timer
+
+def make_grammar(width):
+    lines = ["S -> NP : NP", "S -> S-1 NP-2 : S-1 NP-2"]
+    for idx in range(width):
+        lines.append("NP -> W{0} N : W{0} N".format(idx))
+        lines.append("W{0} -> w : k{0}".format(idx))
+    lines.append("N -> n : i")
+    return "\n".join(lines)
+
+def time_parse(parser,sent):
+    best = None
+    for rep in range(3):
+        start = timer()
+        parser.parse(sent)
+        elapsed = timer()-start
+        best = elapsed if best is None else min(best,elapsed)
+    return best
+
+def run(text,sent,vectorized,max_cells=Parser.dense_max_cells):
+    parser = Parser()
+    parser.dense_max_cells = max_cells
+    parser.load_grammar(text=text,lexical=False)
+    parser.compile(vectorized=vectorized)
+    parse_time = time_parse(parser,sent)
+    active = max(({state for (pos,state,symbol) in parser.nodes if pos == idx} for idx in range(len(parser.instr))),key=len)
+    token = parser.symtab.get("n")
+    dfa = parser.dfa
+    start = timer()
+    for rep in range(1000): # shift lookups alone, as done by parse for "active" states
+        if vectorized:
+            list(dfa.shift(active,token))
+        else:
+            [(state,dfa.get((state,token),-1)) for state in active]
+    shift_time = (timer()-start)/1000
+    print("vectorized={!s:5} {:>7} states={} max active={} shift={:6.1f}us parse={:6.1f}ms edges={}".format(
+        vectorized, "dense" if vectorized and max_cells else "columns" if vectorized else "", len(parser.kernels), len(active), shift_time*1e6, parse_time*1000, len(parser.edges)))
+    return sorted(parser.edges)
+
+def main():
+    logging.disable(logging.CRITICAL)
+    width = int(sys.argv[1]) if len(sys.argv)>1 else 300
+    words = int(sys.argv[2]) if len(sys.argv)>2 else 20
+    text = make_grammar(width)
+    sent = " ".join(["w n"]*words)
+    base = run(text,sent,False)
+    try:
+        for max_cells in (Parser.dense_max_cells,0): # dense matrix and compressed columns
+            print("same edges:", run(text,sent,True,max_cells) == base)
+    except GrammarError as e: # numpy is not installed
+        print(e)
+
+if __name__ == "__main__":
+    main()
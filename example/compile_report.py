@@ -0,0 +1,30 @@
+""" Prints compile statistics of a grammar: states, conflicts, largest closures and states forking the GSS most
+
+usage: python compile_report.py grammar_file [encoding]
+"""
+import sys
+
+sys.path.append("..")
+from GLRParser import *
+
+def main():
+    fname = sys.argv[1] if len(sys.argv)>1 else "../GLRParser/grm/tenses.grm"
+    encoding = sys.argv[2] if len(sys.argv)>2 else "cp1254"
+    with open(fname,encoding=encoding) as f:
+        text = f.read()
+    parser = Parser()
+    parser.load_grammar(text=text)
+    parser.compile(lookahead=True)
+    report = parser.compile_report()
+    print("states={states} transitions={transitions} shift/reduce={shift_reduce} reduce/reduce={reduce_reduce}".format(**report))
+    print("nullable:", " ".join(report["nullable"]))
+    print("largest closures (state,items):", report["closures"])
+    print("most forking states (state,actions):", report["forks"])
+    for conflict in report["conflicts"]:
+        print("state", conflict["state"], parser.get_items(parser.kernels[conflict["state"]]))
+        for term,items in conflict["shift_reduce"]:
+            print("   S/R on", term, ":", " | ".join(items))
+        for terms,items in conflict["reduce_reduce"]:
+            print("   R/R on", " ".join(terms) if terms else "*", ":", " | ".join(items))
+
+main()
@@ -6,8 +6,6 @@ from GLRParser import *
 logging.basicConfig(level=logging.DEBUG,filename="parser.log",filemode="w")
 grm_dir = "../GLRParser/grm/"
 
-Grammar.enable_trie = False
-
 def main():
     start = timer()
     parser = Parser("EN","TR")